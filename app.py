@@ -5,12 +5,15 @@ import subprocess
 import shutil
 import fitz
 from translator import PDFTranslator
+from job_store import ACTIVE_STATUSES, FINAL_STATUSES, get_job_store
+from worker import JobWorker
+from preview import available_pages, build_preview, list_fragments, parse_page_ranges, preview_dir_for
+from upload_store import UPLOAD_STORE_DIR_NAME, UploadStore
+from perf_history import estimate_job, get_performance_history
 import tempfile
-import queue
 import threading
 import json
 import re
-import time
 import uuid
 from collections import Counter
 
@@ -21,7 +24,8 @@ app = Flask(
     static_folder=os.path.join(BASE_DIR, 'static')
 )
 app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 200MB max file size
-app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+# 多个 Web/worker 进程需要能看到同一个任务目录，分机部署时指向共享存储
+app.config['UPLOAD_FOLDER'] = os.environ.get('PDFAPP_WORK_DIR') or tempfile.gettempdir()
 app.config['ALLOWED_EXTENSIONS'] = {'pdf'}
 
 
@@ -68,16 +72,24 @@ def add_no_cache_headers(response):
 def request_entity_too_large(e):
     return jsonify({'error': '文件过大（超过200MB），请压缩PDF后再试'}), 413
 
-# 存储进度信息
-progress_queues = {}
-
-# 存储取消标志
-cancel_flags = {}
-
-# 存储任务工作区和输出文件信息
-task_registry = {}
-
-task_registry_lock = threading.Lock()
+# 任务状态、进度事件和取消标志统一放在任务存储里，任意 Web 进程都能提供 /progress、/cancel
+job_store = get_job_store()
+
+# Web 进程内嵌的 worker 线程数；翻译由独立的 worker.py 进程执行时设为 0
+INPROCESS_WORKERS = int(os.environ.get('PDFAPP_INPROCESS_WORKERS', 4))
+# SSE 无新事件时的心跳间隔（秒）
+PROGRESS_HEARTBEAT_INTERVAL = 15
+local_worker = JobWorker(job_store, concurrency=INPROCESS_WORKERS).start() if INPROCESS_WORKERS > 0 else None
+# 按内容哈希存放上传的 PDF，/analyze 返回的文档 id 可直接用于 /translate，大文件只上传、解析一次
+upload_store = UploadStore(
+    os.path.join(app.config['UPLOAD_FOLDER'], UPLOAD_STORE_DIR_NAME),
+    ttl=int(os.environ.get('PDFAPP_UPLOAD_TTL', 24 * 3600))
+)
+# 分析结果、提取文本在上传存储里的缓存文件名
+ANALYSIS_CACHE_NAME = 'analysis.json'
+TEXT_CACHE_NAME = 'text.json'
+# 翻译干跑计划的缓存文件名，按目标语言分别缓存
+PLAN_CACHE_NAME = 'plan.json'
 
 # 允许的文件扩展名
 def allowed_file(filename):
@@ -306,14 +318,141 @@ def parse_glossary_input(raw_glossary):
     return [line.strip() for line in str(raw_glossary).splitlines() if line.strip()]
 
 
-def extract_pdf_text(filepath):
+def extract_page_texts(filepath):
     try:
         doc = fitz.open(filepath)
         parts = [page.get_text("text") for page in doc]
         doc.close()
-        return "\n".join(parts)
+        return parts
     except Exception:
-        return ""
+        return []
+
+
+def analyze_stored_document(doc_id):
+    """分析上传存储里的文档；结果和提取的文本缓存在文档目录，同一文件只解析一次。
+
+    没有缓存时先抽样分析立即返回（大文件只读几十页），结果带 refining=True，
+    后台线程读完全部页面后把精确结果写入缓存，前端通过 GET /analyze/<doc_id> 取回。
+    """
+    analysis = upload_store.load_json(doc_id, ANALYSIS_CACHE_NAME)
+    cached_text = upload_store.load_json(doc_id, TEXT_CACHE_NAME)
+    if analysis is not None and cached_text is not None:
+        return analysis, cached_text.get('text', '')
+
+    sampled_texts = []
+    analysis = PDFTranslator().analyze_pdf(upload_store.path(doc_id), sample=True, sampled_texts=sampled_texts)
+    doc_text = "\n".join(text for _, text in sorted(sampled_texts))
+    if not analysis.get('total_pages'):
+        return dict(analysis), doc_text
+    if analysis['exact']:
+        upload_store.save_json(doc_id, ANALYSIS_CACHE_NAME, analysis)
+        upload_store.save_json(doc_id, TEXT_CACHE_NAME, {'text': doc_text})
+    else:
+        refine_document_analysis(doc_id)
+        analysis['refining'] = True
+    return dict(analysis), doc_text
+
+
+# 正在后台做全文分析的文档 id，避免同一文档重复启动
+_refining_docs = set()
+_refining_lock = threading.Lock()
+
+
+def refine_document_analysis(doc_id):
+    """后台读完全部页面，用精确的统计结果和全文替换抽样分析，写入上传存储的缓存。"""
+    with _refining_lock:
+        if doc_id in _refining_docs:
+            return
+        _refining_docs.add(doc_id)
+
+    def run():
+        try:
+            path = upload_store.path(doc_id)
+            page_texts = extract_page_texts(path)
+            analysis = PDFTranslator().analyze_pdf(path, page_texts=page_texts)
+            if analysis.get('total_pages'):
+                upload_store.save_json(doc_id, TEXT_CACHE_NAME, {'text': "\n".join(page_texts)})
+                upload_store.save_json(doc_id, ANALYSIS_CACHE_NAME, analysis)
+        except Exception as e:
+            print(f'[WARN] 全文分析失败({doc_id}): {e}')
+        finally:
+            with _refining_lock:
+                _refining_docs.discard(doc_id)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def plan_stored_document(doc_id, target_lang):
+    """翻译干跑计划：同一文档、同一目标语言只干跑一次。"""
+    plans = upload_store.load_json(doc_id, PLAN_CACHE_NAME) or {}
+    plan = plans.get(target_lang)
+    if plan is None:
+        plan = PDFTranslator().plan_translation(
+            upload_store.path(doc_id), target_lang, providers=list(PDFTranslator.PRICING)
+        )
+        plans[target_lang] = plan
+        upload_store.save_json(doc_id, PLAN_CACHE_NAME, plans)
+    return plan
+
+
+def estimate_translation(doc_id, settings):
+    """按干跑计划和各服务最近任务拟合的吞吐量，估算每个服务的耗时和费用范围。"""
+    plan = plan_stored_document(doc_id, settings['target_lang'])
+    models = get_performance_history().fit_models('pdf')
+    estimates = {
+        provider: estimate_job(provider, plan, settings['concurrency'], pricing, models.get(provider))
+        for provider, pricing in PDFTranslator.PRICING.items()
+    }
+    return plan, estimates
+
+
+def format_duration(seconds):
+    minutes = seconds / 60
+    if minutes < 1:
+        return f"{max(1, int(seconds))}秒"
+    if minutes < 60:
+        return f"{int(minutes)}分钟"
+    hours = int(minutes // 60)
+    mins = int(minutes % 60)
+    return f"{hours}小时{mins}分钟"
+
+
+def build_analysis_response(analysis, doc_text, filename, doc_id, settings):
+    """在分析结果上补充文档 id、术语表、术语建议和预计耗时、费用，/analyze 和 GET /analyze/<doc_id> 共用。"""
+    analysis['doc_id'] = doc_id
+    glossary_state = load_scoped_glossary(filename)
+    glossary_terms = glossary_state['terms']
+    analysis['glossary_terms'] = glossary_terms
+    analysis['glossary_scope'] = glossary_state['scope']
+    analysis['glossary_source_label'] = glossary_state['source_label']
+    analysis['glossary_file_key'] = glossary_state['file_key']
+    analysis['glossary_source_path'] = glossary_state['source_path']
+    analysis['suggested_terms'] = extract_glossary_candidates(doc_text, glossary_terms)
+    # 为前端和旧字段兼容保留统一语言代码
+    analysis['lang_code'] = analysis.get('detected_lang', 'auto')
+
+    try:
+        plan, estimates = estimate_translation(doc_id, settings)
+    except Exception as e:
+        print(f'[WARN] 翻译干跑失败，按页数估算耗时: {e}')
+        plan, estimates = None, {}
+    estimate = estimates.get(settings['api_type'])
+    if estimate is None:
+        # 干跑失败时的兜底：批量模式约30-60页/分钟，取保守值30页/分钟
+        minutes = max(1, analysis['total_pages'] / 30)
+        estimate = {'seconds': [minutes * 60] * 3, 'cost': [0, 0, 0], 'history_jobs': 0}
+
+    low, mid, high = estimate['seconds']
+    analysis['estimated_time'] = format_duration(mid)
+    analysis['estimated_time_range'] = f"{format_duration(low)} ~ {format_duration(high)}"
+    analysis['estimated_time_minutes'] = round(mid / 60, 1)
+    analysis['estimated_cost'] = estimate['cost']
+    analysis['estimate_api_type'] = settings['api_type']
+    analysis['estimate_history_jobs'] = estimate['history_jobs']
+    analysis['estimates'] = estimates
+    if plan is not None:
+        analysis['plan'] = {key: value for key, value in plan.items() if key != 'providers'}
+    return analysis
 
 @app.route('/')
 def index():
@@ -348,382 +487,238 @@ def analyze():
     if not allowed_file(file.filename):
         return jsonify({'error': '只支持PDF文件'}), 400
 
-    temp_file = tempfile.NamedTemporaryFile(
-        delete=False,
-        suffix=".pdf",
-        prefix="analyze_",
-        dir=app.config['UPLOAD_FOLDER']
-    )
-    filepath = temp_file.name
-    temp_file.close()
-    file.save(filepath)
-
     try:
-        # 分析PDF
-        translator = PDFTranslator()
-        analysis = translator.analyze_pdf(filepath)
-        doc = extract_pdf_text(filepath)
-        glossary_state = load_scoped_glossary(file.filename)
-        glossary_terms = glossary_state['terms']
-        analysis['glossary_terms'] = glossary_terms
-        analysis['glossary_scope'] = glossary_state['scope']
-        analysis['glossary_source_label'] = glossary_state['source_label']
-        analysis['glossary_file_key'] = glossary_state['file_key']
-        analysis['glossary_source_path'] = glossary_state['source_path']
-        analysis['suggested_terms'] = extract_glossary_candidates(doc, glossary_terms)
-        # 为前端和旧字段兼容保留统一语言代码
-        analysis['lang_code'] = analysis.get('detected_lang', 'auto')
-
-        # 删除临时文件
-        os.remove(filepath)
-
-        # 根据页数估算翻译时间（批量模式）
-        total_pages = analysis['total_pages']
-        # 批量模式：约30-60页/分钟，取保守值30页/分钟
-        estimated_time_minutes = max(1, total_pages / 30)
-
-        # 转换为分钟和秒
-        if estimated_time_minutes < 1:
-            estimated_time_str = f"{int(estimated_time_minutes * 60)}秒"
-        elif estimated_time_minutes < 60:
-            estimated_time_str = f"{int(estimated_time_minutes)}分钟"
-        else:
-            hours = int(estimated_time_minutes // 60)
-            mins = int(estimated_time_minutes % 60)
-            estimated_time_str = f"{hours}小时{mins}分钟"
-
-        analysis['estimated_time'] = estimated_time_str
-        analysis['estimated_time_minutes'] = round(estimated_time_minutes, 1)
-
-        return jsonify(analysis)
+        # 存入上传存储并分析PDF；同样的内容只保存、解析一次
+        doc_id = upload_store.put(file.stream, file.filename)
+        analysis, doc = analyze_stored_document(doc_id)
+        settings = read_translation_settings(request.form, 'zh')
+        return jsonify(build_analysis_response(analysis, doc, file.filename, doc_id, settings))
 
     except Exception as e:
-        # 清理临时文件
-        if os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/translate', methods=['POST'])
-def translate():
-    # 检查是否有文件
-    if 'file' not in request.files:
-        return jsonify({'error': '没有上传文件'}), 400
 
-    file = request.files['file']
+@app.route('/analyze/<doc_id>')
+def analyze_result(doc_id):
+    """取抽样分析之后的全文分析结果；后台尚未完成时返回 202。"""
+    if upload_store.path(doc_id) is None:
+        return jsonify({'error': '文档已过期或不存在，请重新上传', 'code': 'doc_not_found'}), 404
+    analysis = upload_store.load_json(doc_id, ANALYSIS_CACHE_NAME)
+    cached_text = upload_store.load_json(doc_id, TEXT_CACHE_NAME)
+    if analysis is None or cached_text is None:
+        # 由别的进程抽样、或后台线程随进程退出而中断时，在这里补做
+        refine_document_analysis(doc_id)
+        return jsonify({'status': 'refining', 'doc_id': doc_id}), 202
+    filename = request.args.get('filename') or upload_store.filename(doc_id) or 'document.pdf'
+    settings = read_translation_settings(request.args, 'zh')
+    return jsonify(build_analysis_response(analysis, cached_text.get('text', ''), filename, doc_id, settings))
 
-    # 检查文件名
-    if file.filename == '':
-        return jsonify({'error': '没有选择文件'}), 400
+TASK_MANIFEST_NAME = 'task.json'
 
-    if not allowed_file(file.filename):
-        return jsonify({'error': '只支持PDF文件'}), 400
 
-    # 获取翻译参数
-    api_type = request.form.get('api_type', 'google')
-    api_key = request.form.get('api_key', '')
-    source_lang = request.form.get('source_lang', 'auto')
-    target_lang = request.form.get('target_lang', 'en')
-    translation_mode = request.form.get('translation_mode', 'normal')
-    translation_audience = request.form.get('translation_audience', 'general')
-    translation_style = request.form.get('translation_style', 'storytelling')
-    task_id = normalize_task_id(request.form.get('task_id', ''))
-    concurrency = int(request.form.get('concurrency', 4))  # 获取并发数，默认4
-    glossary_terms = parse_glossary_input(request.form.get('glossary_terms', '')) or load_scoped_glossary(file.filename)['terms']
+def write_task_manifest(task_dir, manifest):
+    """记录任务设置（不含 API 密钥），供进程重启后续传。"""
+    with open(os.path.join(task_dir, TASK_MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
 
-    # 调试：打印并发参数
-    print(f"[DEBUG] Received concurrency parameter: {concurrency}")
 
-    # 保存上传的文件到任务专属目录
-    filename = secure_filename(file.filename)
-    base_name, _ = os.path.splitext(filename)
-    if not base_name:
-        base_name = "document"
+def load_task_manifest(task_dir):
+    try:
+        with open(os.path.join(task_dir, TASK_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def find_task_workspace(task_id):
+    """先查任务存储，再按目录前缀在磁盘上找（存储被清理或换了存储后仍能续传）。"""
+    task = job_store.get_task(task_id)
+    if task and task['task_dir'] and os.path.isdir(task['task_dir']):
+        return task['task_dir']
+    prefix = f"pdf_task_{task_id}_"
+    upload_dir = app.config['UPLOAD_FOLDER']
+    try:
+        candidates = [
+            os.path.join(upload_dir, name) for name in os.listdir(upload_dir)
+            if name.startswith(prefix) and os.path.isdir(os.path.join(upload_dir, name))
+        ]
+    except OSError:
+        return None
+    if not candidates:
+        return None
+    return max(candidates, key=os.path.getmtime)
+
+
+def read_translation_settings(form, default_target_lang):
+    return {
+        'api_type': form.get('api_type', 'google'),
+        'source_lang': form.get('source_lang', 'auto'),
+        'target_lang': form.get('target_lang', default_target_lang),
+        'translation_mode': form.get('translation_mode', 'normal'),
+        'translation_audience': form.get('translation_audience', 'general'),
+        'translation_style': form.get('translation_style', 'storytelling'),
+        'concurrency': int(form.get('concurrency', 4)),
+        'engine': form.get('engine') or os.environ.get('PDFAPP_ENGINE', 'thread'),
+        'render_mode': form.get('render_mode') or os.environ.get('PDFAPP_RENDER_MODE', 'rebuild'),
+        'compression': form.get('compression') or os.environ.get('PDFAPP_PDF_COMPRESSION', 'small'),
+    }
 
-    task_dir = create_task_workspace(task_id)
-    filepath = os.path.join(task_dir, f"input_{filename}")
-    output_filename = f"translated_{base_name}.pdf"
-    output_filepath = os.path.join(task_dir, output_filename)
-
-    file.save(filepath)
-
-    # 创建进度队列
-    progress_queue = queue.Queue()
-    with task_registry_lock:
-        progress_queues[task_id] = progress_queue
-        cancel_flags[task_id] = False
-        task_registry[task_id] = {
-            'task_dir': task_dir,
-            'output_file': output_filename,
-            'created_at': time.time()
-        }
 
-    # 进度回调函数
-    def progress_callback(progress_data):
-        # 使用json.dumps确保JSON格式正确
-        progress_queue.put(progress_data)
+def is_truthy(value):
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
 
-    # 在新线程中执行翻译
-    def translate_in_background():
-        try:
-            # 日志回调函数
-            def log_callback(message, log_type='info'):
-                log_entry = {
-                    'type': 'log',
-                    'message': message,
-                    'log_type': log_type
-                }
-                progress_queue.put(log_entry)
-
-            # 检查是否取消的函数
-            def check_cancelled():
-                if cancel_flags.get(task_id, False):
-                    progress_queue.put({'status': 'cancelled'})
-                    raise Exception('Translation cancelled by user')
-
-            translator = PDFTranslator(
-                api_type=api_type,
-                api_key=api_key if api_key else None,
-                progress_callback=progress_callback,
-                log_callback=log_callback,
-                cancel_callback=check_cancelled,
-                glossary_terms=glossary_terms,
-                translation_mode=translation_mode,
-                audience=translation_audience,
-                style=translation_style
-            )
-
-            # 发送初始化日志
-            log_callback('正在初始化翻译器...', 'info')
-
-            translator.translate_pdf(
-                filepath,
-                output_filepath,
-                source_lang=source_lang,
-                target_lang=target_lang,
-                concurrency=concurrency
-            )
-
-            progress_queue.put({
-                'status': 'completed',
-                'task_id': task_id,
-                'output_file': output_filename,
-                'input_tokens': translator.input_tokens,
-                'output_tokens': translator.output_tokens,
-                'estimated_cost': round(translator._calculate_cost(), 4)
-            })
 
-        except Exception as e:
-            error_msg = str(e)
-            import traceback
-            tb_str = traceback.format_exc()
-            print(f'Translation error: {error_msg}')
-            print(tb_str)
-
-            if 'Translation cancelled by user' in error_msg:
-                progress_queue.put({'status': 'cancelled', 'message': '翻译已取消'})
-            else:
-                # 把完整堆栈发给前端，方便定位错误行
-                log_callback(f'翻译失败: {error_msg}', 'error')
-                log_callback(f'详细错误信息:\n{tb_str}', 'error')
-                progress_queue.put({'status': 'error', 'error': error_msg})
-        finally:
-            # 清理文件
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except:
-                pass
-            # 清理取消标志
-            with task_registry_lock:
-                if task_id in cancel_flags:
-                    del cancel_flags[task_id]
-
-    thread = threading.Thread(target=translate_in_background)
-    thread.start()
+def start_translation_task(task_id, task_dir, manifest, api_key, resume=False):
+    """把任务放入任务存储的队列，由空闲的 worker（进程内线程或 worker.py）领取执行。"""
+    job_store.enqueue(task_id, {
+        'task_dir': task_dir,
+        'output_file': manifest['output_file'],
+        'manifest': manifest,
+        'resume': resume,
+    }, api_key=api_key)
+    job_store.append_event(task_id, {'type': 'log', 'message': '任务已排队，等待空闲的翻译进程...', 'log_type': 'info'})
 
-    return jsonify({'status': 'processing', 'task_id': task_id})
 
-@app.route('/translate_text', methods=['POST'])
-def translate_text():
-    """提取PDF文本，翻译成指定语言，生成TXT文件"""
-    # 检查是否有文件
-    if 'file' not in request.files:
-        return jsonify({'error': '没有上传文件'}), 400
+def accept_translation_upload(kind, default_target_lang, output_ext):
+    # 已经通过 /analyze 上传过的文件只需传文档 id
+    doc_id = request.form.get('doc_id', '').strip()
+    file = None
+    if doc_id:
+        if upload_store.path(doc_id) is None:
+            return jsonify({'error': '文档已过期或不存在，请重新上传', 'code': 'doc_not_found'}), 404
+        original_filename = request.form.get('filename') or upload_store.filename(doc_id) or 'document.pdf'
+    else:
+        # 检查是否有文件
+        if 'file' not in request.files:
+            return jsonify({'error': '没有上传文件'}), 400
 
-    file = request.files['file']
+        file = request.files['file']
+        original_filename = file.filename
 
     # 检查文件名
-    if file.filename == '':
+    if original_filename == '':
         return jsonify({'error': '没有选择文件'}), 400
 
-    if not allowed_file(file.filename):
+    if not allowed_file(original_filename):
         return jsonify({'error': '只支持PDF文件'}), 400
 
     # 获取翻译参数
-    api_type = request.form.get('api_type', 'google')
+    settings = read_translation_settings(request.form, default_target_lang)
     api_key = request.form.get('api_key', '')
-    source_lang = request.form.get('source_lang', 'auto')
-    target_lang = request.form.get('target_lang', 'zh')
-    translation_mode = request.form.get('translation_mode', 'normal')
-    translation_audience = request.form.get('translation_audience', 'general')
-    translation_style = request.form.get('translation_style', 'storytelling')
     task_id = normalize_task_id(request.form.get('task_id', ''))
-    concurrency = int(request.form.get('concurrency', 4))
-    glossary_terms = parse_glossary_input(request.form.get('glossary_terms', '')) or load_scoped_glossary(file.filename)['terms']
+    resume = is_truthy(request.form.get('resume'))
+    glossary_terms = parse_glossary_input(request.form.get('glossary_terms', '')) or load_scoped_glossary(original_filename)['terms']
 
-    # 保存上传的文件到任务专属目录
-    filename = secure_filename(file.filename)
+    # 保存上传的文件到任务专属目录；续传时复用原任务目录，以便找到断点日志
+    filename = secure_filename(original_filename)
     base_name, _ = os.path.splitext(filename)
     if not base_name:
         base_name = "document"
 
-    task_dir = create_task_workspace(task_id)
-    filepath = os.path.join(task_dir, f"input_{filename}")
-    output_filename = f"translated_{base_name}.txt"
-    output_filepath = os.path.join(task_dir, output_filename)
-
-    file.save(filepath)
-
-    # 创建进度队列
-    progress_queue = queue.Queue()
-    with task_registry_lock:
-        progress_queues[task_id] = progress_queue
-        cancel_flags[task_id] = False
-        task_registry[task_id] = {
-            'task_dir': task_dir,
-            'output_file': output_filename,
-            'created_at': time.time()
-        }
+    task_dir = find_task_workspace(task_id) if resume else None
+    if not task_dir:
+        task_dir = create_task_workspace(task_id)
+    manifest = dict(settings)
+    manifest.update({
+        'kind': kind,
+        'input_file': f"input_{filename}",
+        'output_file': f"translated_{base_name}.{output_ext}",
+        'glossary_terms': glossary_terms,
+    })
+
+    input_path = os.path.join(task_dir, manifest['input_file'])
+    if file is not None:
+        file.save(input_path)
+    else:
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        if not upload_store.copy_to(doc_id, input_path):
+            return jsonify({'error': '文档已过期或不存在，请重新上传', 'code': 'doc_not_found'}), 404
+    write_task_manifest(task_dir, manifest)
 
-    # 进度回调函数
-    def progress_callback(progress_data):
-        progress_queue.put(progress_data)
+    start_translation_task(task_id, task_dir, manifest, api_key, resume=resume)
+    return jsonify({'status': 'processing', 'task_id': task_id})
 
-    # 在新线程中执行翻译
-    def translate_text_in_background():
-        try:
-            # 日志回调函数
-            def log_callback(message, log_type='info'):
-                log_entry = {
-                    'type': 'log',
-                    'message': message,
-                    'log_type': log_type
-                }
-                progress_queue.put(log_entry)
-
-            # 检查是否取消的函数
-            def check_cancelled():
-                if cancel_flags.get(task_id, False):
-                    progress_queue.put({'status': 'cancelled'})
-                    raise Exception('Translation cancelled by user')
-
-            translator = PDFTranslator(
-                api_type=api_type,
-                api_key=api_key if api_key else None,
-                progress_callback=progress_callback,
-                log_callback=log_callback,
-                cancel_callback=check_cancelled,
-                glossary_terms=glossary_terms,
-                translation_mode=translation_mode,
-                audience=translation_audience,
-                style=translation_style
-            )
-
-            # 发送初始化日志
-            log_callback('正在提取PDF文本...', 'info')
-
-            # 执行文本翻译
-            translator.translate_pdf_to_text(
-                filepath,
-                output_filepath,
-                source_lang=source_lang,
-                target_lang=target_lang,
-                concurrency=concurrency
-            )
-
-            progress_queue.put({
-                'status': 'completed',
-                'task_id': task_id,
-                'output_file': output_filename,
-                'input_tokens': translator.input_tokens,
-                'output_tokens': translator.output_tokens
-            })
 
-        except Exception as e:
-            error_msg = str(e)
-            import traceback
-            tb_str = traceback.format_exc()
-            print(f'Text translation error: {error_msg}')
-            print(tb_str)
-
-            if 'Translation cancelled by user' in error_msg:
-                progress_queue.put({'status': 'cancelled', 'message': '翻译已取消'})
-            else:
-                log_callback(f'翻译失败: {error_msg}', 'error')
-                log_callback(f'详细错误信息:\n{tb_str}', 'error')
-                progress_queue.put({'status': 'error', 'error': error_msg})
-        finally:
-            # 清理文件
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            except:
-                pass
-            # 清理取消标志
-            with task_registry_lock:
-                if task_id in cancel_flags:
-                    del cancel_flags[task_id]
-
-    thread = threading.Thread(target=translate_text_in_background)
-    thread.start()
+@app.route('/translate', methods=['POST'])
+def translate():
+    return accept_translation_upload('pdf', 'en', 'pdf')
 
-    return jsonify({'status': 'processing', 'task_id': task_id})
+
+@app.route('/translate_text', methods=['POST'])
+def translate_text():
+    """提取PDF文本，翻译成指定语言，生成TXT文件"""
+    return accept_translation_upload('text', 'zh', 'txt')
+
+
+@app.route('/resume/<task_id>', methods=['POST'])
+def resume_translation(task_id):
+    """续传中断的任务：复用任务目录里保留的输入文件、任务设置和断点日志。"""
+    task_id = normalize_task_id(task_id)
+    task = job_store.get_task(task_id)
+    if task and task['status'] in ACTIVE_STATUSES:
+        return jsonify({'error': '任务仍在运行'}), 409
+
+    task_dir = find_task_workspace(task_id)
+    manifest = load_task_manifest(task_dir) if task_dir else None
+    if not manifest:
+        return jsonify({'error': 'Task not found'}), 404
+    if not os.path.exists(os.path.join(task_dir, manifest['input_file'])):
+        return jsonify({'error': '任务已完成或输入文件已清理，无法续传'}), 410
+
+    # API 密钥只在排队期间暂存，worker 领取后即清除，续传时由前端重新提供
+    api_key = request.form.get('api_key', '')
+    start_translation_task(task_id, task_dir, manifest, api_key, resume=True)
+    return jsonify({'status': 'processing', 'task_id': task_id, 'resumed': True})
 
 @app.route('/cancel/<task_id>', methods=['POST'])
 def cancel_translation(task_id):
     """取消翻译任务"""
-    with task_registry_lock:
-        if task_id in cancel_flags:
-            cancel_flags[task_id] = True
-            return jsonify({'status': 'cancelling', 'message': '正在取消翻译...'})
+    if job_store.request_cancel(task_id):
+        return jsonify({'status': 'cancelling', 'message': '正在取消翻译...'})
     return jsonify({'error': 'Task not found'}), 404
 
 @app.route('/progress/<task_id>')
 def progress(task_id):
-    """Server-Sent Events端点，用于实时推送进度"""
+    """Server-Sent Events端点，用于实时推送进度
+
+    事件带有 id，断线重连时浏览器会带上 Last-Event-ID，从断点继续推送而不是重放全部事件。
+    """
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+
     def generate():
-        with task_registry_lock:
-            queue_obj = progress_queues.get(task_id)
-        if not queue_obj:
+        if job_store.get_task(task_id) is None:
             error_data = {'error': 'Invalid task ID'}
             yield f"data: {json.dumps(error_data)}\n\n"
             return
 
+        cursor = last_event_id
         try:
             while True:
-                try:
-                    # 增加超时时间到120秒
-                    progress = queue_obj.get(timeout=120)
+                events = job_store.read_events(task_id, after=cursor, timeout=PROGRESS_HEARTBEAT_INTERVAL)
+                if not events:
+                    # 发送心跳保持连接
+                    yield ": heartbeat\n\n"
+                    continue
 
-                    # 发送心跳，保持连接
+                finished = False
+                for event_id, progress in events:
+                    cursor = event_id
                     if progress.get('type') == 'heartbeat':
                         yield ": heartbeat\n\n"
                         continue
 
                     # 使用json.dumps确保正确的JSON格式
-                    yield f"data: {json.dumps(progress)}\n\n"
+                    yield f"id: {event_id}\ndata: {json.dumps(progress)}\n\n"
 
-                    if progress.get('status') == 'completed':
-                        break
-                    elif progress.get('status') == 'error':
+                    if progress.get('status') in FINAL_STATUSES:
+                        finished = True
                         break
-                    elif progress.get('status') == 'cancelled':
-                        break
-
-                except queue.Empty:
-                    # 发送心跳保持连接
-                    yield ": heartbeat\n\n"
-                    continue
+                if finished:
+                    break
 
         except GeneratorExit:
             # 客户端断开连接
@@ -732,19 +727,13 @@ def progress(task_id):
             print(f"Error in progress stream: {e}")
             error_data = {'error': str(e)}
             yield f"data: {json.dumps(error_data)}\n\n"
-        finally:
-            # 清理队列
-            with task_registry_lock:
-                if task_id in progress_queues:
-                    del progress_queues[task_id]
 
     return Response(generate(), mimetype='text/event-stream')
 
 @app.route('/download/<task_id>/<filename>')
 def download(task_id, filename):
     """下载翻译后的文件"""
-    with task_registry_lock:
-        task_meta = task_registry.get(task_id)
+    task_meta = job_store.get_task(task_id)
 
     if not task_meta:
         return jsonify({'error': 'Task not found'}), 404
@@ -773,6 +762,47 @@ def download(task_id, filename):
     )
 
 
+@app.route('/preview/<task_id>')
+def preview(task_id):
+    """预览已翻译完的页面，不必等整个任务结束。
+
+    PDF 任务进行中（或中断后）从预览分片拼接，完成后从最终文件取页；pages 形如 1-20、5、30-、1-3,8，
+    缺省为全部可用页。TXT 任务按顺序流式写出，直接返回当前已写出的部分。
+    """
+    task_meta = job_store.get_task(task_id)
+    if not task_meta:
+        return jsonify({'error': 'Task not found'}), 404
+
+    output_file = task_meta.get('output_file') or ''
+    output_path = os.path.join(task_meta['task_dir'], output_file)
+    if output_file.endswith('.txt'):
+        if not os.path.exists(output_path):
+            return jsonify({'error': 'Preview not ready'}), 404
+        return send_file(output_path, mimetype='text/plain; charset=utf-8')
+
+    if task_meta['status'] == 'completed' and os.path.exists(output_path):
+        with fitz.open(output_path) as doc:
+            pages_ready = doc.page_count
+        sources = [(1, pages_ready, output_path)]
+    else:
+        sources = list_fragments(preview_dir_for(task_meta['task_dir']))
+        pages_ready = available_pages(sources)
+    if not pages_ready:
+        return jsonify({'error': 'Preview not ready', 'pages_ready': 0}), 404
+
+    try:
+        ranges = parse_page_ranges(request.args.get('pages', ''), pages_ready)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ranges:
+        return jsonify({'error': '请求的页面还没有翻译完成', 'pages_ready': pages_ready}), 404
+
+    response = Response(build_preview(sources, ranges), mimetype='application/pdf')
+    response.headers['Content-Disposition'] = f'inline; filename=preview_{task_id}.pdf'
+    response.headers['X-Preview-Pages'] = str(pages_ready)
+    return response
+
+
 @app.route('/glossary', methods=['GET', 'POST'])
 def glossary():
     if request.method == 'GET':
@@ -826,6 +856,7 @@ def export_glossary():
 
 if __name__ == '__main__':
     # 本地运行：python app.py
-    # 生产部署：gunicorn --workers 1 --threads 8 --timeout 0 app:app
-    # 注意：必须单进程，progress_queues/cancel_flags 存于内存，多进程会丢失 SSE 进度流
+    # 生产部署：gunicorn --workers 4 --threads 8 --timeout 0 app:app
+    # 任务状态和进度在共享的任务存储里，可以多进程部署；也可以设 PDFAPP_INPROCESS_WORKERS=0
+    # 并另起 python worker.py 进程专门执行翻译
     app.run(debug=False, use_reloader=False, host='0.0.0.0', port=5001, threaded=True)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+try:
+    import httpx
+except ImportError:  # httpx 为可选依赖，缺失时调用方回退到线程模式
+    httpx = None
+
+DEFAULT_MAX_CONNECTIONS = 256
+
+
+class AsyncProviderEngine:
+    """在单个后台事件循环上承载所有 chat 服务调用，共享一个连接池化的 HTTP/2 客户端。
+
+    同步代码通过 submit 拿到 concurrent.futures.Future，一个进程可同时挂起
+    数百个在途请求而无需同等数量的线程；限流仍由 rate_limiter 统一控制。
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS):
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name='async-provider-engine', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self._client = self.submit(self._create_client(max_connections)).result()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _create_client(self, max_connections):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        try:
+            return httpx.AsyncClient(http2=True, limits=limits)
+        except ImportError:
+            # 未安装 h2 时退回 HTTP/1.1 连接池
+            return httpx.AsyncClient(limits=limits)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def post_chat_completion(self, limiter, url, headers, payload, timeout, estimated_tokens=0, retries=0):
+        """发送 chat/completions 请求，返回解析后的 JSON；429/503 由限流器控制等待后重试。"""
+        for attempt in range(retries + 1):
+            await limiter.acquire_async(estimated_tokens)
+            try:
+                response = await self._client.post(url, headers=headers, json=payload, timeout=timeout)
+            finally:
+                limiter.release()
+            limiter.observe(response.status_code, response.headers)
+            if response.status_code in (429, 503) and attempt < retries:
+                continue
+            return response.json()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_async_engine():
+    """返回进程级共享的异步引擎；未安装 httpx 时返回 None。"""
+    global _engine
+    if httpx is None:
+        return None
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncProviderEngine()
+        return _engine
@@ -0,0 +1,83 @@
+class BatchBudget:
+    """一次批量请求的容量。
+
+    max_input / max_output 是整批原文、译文的预估开销上限（字符数或 tokens，取决于 measure），
+    max_output 为 None 表示不限制输出；item_overhead 是每一项额外的包装开销（分隔符、XML 标签）；
+    单项开销超过 max_item 的块不参与合并，单独翻译。
+    """
+
+    def __init__(self, max_input, max_item, max_output=None, item_overhead=0):
+        self.max_input = max_input
+        self.max_item = max_item
+        self.max_output = max_output
+        self.item_overhead = item_overhead
+
+
+class PackedBatch:
+    def __init__(self, budget):
+        self.budget = budget
+        self.items = []
+        self.input_cost = 0
+        self.output_cost = 0
+
+    def fits(self, input_cost, output_cost):
+        if self.input_cost + input_cost > self.budget.max_input:
+            return False
+        if self.budget.max_output is not None and self.output_cost + output_cost > self.budget.max_output:
+            return False
+        return True
+
+    def add(self, item, input_cost, output_cost):
+        self.items.append(item)
+        self.input_cost += input_cost
+        self.output_cost += output_cost
+
+    @property
+    def fill_ratio(self):
+        """按输入、输出里更紧的一边计算的装填率。"""
+        ratio = self.input_cost / self.budget.max_input if self.budget.max_input else 0.0
+        if self.budget.max_output:
+            ratio = max(ratio, self.output_cost / self.budget.max_output)
+        return ratio
+
+
+def pack_blocks(blocks, budget, measure, output_measure=None, is_batchable=None):
+    """把文本块装箱成批次，返回 [('single'|'batch', [block, ...], fill_ratio), ...]。
+
+    不可合并的块（is_batchable 返回 False，或单项开销超过 budget.max_item）单独成组；
+    其余按开销从大到小首次适应装箱，不要求在文档里相邻，标题等块不会再把批次截断。
+    批内按原顺序排列，各组按首块的位置排序；块对象原样保留，调用方按块自身的 id 回填译文。
+    """
+    singles = []
+    candidates = []
+    for position, block in enumerate(blocks):
+        input_cost = measure(block)
+        if (is_batchable is not None and not is_batchable(block)) or input_cost > budget.max_item:
+            singles.append((position, block))
+            continue
+        output_cost = output_measure(block) if output_measure else 0
+        candidates.append((
+            input_cost + budget.item_overhead,
+            output_cost + budget.item_overhead,
+            position,
+            block,
+        ))
+
+    batches = []
+    # 开销相同时按文档顺序，保证结果稳定
+    for input_cost, output_cost, position, block in sorted(candidates, key=lambda item: (-item[0], item[2])):
+        for batch in batches:
+            if batch.fits(input_cost, output_cost):
+                batch.add((position, block), input_cost, output_cost)
+                break
+        else:
+            batch = PackedBatch(budget)
+            batch.add((position, block), input_cost, output_cost)
+            batches.append(batch)
+
+    groups = [(position, 'single', [block], None) for position, block in singles]
+    for batch in batches:
+        batch.items.sort(key=lambda item: item[0])
+        groups.append((batch.items[0][0], 'batch', [block for _, block in batch.items], batch.fill_ratio))
+    groups.sort(key=lambda group: group[0])
+    return [(group_type, group_blocks, fill_ratio) for _, group_type, group_blocks, fill_ratio in groups]
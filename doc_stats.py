@@ -0,0 +1,86 @@
+import math
+import random
+import re
+
+# 一个正则按连续片段一次扫完四类字符，不再为每一类各扫一遍全文、各生成一个逐字符的匹配列表
+CHAR_CLASS_PATTERN = re.compile(
+    r'(?P<cjk>[\u4e00-\u9fff]+)'
+    r'|(?P<latin>[a-zA-Z]+)'
+    r'|(?P<kana>[\u3040-\u309f\u30a0-\u30ff]+)'
+    r'|(?P<hangul>[\uac00-\ud7af]+)'
+)
+CHAR_CLASSES = ('cjk', 'latin', 'kana', 'hangul')
+
+# 抽样分析：至少读这么多页，之后每批检查一次，总字数的 95% 相对误差不超过 SAMPLE_TARGET_MARGIN 即停止
+SAMPLE_MIN_PAGES = 16
+SAMPLE_MAX_PAGES = 64
+SAMPLE_TARGET_MARGIN = 0.05
+# 每攒够这么多页拼成一段统计一次，减少逐页调用的开销
+SAMPLE_BATCH_PAGES = 8
+
+
+class TextStats:
+    """按段累计的字符统计，结果与把所有段用空格拼成一个字符串再统计完全一致，但不需要真的拼接全文。"""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(CHAR_CLASSES, 0)
+        self.total_chars = 0
+        self.word_count = 0
+        self.segments = 0
+        # 拼接后全文首尾的空白长度，用于得到 strip() 之后的字数
+        self._leading_space = 0
+        self._trailing_space = 0
+        self._seen_content = False
+
+    def add(self, text):
+        if self.segments:
+            # 段与段之间的空格分隔符
+            self.total_chars += 1
+            self._trailing_space += 1
+            if not self._seen_content:
+                self._leading_space += 1
+        self.segments += 1
+        self.total_chars += len(text)
+        self.word_count += len(text.split())
+        for match in CHAR_CLASS_PATTERN.finditer(text):
+            self.counts[match.lastgroup] += match.end() - match.start()
+
+        stripped = text.strip()
+        if not stripped:
+            self._trailing_space += len(text)
+            if not self._seen_content:
+                self._leading_space += len(text)
+            return
+        if not self._seen_content:
+            self._leading_space += len(text) - len(text.lstrip())
+            self._seen_content = True
+        self._trailing_space = len(text) - len(text.rstrip())
+
+    @property
+    def char_count(self):
+        if not self._seen_content:
+            return 0
+        return self.total_chars - self._leading_space - self._trailing_space
+
+
+def sample_order(total_pages, seed=None):
+    """抽样读取的页序：伪随机排列，任意前缀都是均匀分布在全书的简单随机样本；同一份文档顺序固定。"""
+    order = list(range(total_pages))
+    random.Random(total_pages if seed is None else seed).shuffle(order)
+    return order
+
+
+def total_margin(page_sizes, total_pages):
+    """按已抽样各页的字数估计全书总字数时，95% 置信水平的相对误差（含有限总体校正）。"""
+    sampled = len(page_sizes)
+    if sampled >= total_pages:
+        return 0.0
+    if sampled < 2:
+        return 1.0
+    mean = sum(page_sizes) / sampled
+    if mean <= 0:
+        # 抽到的页都没有文字（扫描件）：无法给出相对误差，按样本量保守估计
+        return 1.0 / math.sqrt(sampled)
+    variance = sum((size - mean) ** 2 for size in page_sizes) / (sampled - 1)
+    correction = (total_pages - sampled) / (total_pages - 1)
+    return 1.96 * math.sqrt(variance / sampled * correction) / mean
@@ -0,0 +1,139 @@
+import importlib.util
+import os
+import threading
+
+import fitz
+
+
+class FontLibrary:
+    """进程内共享的外部字体：每个字体文件只读取、解析一次。
+
+    - font(path)：fitz.Font，供字号拟合量字宽、查字形覆盖；
+    - font_pack(font_files)：把一组字体嵌入到只有一页的小 PDF 里并压缩，得到的字节串按字体组合缓存，
+      每个输出文档用 insert_pdf 一次性拷入已压缩的字体对象，不再逐页调用 insert_font 重新解析、嵌入字体文件；
+    - covers(path, text)：字体是否含有 text 的全部字形，逐字符查询结果按字体缓存。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fonts = {}
+        self._packs = {}
+        self._coverage = {}
+
+    def font(self, path):
+        """加载失败或文件不存在时返回 None（同样缓存，不重复尝试）。"""
+        if path in self._fonts:
+            return self._fonts[path]
+        with self._lock:
+            if path not in self._fonts:
+                font = None
+                if path and os.path.exists(path):
+                    try:
+                        font = fitz.Font(fontfile=path)
+                    except Exception as e:
+                        print(f'[WARN] 字体加载失败({path}): {e}')
+                self._fonts[path] = font
+            return self._fonts[path]
+
+    def covers(self, path, text):
+        font = self.font(path)
+        if font is None:
+            return False
+        coverage = self._coverage.setdefault(path, {})
+        for char in set(text):
+            if char.isspace():
+                continue
+            covered = coverage.get(char)
+            if covered is None:
+                covered = coverage[char] = bool(font.has_glyph(ord(char)))
+            if not covered:
+                return False
+        return True
+
+    def font_pack(self, font_files):
+        """font_files: ((fontname, path), ...)；返回 (PDF 字节串, 成功嵌入的字体名元组)。"""
+        key = tuple(font_files)
+        if key in self._packs:
+            return self._packs[key]
+        with self._lock:
+            if key not in self._packs:
+                pack = fitz.open()
+                try:
+                    page = pack.new_page()
+                    embedded = []
+                    for fontname, path in key:
+                        if not os.path.exists(path):
+                            continue
+                        try:
+                            page.insert_font(fontname=fontname, fontfile=path)
+                            embedded.append(fontname)
+                        except Exception as e:
+                            print(f'[WARN] 字体嵌入失败({fontname}): {e}')
+                    data = pack.tobytes(garbage=1, deflate=1, deflate_fonts=1) if embedded else b''
+                finally:
+                    pack.close()
+                self._packs[key] = (data, tuple(embedded))
+            return self._packs[key]
+
+
+class DocumentFonts:
+    """一个输出文档里的外部字体：整份文档只嵌入一次，各页的资源字典引用同一组字体 xref。"""
+
+    def __init__(self, doc, font_files, library=None):
+        self.doc = doc
+        self.xrefs = {}
+        data, embedded = (library or get_font_library()).font_pack(font_files)
+        if not embedded:
+            return
+        pack = fitz.open('pdf', data)
+        try:
+            doc.insert_pdf(pack)
+        finally:
+            pack.close()
+        # 拷入的那一页只是字体的载体，取到 xref 后删掉；字体对象由后续页面引用
+        for xref, _, _, _, fontname, _ in doc.get_page_fonts(len(doc) - 1):
+            if fontname in embedded:
+                self.xrefs[fontname] = xref
+        doc.delete_page(len(doc) - 1)
+
+    def register(self, page):
+        """把全部字体加入 page 的 /Resources /Font，返回可用的字体名；insert_textbox 按名字引用。"""
+        registered = []
+        for fontname, xref in self.xrefs.items():
+            try:
+                self._link_font(page, fontname, xref)
+                registered.append(fontname)
+            except Exception as e:
+                print(f'[WARN] 字体引用失败(页{page.number + 1}, {fontname}): {e}')
+        return registered
+
+    def _link_font(self, page, fontname, xref):
+        # /Resources 和 /Font 都可能是间接对象（复制来的原页面、new_page 新建的页面都有），逐级解引用
+        target, path = page.xref, ''
+        for key in ('Resources', 'Font'):
+            value_type, value = self.doc.xref_get_key(target, path + key)
+            if value_type == 'xref':
+                target, path = int(value.split()[0]), ''
+            else:
+                path = path + key + '/'
+        self.doc.xref_set_key(target, path + fontname, f'{xref} 0 R')
+
+
+def subset_fonts(doc):
+    """按实际用到的字形裁剪嵌入字体（PyMuPDF 的 subset_fonts，需要 fontTools）；未安装时返回 False。"""
+    if importlib.util.find_spec('fontTools') is None:
+        return False
+    doc.subset_fonts()
+    return True
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_font_library():
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = FontLibrary()
+        return _library
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+JOURNAL_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_job_key(input_path, settings):
+    """任务键 = 输入文件内容哈希 + 翻译设置；任一变化都不能复用旧断点。"""
+    raw = json.dumps([JOURNAL_VERSION, file_sha256(input_path), list(settings)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def journal_path_for(workspace_dir, job_key):
+    return os.path.join(workspace_dir or '.', f'journal_{job_key[:16]}.jsonl')
+
+
+class JobJournal:
+    """追加写的 JSONL 断点日志：每完成一个翻译单元写一行 {"k": 单元键, "v": 译文}。
+
+    第一行记录任务键；续传时任务键不一致或文件损坏的行都会被忽略。
+    进程被杀时最多丢失最后一行，已落盘的单元续传时直接跳过。
+    """
+
+    def __init__(self, path, job_key, resume=False):
+        self.path = path
+        self.job_key = job_key
+        self._lock = threading.Lock()
+        self._entries = self._load() if resume else {}
+        self.resumed_count = len(self._entries)
+        mode = 'a' if self._entries else 'w'
+        self._file = open(path, mode, encoding='utf-8')
+        if mode == 'a' and not self._ends_with_newline():
+            # 崩溃时写了一半的末行没有换行符，先补上，续写的第一行才不会粘在它后面一起作废
+            self._file.write('\n')
+        if mode == 'w':
+            self._write_line({'job': job_key, 'version': JOURNAL_VERSION, 'created_at': time.time()})
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = None
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时写了一半的行
+                    if header is None:
+                        header = item
+                        if header.get('job') != self.job_key:
+                            print(f'[WARN] 断点日志与当前任务不匹配，重新开始: {self.path}')
+                            return {}
+                        continue
+                    if 'k' in item and item.get('v') is not None:
+                        entries[item['k']] = item['v']
+        except OSError as e:
+            print(f'[WARN] 断点日志读取失败，重新开始: {e}')
+            return {}
+        return entries
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if not f.tell():
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _write_line(self, item):
+        self._file.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def get(self, unit_key):
+        return self._entries.get(unit_key)
+
+    def record(self, unit_key, translated):
+        if translated is None:
+            return
+        with self._lock:
+            if self._entries.get(unit_key) == translated:
+                return
+            self._entries[unit_key] = translated
+            try:
+                self._write_line({'k': unit_key, 'v': translated})
+            except (OSError, ValueError) as e:
+                print(f'[WARN] 断点日志写入失败: {e}')
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self, remove=False):
+        with self._lock:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            if remove:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
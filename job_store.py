@@ -0,0 +1,482 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 任务存储默认落盘到项目 cache 目录，同机的多个 Web/worker 进程共享同一个文件
+DEFAULT_JOB_STORE_PATH = os.path.join(BASE_DIR, 'cache', 'jobs.sqlite3')
+# 读取进度事件时的轮询间隔（秒）
+EVENT_POLL_INTERVAL = 0.2
+# 已结束任务的状态和事件保留时长（秒）
+FINISHED_TASK_TTL = 24 * 3600
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+class JobStore(ABC):
+    """任务存储接口：待执行队列、任务状态、进度事件和取消标志。
+
+    Web 进程 enqueue 任务、读取事件、设置取消标志；worker 进程 claim 任务、写事件、查询取消标志，
+    两边只通过存储交互，因此可以各自横向扩展，/progress 也可以由任意 Web 进程提供。
+    Redis 之类的后端实现同样的方法即可：任务状态对应 hash，队列对应 list（BLMOVE 原子领取），
+    进度事件对应 stream（XADD / XREAD BLOCK），取消标志是 hash 里的一个字段。
+
+    任务字典字段：task_id、status、job（任务设置）、task_dir、output_file、worker_id、
+    cancel_requested、error、created_at、updated_at。
+
+    API 密钥：为了让其他进程里的 worker 能执行任务，enqueue 时传入的密钥以明文暂存在存储里，
+    直到任务被领取、结束或取消时清除。共享后端必须只对运行本服务的账号可读；
+    不希望密钥离开 Web 进程时，用 memory 存储并由内嵌 worker 执行任务。
+    """
+
+    @abstractmethod
+    def enqueue(self, task_id, job, api_key=None):
+        """登记任务并放入队列；同一 task_id 重新入队（续传）时清空旧事件。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, worker_id):
+        """原子地领取最早排队的任务，返回 (任务字典, api_key)，没有任务时返回 None。
+
+        API 密钥只在排队期间暂存，领取时一并取出并从存储中清除。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_task(self, task_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def finish(self, task_id, status, error=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_event(self, task_id, event):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_events(self, task_id, after=0, timeout=0):
+        """返回 id 大于 after 的事件 [(id, event), ...]；没有新事件时最多等待 timeout 秒。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def request_cancel(self, task_id):
+        """设置取消标志；排队中的任务直接标记为已取消。任务不存在或已结束时返回 False。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_cancel_requested(self, task_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, task_ids):
+        """worker 定期为正在执行的任务续租。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire_stale(self, lease_seconds):
+        """把超过租期没有心跳的运行中任务标记为失败（worker 进程已退出），返回这些 task_id。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def prune(self, older_than=FINISHED_TASK_TTL):
+        """清理结束已久的任务及其事件。"""
+        raise NotImplementedError
+
+
+def _lost_worker_event():
+    return {'status': 'error', 'error': '执行任务的 worker 已退出，可调用 /resume 续传'}
+
+
+class SQLiteJobStore(JobStore):
+    """基于 SQLite 的任务存储，WAL 模式下同机多个进程可以同时读写。
+
+    排队任务的 API 密钥明文存放在 jobs.api_key 列，文件权限限制为 0600。
+    """
+
+    def __init__(self, path=DEFAULT_JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = self._connect(path)
+
+    def _connect(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._restrict_permissions(path)
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' task_id TEXT PRIMARY KEY,'
+            ' status TEXT NOT NULL,'
+            ' job TEXT NOT NULL,'
+            ' api_key TEXT,'
+            ' task_dir TEXT,'
+            ' output_file TEXT,'
+            ' worker_id TEXT,'
+            ' cancel_requested INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' task_id TEXT NOT NULL,'
+            ' event TEXT NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS events_task ON events(task_id, id)')
+        return conn
+
+    def _restrict_permissions(self, path):
+        """排队中的任务带着明文 API 密钥：数据库文件只允许属主读写。
+
+        先以 0600 创建文件再交给 SQLite（WAL/SHM 文件沿用数据库文件的权限）；
+        旧版本创建的 0644 文件在打开时收紧。
+        """
+        if path == ':memory:':
+            return
+        try:
+            os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.chmod(path + suffix, 0o600)
+        except OSError as e:
+            print(f'[WARN] 无法收紧任务存储文件权限 {path}: {e}')
+
+    def _row_to_task(self, row):
+        if row is None:
+            return None
+        task_id, status, job, task_dir, output_file, worker_id, cancel_requested, error, created_at, updated_at = row
+        return {
+            'task_id': task_id,
+            'status': status,
+            'job': json.loads(job),
+            'task_dir': task_dir,
+            'output_file': output_file,
+            'worker_id': worker_id,
+            'cancel_requested': bool(cancel_requested),
+            'error': error,
+            'created_at': created_at,
+            'updated_at': updated_at,
+        }
+
+    _TASK_COLUMNS = 'task_id, status, job, task_dir, output_file, worker_id, cancel_requested, error, created_at, updated_at'
+
+    def enqueue(self, task_id, job, api_key=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('DELETE FROM events WHERE task_id = ?', (task_id,))
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO jobs (task_id, status, job, api_key, task_dir, output_file,'
+                    ' worker_id, cancel_requested, error, created_at, updated_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, NULL, 0, NULL, ?, ?)',
+                    (task_id, 'queued', json.dumps(job, ensure_ascii=False), api_key or None,
+                     job.get('task_dir'), job.get('output_file'), now, now)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def claim(self, worker_id):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT task_id, api_key FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', ('queued',)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+                task_id, api_key = row
+                self._conn.execute(
+                    'UPDATE jobs SET status = ?, worker_id = ?, api_key = NULL, updated_at = ? WHERE task_id = ?',
+                    ('running', worker_id, time.time(), task_id)
+                )
+                task_row = self._conn.execute(
+                    f'SELECT {self._TASK_COLUMNS} FROM jobs WHERE task_id = ?', (task_id,)
+                ).fetchone()
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return self._row_to_task(task_row), api_key
+
+    def get_task(self, task_id):
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT {self._TASK_COLUMNS} FROM jobs WHERE task_id = ?', (task_id,)
+            ).fetchone()
+        return self._row_to_task(row)
+
+    def finish(self, task_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, api_key = NULL, updated_at = ? WHERE task_id = ?',
+                (status, error, time.time(), task_id)
+            )
+
+    def append_event(self, task_id, event):
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO events (task_id, event) VALUES (?, ?)',
+                (task_id, json.dumps(event, ensure_ascii=False))
+            )
+            return cursor.lastrowid
+
+    def read_events(self, task_id, after=0, timeout=0):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT id, event FROM events WHERE task_id = ? AND id > ? ORDER BY id',
+                    (task_id, after)
+                ).fetchall()
+            if rows or time.monotonic() >= deadline:
+                return [(event_id, json.loads(event)) for event_id, event in rows]
+            time.sleep(EVENT_POLL_INTERVAL)
+
+    def request_cancel(self, task_id):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT status FROM jobs WHERE task_id = ?', (task_id,)).fetchone()
+                if row is None or row[0] not in ACTIVE_STATUSES:
+                    self._conn.execute('COMMIT')
+                    return False
+                if row[0] == 'queued':
+                    self._conn.execute(
+                        'UPDATE jobs SET status = ?, cancel_requested = 1, api_key = NULL, updated_at = ? WHERE task_id = ?',
+                        ('cancelled', now, task_id)
+                    )
+                    self._conn.execute(
+                        'INSERT INTO events (task_id, event) VALUES (?, ?)',
+                        (task_id, json.dumps({'status': 'cancelled', 'message': '翻译已取消'}, ensure_ascii=False))
+                    )
+                else:
+                    self._conn.execute(
+                        'UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE task_id = ?', (now, task_id)
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return True
+
+    def is_cancel_requested(self, task_id):
+        with self._lock:
+            row = self._conn.execute('SELECT cancel_requested FROM jobs WHERE task_id = ?', (task_id,)).fetchone()
+        return bool(row and row[0])
+
+    def heartbeat(self, task_ids):
+        if not task_ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE jobs SET updated_at = ? WHERE task_id = ? AND status = ?',
+                [(now, task_id, 'running') for task_id in task_ids]
+            )
+
+    def expire_stale(self, lease_seconds):
+        cutoff = time.time() - lease_seconds
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                stale = [row[0] for row in self._conn.execute(
+                    'SELECT task_id FROM jobs WHERE status = ? AND updated_at < ?', ('running', cutoff)
+                ).fetchall()]
+                for task_id in stale:
+                    event = _lost_worker_event()
+                    self._conn.execute(
+                        'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE task_id = ?',
+                        ('error', event['error'], time.time(), task_id)
+                    )
+                    self._conn.execute(
+                        'INSERT INTO events (task_id, event) VALUES (?, ?)',
+                        (task_id, json.dumps(event, ensure_ascii=False))
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return stale
+
+    def prune(self, older_than=FINISHED_TASK_TTL):
+        cutoff = time.time() - older_than
+        placeholders = ', '.join('?' for _ in FINAL_STATUSES)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    f'DELETE FROM events WHERE task_id IN (SELECT task_id FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?)',
+                    FINAL_STATUSES + (cutoff,)
+                )
+                self._conn.execute(
+                    f'DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?',
+                    FINAL_STATUSES + (cutoff,)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+
+class MemoryJobStore(JobStore):
+    """进程内的任务存储：语义与 SQLiteJobStore 相同，供单进程运行和测试使用。"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._tasks = {}
+        self._api_keys = {}
+        self._events = {}
+        self._next_event_id = 0
+
+    def _snapshot(self, task):
+        if task is None:
+            return None
+        snapshot = dict(task)
+        snapshot['job'] = json.loads(json.dumps(task['job']))
+        return snapshot
+
+    def _append_locked(self, task_id, event):
+        self._next_event_id += 1
+        self._events.setdefault(task_id, []).append((self._next_event_id, json.loads(json.dumps(event))))
+        self._cond.notify_all()
+        return self._next_event_id
+
+    def enqueue(self, task_id, job, api_key=None):
+        now = time.time()
+        with self._cond:
+            self._events.pop(task_id, None)
+            self._tasks[task_id] = {
+                'task_id': task_id,
+                'status': 'queued',
+                'job': json.loads(json.dumps(job)),
+                'task_dir': job.get('task_dir'),
+                'output_file': job.get('output_file'),
+                'worker_id': None,
+                'cancel_requested': False,
+                'error': None,
+                'created_at': now,
+                'updated_at': now,
+            }
+            self._api_keys[task_id] = api_key or None
+            self._cond.notify_all()
+
+    def claim(self, worker_id):
+        with self._cond:
+            queued = [task for task in self._tasks.values() if task['status'] == 'queued']
+            if not queued:
+                return None
+            task = min(queued, key=lambda item: item['created_at'])
+            task.update({'status': 'running', 'worker_id': worker_id, 'updated_at': time.time()})
+            return self._snapshot(task), self._api_keys.pop(task['task_id'], None)
+
+    def get_task(self, task_id):
+        with self._cond:
+            return self._snapshot(self._tasks.get(task_id))
+
+    def finish(self, task_id, status, error=None):
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.update({'status': status, 'error': error, 'updated_at': time.time()})
+            self._api_keys.pop(task_id, None)
+
+    def append_event(self, task_id, event):
+        with self._cond:
+            return self._append_locked(task_id, event)
+
+    def read_events(self, task_id, after=0, timeout=0):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = [item for item in self._events.get(task_id, []) if item[0] > after]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._cond.wait(remaining)
+
+    def request_cancel(self, task_id):
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None or task['status'] not in ACTIVE_STATUSES:
+                return False
+            task['cancel_requested'] = True
+            task['updated_at'] = time.time()
+            if task['status'] == 'queued':
+                task['status'] = 'cancelled'
+                self._api_keys.pop(task_id, None)
+                self._append_locked(task_id, {'status': 'cancelled', 'message': '翻译已取消'})
+            return True
+
+    def is_cancel_requested(self, task_id):
+        with self._cond:
+            task = self._tasks.get(task_id)
+            return bool(task and task['cancel_requested'])
+
+    def heartbeat(self, task_ids):
+        now = time.time()
+        with self._cond:
+            for task_id in task_ids:
+                task = self._tasks.get(task_id)
+                if task is not None and task['status'] == 'running':
+                    task['updated_at'] = now
+
+    def expire_stale(self, lease_seconds):
+        cutoff = time.time() - lease_seconds
+        stale = []
+        with self._cond:
+            for task in self._tasks.values():
+                if task['status'] == 'running' and task['updated_at'] < cutoff:
+                    event = _lost_worker_event()
+                    task.update({'status': 'error', 'error': event['error'], 'updated_at': time.time()})
+                    self._append_locked(task['task_id'], event)
+                    stale.append(task['task_id'])
+        return stale
+
+    def prune(self, older_than=FINISHED_TASK_TTL):
+        cutoff = time.time() - older_than
+        with self._cond:
+            for task_id in [task_id for task_id, task in self._tasks.items()
+                            if task['status'] in FINAL_STATUSES and task['updated_at'] < cutoff]:
+                self._tasks.pop(task_id, None)
+                self._events.pop(task_id, None)
+
+
+_store_instance = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """返回进程级共享的任务存储。
+
+    PDFAPP_JOB_STORE 为空时使用默认 SQLite 文件，为 memory 时使用进程内存储（仅限单进程），
+    其余取值视为 SQLite 文件路径。
+    """
+    global _store_instance
+    with _store_lock:
+        if _store_instance is None:
+            setting = (os.environ.get('PDFAPP_JOB_STORE') or '').strip()
+            if setting == 'memory':
+                _store_instance = MemoryJobStore()
+            else:
+                path = setting or DEFAULT_JOB_STORE_PATH
+                try:
+                    _store_instance = SQLiteJobStore(path)
+                except (OSError, sqlite3.Error) as e:
+                    # 只读文件系统等情况下退化为进程内存储，此时只能单进程部署
+                    print(f'[WARN] 任务存储无法写入 {path}，改用进程内存储（仅支持单进程）: {e}')
+                    _store_instance = MemoryJobStore()
+        return _store_instance
@@ -0,0 +1,67 @@
+import re
+
+# 页眉、页脚所在的页面上下边距（占页高的比例）
+HEADER_BAND = 0.12
+FOOTER_BAND = 0.88
+# 超过这个长度的块不当作页眉页脚
+MAX_TEMPLATE_CHARS = 160
+# 纵向位置按这个步长（pt）分桶，同一模板在各页的位置允许少量抖动
+POSITION_STEP = 8
+
+DIGIT_RUN = re.compile(r'\d+')
+
+
+def template_key(text, rect, page_height):
+    """页眉页脚模板键：(上/下边距, 纵向位置桶, 数字替换为 # 的规范化文本)。
+
+    只有位于上下边距、长度较短且含数字的块才有模板键；不含数字的重复块由精确去重处理。
+    """
+    if not page_height or rect is None:
+        return None
+    normalized = " ".join(text.split())
+    if not normalized or len(normalized) > MAX_TEMPLATE_CHARS or not DIGIT_RUN.search(normalized):
+        return None
+    if rect.y1 <= page_height * HEADER_BAND:
+        band = 'header'
+    elif rect.y0 >= page_height * FOOTER_BAND:
+        band = 'footer'
+    else:
+        return None
+    return (band, round(rect.y0 / POSITION_STEP), DIGIT_RUN.sub('#', normalized))
+
+
+def derive_template(source_text, translated_text):
+    """从一对原文/译文推出译文模板：字面片段和数字槽位（原文中第几个数字）交替的列表。
+
+    译文里的数字必须和原文的数字一一对应（顺序相同，或各数字互不相同时允许换序），
+    否则返回 None，例如模型把数字译成了汉字，或者增删了数字。
+    """
+    source_numbers = DIGIT_RUN.findall(source_text)
+    matches = list(DIGIT_RUN.finditer(translated_text))
+    translated_numbers = [match.group() for match in matches]
+    if not source_numbers or sorted(translated_numbers) != sorted(source_numbers):
+        return None
+    if translated_numbers == source_numbers:
+        slots = list(range(len(source_numbers)))
+    elif len(set(source_numbers)) == len(source_numbers):
+        slots = [source_numbers.index(number) for number in translated_numbers]
+    else:
+        return None
+
+    template = []
+    last_end = 0
+    for match, slot in zip(matches, slots):
+        template.append(translated_text[last_end:match.start()])
+        template.append(slot)
+        last_end = match.end()
+    template.append(translated_text[last_end:])
+    return template
+
+
+def fill_template(template, source_text):
+    """用原文里的数字填充模板；数字个数对不上时返回 None。"""
+    numbers = DIGIT_RUN.findall(source_text)
+    slot_count = sum(1 for part in template if isinstance(part, int))
+    if len(numbers) != slot_count:
+        return None
+    return ''.join(numbers[part] if isinstance(part, int) else part for part in template)
@@ -0,0 +1,210 @@
+import os
+import shutil
+import time
+
+import fitz
+
+from font_manager import subset_fonts
+from preview import list_fragments
+
+# 每攒够这么多页就把当前分片存盘并换一个新的空文档，内存里只保留一个分片
+OUTPUT_CHUNK_PAGES = 20
+# 分片只是中间结果，用最便宜的选项保存；保存前先按本分片用到的字形裁剪嵌入字体，
+# 分片（同时也是预览分片）里只带用到的字形，不再各自带一份完整的 CJK 字体
+CHUNK_SAVE_OPTIONS = {'garbage': 1, 'deflate': 1}
+# 最终合并后的保存选项：分片存盘时字体已经裁剪过，各分片之间不再有重复的整份字体。
+# small 去重对象和流（各分片各自嵌入的同一张图片只保留一份），另外清理、合并内容流并压缩未压缩的图片和字体，体积最小；
+# fast 只做最便宜的对象清理，保存快得多，跨分片重复的图片各保留一份，体积略大
+COMPRESSION_PROFILES = {
+    'small': {'garbage': 4, 'clean': 1, 'deflate': 1, 'deflate_images': 1, 'deflate_fonts': 1},
+    'fast': {'garbage': 1, 'deflate': 1},
+}
+# 分片没能裁剪字体时，每个分片都带一份完整字体，只能靠 garbage=4 按内容去重
+UNSUBSET_GARBAGE = 4
+# 合并时内存里最多同时容纳这么多字节的分片；分片总量超过时按批追加到磁盘上的中间文件，
+# 内存占用只随一批的大小增长，而不是整本书
+MERGE_BATCH_BYTES = 256 * 1024 * 1024
+# garbage=4 逐对比较内容相同的流，文档从磁盘打开时每次比较都要重新读盘，大文件上慢几个数量级；
+# 分批合并的大文件最多用 garbage=3（只合并重复对象，不比较流内容）
+FILE_MERGE_MAX_GARBAGE = 3
+COMPRESSION_LABELS = {
+    'small': '体积优先',
+    'fast': '速度优先',
+}
+
+
+def normalize_compression(compression):
+    return compression if compression in COMPRESSION_PROFILES else 'small'
+
+
+class ChunkedPdfWriter:
+    """按页段分片生成输出 PDF：写回阶段只往当前分片 doc 里加页，攒够一段就存成
+    pages_XXXXX-YYYYY.pdf 并换新文档，最后用 insert_pdf 按页序合并成完整输出。
+
+    分片文件名和预览分片一致，chunk_dir 指向任务的预览目录时，分片同时就是 /preview 的数据源；
+    interval 不为 None 时，页面写得慢也会按时间间隔输出已写好的页。
+    chunk_dir 为 None 时不分片，所有页面留在内存里，finish 时直接保存。
+    """
+
+    def __init__(self, chunk_dir, chunk_pages=OUTPUT_CHUNK_PAGES, interval=None):
+        self.chunk_dir = chunk_dir
+        self.chunk_pages = max(1, chunk_pages)
+        self.interval = interval
+        self.doc = fitz.open()
+        # 源文档 xref -> 当前分片里的 xref，同一分片内重复的图片只嵌入一次；换分片时清空
+        self.xref_cache = {}
+        # 当前分片的 DocumentFonts，由调用方在写第一页时创建；换分片时清空
+        self.fonts = None
+        self.flushed_pages = 0
+        self.chunk_count = 0
+        self.chunk_time = 0.0
+        self.merge_time = 0.0
+        self.fonts_subset = False
+        # 没能裁剪字体（未安装 fontTools 或裁剪失败）、仍带着完整字体的分片数
+        self.full_font_chunks = 0
+        self._last_flush = time.monotonic()
+        if chunk_dir:
+            # 续传会从头重新写回，旧分片作废
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            os.makedirs(chunk_dir, exist_ok=True)
+
+    def pages_rendered(self):
+        """写完一批页面后调用；攒够一段或距上次输出超过间隔时输出新分片，返回输出的页数。"""
+        if not self.chunk_dir:
+            return 0
+        pending = len(self.doc)
+        if pending <= 0:
+            return 0
+        if pending < self.chunk_pages and (
+            self.interval is None or time.monotonic() - self._last_flush < self.interval
+        ):
+            return 0
+        return self.flush()
+
+    def flush(self):
+        pending = len(self.doc)
+        if not self.chunk_dir or pending <= 0:
+            return 0
+        started = time.time()
+        start = self.flushed_pages
+        end = start + pending
+        path = os.path.join(self.chunk_dir, f'pages_{start + 1:05d}-{end:05d}.pdf')
+        tmp_path = path + '.tmp'
+        self._subset_fonts(self.doc)
+        self.doc.save(tmp_path, **CHUNK_SAVE_OPTIONS)
+        # 先写临时文件再改名，读取方不会读到写了一半的分片
+        os.replace(tmp_path, path)
+        self.doc.close()
+        self.doc = fitz.open()
+        self.xref_cache = {}
+        self.fonts = None
+        self.flushed_pages = end
+        self.chunk_count += 1
+        self._last_flush = time.monotonic()
+        self.chunk_time += time.time() - started
+        return pending
+
+    def finish(self, output_path, compression='small'):
+        """合并所有分片并按压缩档位保存到 output_path；没有输出过分片时直接保存当前文档。
+
+        字体已在各分片存盘时裁剪过（需要 fontTools，未安装时保留完整字体），合并时不再裁剪。
+        """
+        compression = normalize_compression(compression)
+        options = COMPRESSION_PROFILES[compression]
+        if not self.flushed_pages:
+            started = time.time()
+            self._subset_fonts(self.doc)
+            self.fonts_subset = not self.full_font_chunks
+            self.doc.save(output_path, **options)
+            self.merge_time += time.time() - started
+            return
+
+        self.flush()
+        started = time.time()
+        batches = self._merge_batches()
+        if self.full_font_chunks > 1:
+            if len(batches) == 1:
+                print(f'[WARN] {self.full_font_chunks} 个分片带着完整字体，合并时按内容去重，保存会变慢')
+                options = dict(options, garbage=max(options['garbage'], UNSUBSET_GARBAGE))
+            else:
+                print(f'[WARN] {self.full_font_chunks} 个分片带着完整字体，分批合并时无法去重，输出会偏大（安装 fonttools 可避免）')
+        if len(batches) == 1:
+            merged = fitz.open()
+            try:
+                self._insert_chunks(merged, batches[0])
+                merged.save(output_path, **options)
+            finally:
+                merged.close()
+        else:
+            self._merge_on_disk(batches, output_path, options)
+        self.fonts_subset = not self.full_font_chunks
+        self.merge_time += time.time() - started
+
+    def _merge_batches(self):
+        """按页序把分片分成若干批，每批的文件总大小不超过 MERGE_BATCH_BYTES（单个分片超过时自成一批）。"""
+        batches = [[]]
+        batch_bytes = 0
+        for _, _, path in list_fragments(self.chunk_dir):
+            size = os.path.getsize(path)
+            if batches[-1] and batch_bytes + size > MERGE_BATCH_BYTES:
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append(path)
+            batch_bytes += size
+        return batches
+
+    def _insert_chunks(self, merged, paths):
+        for path in paths:
+            chunk = fitz.open(path)
+            try:
+                merged.insert_pdf(chunk)
+            finally:
+                chunk.close()
+
+    def _merge_on_disk(self, batches, output_path, options):
+        """分批合并：每批拷入从磁盘打开的中间文件后增量保存，内存里只有当前这一批的对象。
+
+        增量保存每次都会重写整个中间文件，批次按字节数划分而不是按分片，批数很少，总拷贝量可控。
+        """
+        work_path = output_path + '.merging'
+        try:
+            merged = fitz.open()
+            try:
+                self._insert_chunks(merged, batches[0])
+                merged.save(work_path)
+            finally:
+                merged.close()
+            for batch in batches[1:]:
+                merged = fitz.open(work_path)
+                try:
+                    self._insert_chunks(merged, batch)
+                    merged.saveIncr()
+                finally:
+                    merged.close()
+            merged = fitz.open(work_path)
+            try:
+                merged.save(output_path, **dict(options, garbage=min(options['garbage'], FILE_MERGE_MAX_GARBAGE)))
+            finally:
+                merged.close()
+        finally:
+            if os.path.exists(work_path):
+                os.remove(work_path)
+
+    def _subset_fonts(self, doc):
+        try:
+            subset = subset_fonts(doc)
+        except Exception as e:
+            print(f'[WARN] 字体子集化失败，保留完整字体: {e}')
+            subset = False
+        if not subset:
+            self.full_font_chunks += 1
+        return subset
+
+    def discard(self):
+        """输出已经落盘（或任务失败），关闭当前分片并删除分片目录。"""
+        try:
+            self.doc.close()
+        except Exception:
+            pass
+        if self.chunk_dir:
+            shutil.rmtree(self.chunk_dir, ignore_errors=True)
@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 任务性能记录默认落盘到项目 cache 目录，每行一个 JSON，跨任务、跨重启累积
+DEFAULT_HISTORY_PATH = os.path.join(BASE_DIR, 'cache', 'perf_history.jsonl')
+# 文件里保留的记录数，超过两倍时压缩为最近的这么多条
+HISTORY_MAX_RECORDS = 1000
+# 每个服务只用最近这么多次任务拟合，服务端提速、降速后估算能跟上
+FIT_RECENT_JOBS = 50
+# 少于这么多次任务时用先验值估算
+MIN_FIT_JOBS = 3
+
+# 先验：每个翻译单元占用一个并发槽的秒数（Google 单次请求快，LLM 批次慢），每页本地写回和保存的秒数
+PRIOR_UNIT_SECONDS = {'google': 1.5}
+PRIOR_CHAT_UNIT_SECONDS = 8.0
+PRIOR_PAGE_SECONDS = 0.05
+# 先验估算的范围：中间值的倍数
+PRIOR_SPREAD = (0.5, 2.0)
+# 没有历史时，实际输入 tokens 相对干跑估算（只含原文）的范围：LLM 请求另有提示词开销
+PRIOR_CHAT_INPUT_RATIO = (1.0, 1.4, 2.0)
+
+
+class PerformanceHistory:
+    """已完成任务的性能记录：页数、块数、翻译单元数、tokens、服务、并发数和各阶段耗时。
+
+    worker 在任务完成时追加一条，/analyze 按服务取最近的记录拟合吞吐量。
+    多个进程可以同时追加同一个文件（每条记录一次写入一行）。
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_records=HISTORY_MAX_RECORDS):
+        self.path = path
+        self.max_records = max(1, int(max_records))
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        line = json.dumps(dict(record, finished_at=round(time.time(), 1)), ensure_ascii=False)
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a+', encoding='utf-8') as f:
+                    # 进程被杀时写了一半的末行没有换行符，先补上，新记录才不会粘在它后面一起作废
+                    if f.tell() and not self._ends_with_newline():
+                        line = '\n' + line
+                    f.write(line + '\n')
+                self._compact()
+            except OSError as e:
+                print(f'[WARN] 性能记录写入失败: {e}')
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _compact(self):
+        records = self._read_all()
+        if len(records) <= 2 * self.max_records:
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records[-self.max_records:]:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def _read_all(self):
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+    def records(self, kind=None, provider=None, limit=FIT_RECENT_JOBS):
+        """最近的记录（旧的在前）；kind 为 pdf/text，provider 为服务名。"""
+        with self._lock:
+            records = self._read_all()
+        matched = [
+            record for record in records
+            if (kind is None or record.get('kind') == kind)
+            and (provider is None or record.get('provider') == provider)
+        ]
+        return matched[-limit:] if limit else matched
+
+    def fit_models(self, kind):
+        """按服务拟合 kind 类任务的吞吐量，返回 {服务: fit_throughput 结果}；记录不足的服务不在结果里。"""
+        by_provider = {}
+        for record in self.records(kind=kind, limit=None):
+            by_provider.setdefault(record.get('provider'), []).append(record)
+        models = {}
+        for provider, records in by_provider.items():
+            model = fit_throughput(records[-FIT_RECENT_JOBS:])
+            if model is not None:
+                models[provider] = model
+        return models
+
+
+def _quartiles(values):
+    """(下四分位, 中位数, 上四分位)，线性插值。"""
+    values = sorted(values)
+    last = len(values) - 1
+
+    def at(fraction):
+        position = last * fraction
+        low = int(position)
+        high = min(low + 1, last)
+        return values[low] + (values[high] - values[low]) * (position - low)
+
+    return at(0.25), at(0.5), at(0.75)
+
+
+def _effective_concurrency(units, concurrency):
+    return max(1, min(int(concurrency or 1), int(units or 1)))
+
+
+def fit_throughput(records):
+    """从同一服务的任务记录拟合吞吐量。
+
+    每个任务折算出：一个翻译单元占用一个并发槽的秒数（翻译阶段耗时 × 有效并发 / 单元数）、
+    每页的本地写回和保存秒数、实际输入/输出 tokens 与原文估算 tokens 的比值；各取四分位数作为估算范围。
+    没有发出请求的任务跳过；有效记录不足 MIN_FIT_JOBS 条时返回 None。
+    """
+    unit_seconds, page_seconds, input_ratios, output_ratios = [], [], [], []
+    for record in records:
+        if not record.get('requests'):
+            # 全部命中翻译记忆、没有调用服务的任务不反映服务的吞吐量
+            continue
+        units = record.get('units') or 0
+        pages = record.get('pages') or 0
+        if units > 0 and record.get('translate_seconds') is not None:
+            concurrency = _effective_concurrency(units, record.get('concurrency'))
+            unit_seconds.append(record['translate_seconds'] * concurrency / units)
+        if pages > 0:
+            page_seconds.append(((record.get('render_seconds') or 0) + (record.get('save_seconds') or 0)) / pages)
+        source_tokens = record.get('source_tokens') or 0
+        if source_tokens > 0:
+            input_ratios.append((record.get('input_tokens') or 0) / source_tokens)
+            output_ratios.append((record.get('output_tokens') or 0) / source_tokens)
+    if len(unit_seconds) < MIN_FIT_JOBS:
+        return None
+    return {
+        'jobs': len(unit_seconds),
+        'unit_seconds': _quartiles(unit_seconds),
+        'page_seconds': _quartiles(page_seconds) if page_seconds else (PRIOR_PAGE_SECONDS,) * 3,
+        'input_ratio': _quartiles(input_ratios) if input_ratios else None,
+        'output_ratio': _quartiles(output_ratios) if output_ratios else None,
+    }
+
+
+def estimate_job(provider, plan, concurrency, pricing, model=None):
+    """按干跑计划和拟合的吞吐量估算 (低, 中, 高) 三档耗时（秒）和费用（美元）。
+
+    plan: translator.plan_translation 的结果；model: fit_throughput 的结果，None 时用先验值。
+    """
+    provider_plan = plan['providers'][provider]
+    units = provider_plan['units']
+    pages = plan['total_pages']
+    concurrency = _effective_concurrency(units, concurrency)
+
+    if model is None:
+        prior = PRIOR_UNIT_SECONDS.get(provider, PRIOR_CHAT_UNIT_SECONDS)
+        unit_seconds = (prior * PRIOR_SPREAD[0], prior, prior * PRIOR_SPREAD[1])
+        page_seconds = (PRIOR_PAGE_SECONDS,) * 3
+    else:
+        unit_seconds = model['unit_seconds']
+        page_seconds = model['page_seconds']
+    seconds = [
+        units * unit_seconds[i] / concurrency + pages * page_seconds[i]
+        for i in range(3)
+    ]
+
+    source_tokens = plan['source_tokens']
+    if model is not None and model['input_ratio'] is not None:
+        input_tokens = [source_tokens * ratio for ratio in model['input_ratio']]
+        output_tokens = [source_tokens * ratio for ratio in model['output_ratio']]
+    else:
+        input_ratio = (1.0, 1.0, 1.0) if provider == 'google' else PRIOR_CHAT_INPUT_RATIO
+        input_tokens = [provider_plan['input_tokens'] * ratio for ratio in input_ratio]
+        output_tokens = [provider_plan['output_tokens'] * ratio for ratio in (PRIOR_SPREAD[0], 1.0, PRIOR_SPREAD[1])]
+    cost = [
+        (input_tokens[i] * pricing.get('input', 0) + output_tokens[i] * pricing.get('output', 0)) / 1_000_000
+        for i in range(3)
+    ]
+    return {
+        'units': units,
+        'seconds': [round(value, 1) for value in seconds],
+        'cost': [round(value, 4) for value in cost],
+        'input_tokens': round(input_tokens[1]),
+        'output_tokens': round(output_tokens[1]),
+        'history_jobs': model['jobs'] if model else 0,
+    }
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_performance_history():
+    """返回进程级共享的性能记录（路径可用 PDFAPP_PERF_HISTORY_PATH 覆盖）。"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = PerformanceHistory(os.environ.get('PDFAPP_PERF_HISTORY_PATH') or DEFAULT_HISTORY_PATH)
+        return _history
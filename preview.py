@@ -0,0 +1,88 @@
+import os
+import re
+
+import fitz
+
+# 预览分片就是写回阶段的输出分片（见 pdf_output.py）；页面写得慢时按这个间隔（秒）输出已写好的页
+PREVIEW_INTERVAL = 30
+PREVIEW_DIR_NAME = 'preview'
+
+FRAGMENT_PATTERN = re.compile(r'^pages_(\d+)-(\d+)\.pdf$')
+
+
+def preview_dir_for(workspace_dir):
+    return os.path.join(workspace_dir or '.', PREVIEW_DIR_NAME)
+
+
+def list_fragments(preview_dir):
+    """已输出的分片 [(首页, 末页, 路径), ...]，页码从 1 开始，按页序排列。"""
+    try:
+        names = os.listdir(preview_dir)
+    except OSError:
+        return []
+    fragments = []
+    for name in names:
+        match = FRAGMENT_PATTERN.match(name)
+        if match:
+            fragments.append((int(match.group(1)), int(match.group(2)), os.path.join(preview_dir, name)))
+    fragments.sort()
+    return fragments
+
+
+def available_pages(fragments):
+    """从第 1 页起连续可预览的页数。"""
+    ready = 0
+    for start, end, _ in fragments:
+        if start != ready + 1:
+            break
+        ready = end
+    return ready
+
+
+def parse_page_ranges(spec, max_page):
+    """解析 '1-20'、'5'、'30-'、'1-3,8' 形式的页码范围（从 1 开始），截断到 max_page。
+
+    spec 为空时返回全部可用页；格式错误时抛出 ValueError。
+    """
+    if not spec or not spec.strip():
+        return [(1, max_page)] if max_page else []
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        match = re.fullmatch(r'(\d+)(?:\s*-\s*(\d*))?', part)
+        if not match:
+            raise ValueError(f'无效的页码范围: {part}')
+        first = int(match.group(1))
+        if match.group(2) is None:
+            last = first
+        else:
+            last = int(match.group(2)) if match.group(2) else max_page
+        if first < 1 or last < first:
+            raise ValueError(f'无效的页码范围: {part}')
+        last = min(last, max_page)
+        if first <= last:
+            ranges.append((first, last))
+    return ranges
+
+
+def build_preview(sources, ranges):
+    """从若干 (首页, 末页, 路径) 来源里按页码范围取页，拼成一个 PDF 返回字节串。"""
+    output = fitz.open()
+    opened = {}
+    try:
+        for first, last in ranges:
+            for start, end, path in sources:
+                if end < first or start > last:
+                    continue
+                if path not in opened:
+                    opened[path] = fitz.open(path)
+                output.insert_pdf(
+                    opened[path],
+                    from_page=max(first, start) - start,
+                    to_page=min(last, end) - start
+                )
+        return output.tobytes(garbage=1, deflate=1)
+    finally:
+        for source in opened.values():
+            source.close()
+        output.close()
@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+# 各服务默认限额：rpm=每分钟请求数，tpm=每分钟 tokens（None 表示不限），in_flight=同时在途请求数。
+# 可通过环境变量 PDFAPP_RATE_LIMITS 覆盖，例如 '{"openrouter": {"rpm": 60, "in_flight": 8}}'
+DEFAULT_LIMITS = {
+    'google': {'rpm': 300, 'tpm': None, 'in_flight': 10},
+    'deepseek': {'rpm': 240, 'tpm': None, 'in_flight': 16},
+    'zhipu': {'rpm': 120, 'tpm': None, 'in_flight': 5},
+    'openrouter': {'rpm': 200, 'tpm': None, 'in_flight': 16},
+}
+
+# kimi / gpt 走同一个 OpenRouter 账号，共享同一组限额
+LIMIT_GROUPS = {
+    'kimi': 'openrouter',
+    'gpt': 'openrouter',
+}
+
+MAX_BACKOFF_SECONDS = 60
+
+
+class TokenBucket:
+    """经典令牌桶：容量 capacity，每秒补充 rate 个令牌。"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def time_until(self, amount, now):
+        """返回凑够 amount 个令牌还需等待的秒数，0 表示可立即取用。"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def set_rate_per_minute(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = min(self.tokens, self.capacity)
+
+
+def _parse_duration(value):
+    """解析限流头里的时长：'1.5'、'20ms'、'6m0s' 等，返回秒。"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value):
+        matched = True
+        amount = float(amount)
+        total += amount * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return total if matched else None
+
+
+def _parse_retry_after(value):
+    if value is None:
+        return None
+    seconds = _parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset(value):
+    """X-RateLimit-Reset 可能是时长，也可能是 epoch 秒/毫秒时间戳。"""
+    seconds = _parse_duration(value)
+    if seconds is None:
+        return None
+    if seconds > 1e12:
+        return max(0.0, seconds / 1000.0 - time.time())
+    if seconds > 1e9:
+        return max(0.0, seconds - time.time())
+    return seconds
+
+
+class ProviderRateLimiter:
+    """单个服务（+API Key）的进程级限流器：请求数、tokens 和在途并发三道闸。
+
+    所有任务的线程都通过 acquire/release（或 slot 上下文）排队，
+    响应头里的 Retry-After 与 x-ratelimit-* 会通过 observe 反馈回来调整节奏。
+    """
+
+    def __init__(self, rpm, tpm=None, in_flight=8):
+        self._cond = threading.Condition()
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0) if tpm else None
+        self.max_in_flight = max(1, int(in_flight))
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._backoff = 1.0
+
+    def _try_acquire_locked(self, tokens):
+        """尝试占用一个请求名额；成功返回 0，否则返回建议等待的秒数。"""
+        now = time.monotonic()
+        wait = max(0.0, self.blocked_until - now)
+        if not wait and self.in_flight >= self.max_in_flight:
+            wait = 1.0  # 等待 release 唤醒，定时醒来以便响应取消
+        if not wait:
+            wait = self.requests.time_until(1, now)
+        if not wait and self.tokens is not None and tokens:
+            wait = self.tokens.time_until(tokens, now)
+        if not wait:
+            self.requests.consume(1)
+            if self.tokens is not None and tokens:
+                self.tokens.consume(tokens)
+            self.in_flight += 1
+        return wait
+
+    def acquire(self, tokens=0, cancel_check=None):
+        with self._cond:
+            while True:
+                if cancel_check:
+                    cancel_check()
+                wait = self._try_acquire_locked(tokens)
+                if not wait:
+                    return
+                self._cond.wait(timeout=min(wait, 1.0))
+
+    async def acquire_async(self, tokens=0):
+        """事件循环版 acquire：不占线程，按建议间隔让出循环后重试。"""
+        while True:
+            with self._cond:
+                wait = self._try_acquire_locked(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 0.05 if self.in_flight >= self.max_in_flight else 1.0))
+
+    def release(self):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tokens=0, cancel_check=None):
+        self.acquire(tokens, cancel_check=cancel_check)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def penalize(self, seconds=None):
+        """遇到限流但拿不到响应头时，按指数退避暂停整个服务的发送。"""
+        with self._cond:
+            if seconds is None:
+                seconds = self._backoff
+                self._backoff = min(MAX_BACKOFF_SECONDS, self._backoff * 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+        return seconds
+
+    def observe(self, status_code, headers):
+        """根据响应状态和限流头调整节奏。返回建议等待秒数（未被限流时为 0）。"""
+        headers = {str(k).lower(): v for k, v in (headers or {}).items()}
+        wait = 0.0
+
+        limit_requests = headers.get('x-ratelimit-limit-requests')
+        if limit_requests:
+            try:
+                with self._cond:
+                    self.requests.set_rate_per_minute(max(1, int(float(limit_requests))))
+            except ValueError:
+                pass
+
+        for remaining_key, reset_key in (
+            ('x-ratelimit-remaining-requests', 'x-ratelimit-reset-requests'),
+            ('x-ratelimit-remaining-tokens', 'x-ratelimit-reset-tokens'),
+            ('x-ratelimit-remaining', 'x-ratelimit-reset'),
+        ):
+            remaining = headers.get(remaining_key)
+            if remaining is None:
+                continue
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                continue
+            if exhausted:
+                reset = _parse_reset(headers.get(reset_key))
+                if reset:
+                    wait = max(wait, reset)
+
+        if status_code in (429, 503):
+            retry_after = _parse_retry_after(headers.get('retry-after'))
+            if retry_after is not None:
+                wait = max(wait, retry_after)
+            if not wait:
+                return self.penalize()
+        elif 200 <= (status_code or 0) < 300:
+            with self._cond:
+                self._backoff = 1.0
+
+        if wait:
+            self.penalize(min(wait, MAX_BACKOFF_SECONDS))
+        return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _configured_limits(group):
+    limits = dict(DEFAULT_LIMITS.get(group, DEFAULT_LIMITS['openrouter']))
+    raw = os.environ.get('PDFAPP_RATE_LIMITS')
+    if raw:
+        try:
+            limits.update(json.loads(raw).get(group, {}))
+        except (ValueError, AttributeError):
+            print(f'[WARN] PDFAPP_RATE_LIMITS 解析失败，使用默认限额: {raw}')
+    return limits
+
+
+def get_rate_limiter(provider, api_key=None):
+    """按 (服务分组, API Key) 返回进程内共享的限流器。"""
+    group = LIMIT_GROUPS.get(provider, provider)
+    key_hash = hashlib.sha1((api_key or '').encode('utf-8')).hexdigest()[:16]
+    cache_key = (group, key_hash)
+    with _limiters_lock:
+        limiter = _limiters.get(cache_key)
+        if limiter is None:
+            limits = _configured_limits(group)
+            limiter = ProviderRateLimiter(
+                rpm=limits['rpm'],
+                tpm=limits.get('tpm'),
+                in_flight=limits.get('in_flight', 8)
+            )
+            _limiters[cache_key] = limiter
+        return limiter
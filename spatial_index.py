@@ -0,0 +1,79 @@
+import math
+
+import fitz
+
+# 每个格子平均容纳的矩形数；格子总数上限避免超大页面占用过多内存
+TARGET_ITEMS_PER_CELL = 4
+MAX_GRID_SIDE = 64
+
+
+class RectGrid:
+    """页面内矩形的均匀网格索引：按包围盒把条目登记到覆盖的格子里。
+
+    query 只检查查询矩形覆盖到的格子，返回与之相交（含边界接触）的条目，
+    顺序与插入顺序一致，调用方可以照常按原列表的顺序处理。
+    """
+
+    def __init__(self, items=(), key=None, bounds=None):
+        self._key = key
+        self._items = list(items)
+        self._boxes = [tuple(self._rect_of(item)) for item in self._items]
+
+        if bounds is None and self._boxes:
+            bounds = (
+                min(box[0] for box in self._boxes),
+                min(box[1] for box in self._boxes),
+                max(box[2] for box in self._boxes),
+                max(box[3] for box in self._boxes),
+            )
+        x0, y0, x1, y1 = tuple(bounds) if bounds is not None else (0, 0, 1, 1)
+        side = max(1, min(MAX_GRID_SIDE, int(math.sqrt(len(self._boxes) / TARGET_ITEMS_PER_CELL)) + 1))
+        self._origin = (x0, y0)
+        self._side = side
+        self._cell_w = max((x1 - x0) / side, 1.0)
+        self._cell_h = max((y1 - y0) / side, 1.0)
+        self._cells = {}
+        for index, box in enumerate(self._boxes):
+            for cell in self._cells_for(box):
+                self._cells.setdefault(cell, []).append(index)
+
+    def _rect_of(self, item):
+        return fitz.Rect(self._key(item) if self._key else item)
+
+    def _cell_index(self, value, origin, size):
+        position = (value - origin) / size
+        if not position >= 1:  # 同时兜住 NaN
+            return 0
+        if position >= self._side:
+            return self._side - 1
+        return int(position)
+
+    def _span(self, low, high, origin, size):
+        return range(self._cell_index(low, origin, size), self._cell_index(high, origin, size) + 1)
+
+    def _cells_for(self, box):
+        x0, y0, x1, y1 = box
+        cols = self._span(x0, x1, self._origin[0], self._cell_w)
+        rows = self._span(y0, y1, self._origin[1], self._cell_h)
+        return [(col, row) for col in cols for row in rows]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def query(self, rect):
+        """返回包围盒与 rect 相交的条目（按插入顺序）。"""
+        if not self._items:
+            return []
+        qx0, qy0, qx1, qy1 = tuple(rect)
+        candidates = set()
+        for cell in self._cells_for((qx0, qy0, qx1, qy1)):
+            candidates.update(self._cells.get(cell, ()))
+        matches = []
+        for index in sorted(candidates):
+            x0, y0, x1, y1 = self._boxes[index]
+            if x0 <= qx1 and qx0 <= x1 and y0 <= qy1 and qy0 <= y1:
+                matches.append(self._items[index])
+        return matches
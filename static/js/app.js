@@ -46,6 +46,11 @@ let eventSource = null;
 let translationStartTime = null;
 let elapsedTimeTimer = null;
 let currentGlossaryFilename = null;
+// /analyze 返回的文档 id：翻译同一个文件时只传 id，不再重复上传
+let analyzedDocId = null;
+let analyzedFile = null;
+// /analyze 按各翻译服务给出的耗时、费用估算，切换服务时直接换显示
+let analysisEstimates = {};
 
 // 翻译对照数据
 let translationData = [];  // [{page_num, block_idx, original, translated}]
@@ -359,6 +364,7 @@ apiTypeSelect.addEventListener('change', (e) => {
     } else {
         apiKeySection.style.display = 'none';
     }
+    showEstimate(e.target.value);
     saveSettings();
 });
 
@@ -638,6 +644,8 @@ dropArea.addEventListener('drop', (e) => {
 async function handleFile(file) {
     if (file) {
         currentGlossaryFilename = file.name;
+        analyzedDocId = null;
+        analyzedFile = null;
         resetProgressStats();
         fileInfo.textContent = `已选择: ${file.name} (${formatFileSize(file.size)})`;
         await loadGlossary(file.name);
@@ -646,6 +654,9 @@ async function handleFile(file) {
         try {
             const formData = new FormData();
             formData.append('file', file);
+            for (const [key, value] of estimateSettings()) {
+                formData.append(key, value);
+            }
 
             showMessage('正在分析文件...', 'info');
 
@@ -669,11 +680,13 @@ async function handleFile(file) {
                 return;
             }
 
+            if (data.doc_id) {
+                analyzedDocId = data.doc_id;
+                analyzedFile = file;
+            }
+
             // 显示文件信息
-            document.getElementById('totalPages').textContent = data.total_pages;
-            document.getElementById('charCount').textContent = data.char_count.toLocaleString();
-            document.getElementById('detectedLang').textContent = data.lang_name;
-            document.getElementById('estimatedTime').textContent = data.estimated_time;
+            showAnalysisStats(data);
 
             fileAnalysisDiv.style.display = 'block';
             if (Array.isArray(data.glossary_terms)) {
@@ -705,6 +718,11 @@ async function handleFile(file) {
                 }
             }
 
+            // 大文件先返回抽样统计，后台读完全文后再取精确结果
+            if (data.refining && data.doc_id) {
+                pollFullAnalysis(file, data.doc_id);
+            }
+
         } catch (error) {
             console.error('Analysis error:', error);
             showMessage('文件分析失败', 'error');
@@ -712,6 +730,75 @@ async function handleFile(file) {
     }
 }
 
+function showAnalysisStats(data) {
+    // 抽样估计的字数前加“约”
+    const approx = data.exact === false ? '约 ' : '';
+    document.getElementById('totalPages').textContent = data.total_pages;
+    document.getElementById('charCount').textContent = approx + data.char_count.toLocaleString();
+    document.getElementById('detectedLang').textContent = data.lang_name;
+    analysisEstimates = data.estimates || {};
+    if (!showEstimate(apiTypeSelect.value)) {
+        document.getElementById('estimatedTime').textContent = data.estimated_time_range || data.estimated_time;
+        document.getElementById('estimatedCost').textContent = '-';
+    }
+}
+
+// 估算耗时、费用用到的翻译设置，随 /analyze 请求一起发送
+function estimateSettings() {
+    return new URLSearchParams({
+        api_type: apiTypeSelect.value,
+        concurrency: parseInt(concurrencyInput.value) || 4,
+        target_lang: document.getElementById('targetLang').value
+    });
+}
+
+function formatDuration(seconds) {
+    if (seconds < 60) return `${Math.max(1, Math.floor(seconds))}秒`;
+    const minutes = seconds / 60;
+    if (minutes < 60) return `${Math.floor(minutes)}分钟`;
+    return `${Math.floor(minutes / 60)}小时${Math.floor(minutes % 60)}分钟`;
+}
+
+function formatCost(cost) {
+    return cost < 0.01 ? `$${cost.toFixed(4)}` : `$${cost.toFixed(2)}`;
+}
+
+// 显示所选服务的耗时、费用范围；没有该服务的估算时返回 false
+function showEstimate(apiType) {
+    const estimate = analysisEstimates[apiType];
+    if (!estimate) return false;
+    const [low, mid, high] = estimate.seconds;
+    const basis = estimate.history_jobs ? `（基于最近 ${estimate.history_jobs} 次任务）` : '';
+    document.getElementById('estimatedTime').textContent =
+        `约 ${formatDuration(mid)}（${formatDuration(low)} ~ ${formatDuration(high)}）${basis}`;
+    const [costLow, , costHigh] = estimate.cost;
+    document.getElementById('estimatedCost').textContent =
+        costHigh > 0 ? `${formatCost(costLow)} ~ ${formatCost(costHigh)}` : '免费';
+    return true;
+}
+
+// 轮询全文分析结果；用户已换了别的文件时停止
+async function pollFullAnalysis(file, docId, attempt = 0) {
+    const maxAttempts = 60;
+    if (attempt >= maxAttempts || analyzedFile !== file || analyzedDocId !== docId) return;
+    try {
+        const params = estimateSettings();
+        params.set('filename', file.name);
+        const response = await fetch(`/analyze/${docId}?${params}`);
+        if (response.status === 202) {
+            setTimeout(() => pollFullAnalysis(file, docId, attempt + 1), 2000);
+            return;
+        }
+        if (!response.ok) return;
+        const data = await response.json();
+        if (analyzedFile !== file || analyzedDocId !== docId) return;
+        showAnalysisStats(data);
+        renderGlossarySuggestions(data.suggested_terms || []);
+    } catch (error) {
+        console.error('Full analysis error:', error);
+    }
+}
+
 // 格式化文件大小
 function formatFileSize(bytes) {
     if (bytes === 0) return '0 Bytes';
@@ -859,18 +946,26 @@ translateForm.addEventListener('submit', async (e) => {
     // 获取输出格式
     const outputFormat = document.getElementById('outputFormat').value;
 
-    const formData = new FormData();
-    formData.append('file', file);
-    formData.append('api_type', apiType);
-    formData.append('api_key', apiKey);
-    formData.append('source_lang', document.getElementById('sourceLang').value);
-    formData.append('target_lang', document.getElementById('targetLang').value);
-    formData.append('task_id', taskId);
-    formData.append('concurrency', concurrency);
-    formData.append('glossary_terms', JSON.stringify(parseGlossaryTerms(glossaryTermsInput.value)));
-    formData.append('translation_mode', translationModeSelect.value);
-    formData.append('translation_audience', translationAudienceSelect.value);
-    formData.append('translation_style', translationStyleSelect.value);
+    const buildFormData = (useDocId) => {
+        const formData = new FormData();
+        if (useDocId) {
+            formData.append('doc_id', analyzedDocId);
+            formData.append('filename', file.name);
+        } else {
+            formData.append('file', file);
+        }
+        formData.append('api_type', apiType);
+        formData.append('api_key', apiKey);
+        formData.append('source_lang', document.getElementById('sourceLang').value);
+        formData.append('target_lang', document.getElementById('targetLang').value);
+        formData.append('task_id', taskId);
+        formData.append('concurrency', concurrency);
+        formData.append('glossary_terms', JSON.stringify(parseGlossaryTerms(glossaryTermsInput.value)));
+        formData.append('translation_mode', translationModeSelect.value);
+        formData.append('translation_audience', translationAudienceSelect.value);
+        formData.append('translation_style', translationStyleSelect.value);
+        return formData;
+    };
 
     // 启动实时计时器
     startElapsedTimeTimer();
@@ -879,11 +974,19 @@ translateForm.addEventListener('submit', async (e) => {
         // 根据输出格式选择不同的API端点
         const endpoint = outputFormat === 'text' ? '/translate_text' : '/translate';
 
-        // 启动翻译任务
-        const response = await fetch(endpoint, {
+        // 启动翻译任务；分析时已上传过的文件只传文档 id，服务端已清理时再上传文件
+        const useDocId = Boolean(analyzedDocId) && analyzedFile === file;
+        let response = await fetch(endpoint, {
             method: 'POST',
-            body: formData
+            body: buildFormData(useDocId)
         });
+        if (useDocId && response.status === 404) {
+            analyzedDocId = null;
+            response = await fetch(endpoint, {
+                method: 'POST',
+                body: buildFormData(false)
+            });
+        }
 
         if (!response.ok) {
             let errMsg = '翻译失败';
@@ -1018,6 +1121,12 @@ function connectToProgressStream(taskId, filename) {
                 return;
             }
 
+            // 已写回的页面可以提前预览
+            if (data.type === 'preview') {
+                addLog(`已完成前 ${data.pages_ready}/${data.total_pages} 页，可打开 /preview/${taskId} 提前预览`, 'info');
+                return;
+            }
+
             // 处理日志消息
             if (data.type === 'log') {
                 addLog(data.message, data.log_type || 'info');
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# 测试不读写项目 cache 目录里的翻译记忆、校准数据和性能记录
+_cache_dir = tempfile.mkdtemp(prefix='pdfapp-tests-')
+os.environ.setdefault('PDFAPP_TM_PATH', ':memory:')
+os.environ.setdefault('PDFAPP_TOKEN_CALIBRATION_PATH', os.path.join(_cache_dir, 'token_calibration.json'))
+os.environ.setdefault('PDFAPP_PERF_HISTORY_PATH', os.path.join(_cache_dir, 'perf_history.jsonl'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
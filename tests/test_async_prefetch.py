@@ -0,0 +1,159 @@
+import concurrent.futures
+import re
+
+import fitz
+import pytest
+from deep_translator import GoogleTranslator
+
+import translator as translator_module
+from translator import PDFTranslator
+
+
+def chat_response(payload):
+    """按请求内容构造一个合法的服务返回：批次请求逐项返回 item，单段请求每页返回一句中文。"""
+    user_content = payload['messages'][-1]['content']
+    ids = re.findall(r'<item id="(\d+)">', user_content)
+    if ids:
+        content = '\n'.join(f'<item id="{idx}">这是第{idx}项的中文译文。</item>' for idx in ids)
+    else:
+        # 纯文字页合并翻译时按页分隔符拆回各页
+        pages = user_content.count('__PAGE_BREAK__') + 1
+        content = '\n__PAGE_BREAK__\n'.join(['这是一段已经翻译好的中文正文内容。'] * pages)
+    return {'choices': [{'message': {'content': content}}]}
+
+
+class FakeEngine:
+    """代替异步引擎：提交即完成，记录每个预取请求的负载。"""
+
+    def __init__(self):
+        self.payloads = []
+
+    def post_chat_completion(self, limiter, url, headers, payload, timeout, estimated_tokens=0, retries=0):
+        return payload
+
+    def submit(self, payload):
+        self.payloads.append(payload)
+        future = concurrent.futures.Future()
+        future.set_result(chat_response(payload))
+        return future
+
+
+def recorded_keys(translator):
+    """让 _chat_completion 只记录它要取的预取键，不发出任何请求。"""
+    keys = []
+
+    def take(key):
+        keys.append(key)
+        return None
+
+    def post(config, messages, api_type, temperature, timeout):
+        raise RuntimeError('offline')
+
+    translator._take_prefetched = take
+    translator._post_chat_completion = post
+    return keys
+
+
+def planned_keys(translator, planned):
+    return [translator._chat_request_key(api_type, messages, temperature) for _, api_type, messages, temperature, _ in planned]
+
+
+def test_google_lang_codes_are_accepted_by_deep_translator():
+    translator = PDFTranslator(api_type='google')
+    for lang in translator.GOOGLE_LANG_CODES:
+        source, target = translator._google_lang_codes('auto', lang)
+        assert source == 'auto'
+        # 构造时 deep-translator 会校验语言代码，不发请求
+        GoogleTranslator(source=source, target=target)
+        source, target = translator._google_lang_codes(lang, 'en')
+        GoogleTranslator(source=source, target=target)
+
+
+def test_planned_keys_match_consuming_calls():
+    body = {'text': 'The quick brown fox jumps over the lazy dog near the river bank.', 'font_info': {}}
+    heading = {'text': 'Chapter One', 'font_info': {'layout_hint': 'heading'}}
+    short_blocks = [{'text': f'Short caption number {i}', 'font_info': {}} for i in range(3)]
+
+    for api_type in ['deepseek', 'openrouter', 'kimi']:
+        for target_lang in ['zh', 'es']:
+            cases = [
+                (('single', [body]), lambda t: t._translate_text(body['text'], 'en', target_lang)),
+                (('single', [heading]), lambda t: t._strict_translate_text(heading['text'], 'en', target_lang)),
+                (('batch', short_blocks), lambda t: t._translate_text_chat_batch(
+                    [b['text'] for b in short_blocks], 'en', target_lang
+                )),
+            ]
+            for unit, consume in cases:
+                translator = PDFTranslator(api_type=api_type, api_key='x')
+                planned = translator._plan_unit_requests(unit, 'en', target_lang)
+                assert planned, (api_type, target_lang, unit[0])
+                keys = recorded_keys(translator)
+                try:
+                    consume(translator)
+                except Exception:
+                    pass
+                # 首次请求的键必须就是预取时提交的键，否则预取的付费请求会被丢弃
+                assert keys[:1] == planned_keys(translator, planned), (api_type, target_lang, unit)
+
+
+def test_google_units_are_not_prefetched():
+    translator = PDFTranslator(api_type='google')
+    unit = ('single', [{'text': 'The quick brown fox jumps over the lazy dog.', 'font_info': {}}])
+    assert translator._plan_unit_requests(unit, 'auto', 'es') == []
+
+
+def test_discard_cancels_only_given_keys():
+    translator = PDFTranslator(api_type='deepseek', api_key='x')
+    futures = {key: concurrent.futures.Future() for key in ['a', 'b', 'c']}
+    translator._prefetched_calls.update(futures)
+    assert translator._discard_prefetched(['a', 'missing']) == 1
+    assert futures['a'].cancelled() and not futures['b'].cancelled()
+    assert translator._discard_prefetched() == 2
+    assert not translator._prefetched_calls
+
+
+@pytest.mark.parametrize('with_image', [False, True])
+def test_async_pipeline_consumes_every_prefetch(tmp_path, monkeypatch, with_image):
+    # 纯文字页走合并的文字页翻译；带图片的页按文本块翻译（标题走严格翻译）
+    input_path = tmp_path / 'mixed.pdf'
+    doc = fitz.open()
+    for page_num in range(3):
+        page = doc.new_page()
+        if with_image:
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), 0)
+            pixmap.clear_with(page_num * 60)
+            page.insert_image(fitz.Rect(450, 40, 520, 110), pixmap=pixmap)
+        page.insert_text((72, 72), f'Chapter {page_num + 1}', fontsize=22)
+        y = 120
+        for i in range(4):
+            page.insert_text((72, y), f'Caption {page_num}-{i}', fontsize=10)
+            y += 40
+        page.insert_textbox(
+            fitz.Rect(72, y, 520, y + 200),
+            f'Paragraph on page {page_num}. ' + 'This sentence is long enough to be translated on its own. ' * 6,
+            fontsize=11
+        )
+    doc.save(str(input_path))
+    doc.close()
+
+    engine = FakeEngine()
+    monkeypatch.setattr(translator_module, 'get_async_engine', lambda: engine)
+    logs = []
+    translator = PDFTranslator(
+        api_type='deepseek', api_key='x', engine='async', log_callback=lambda message, level: logs.append(message)
+    )
+    sync_calls = []
+
+    def post(config, messages, api_type, temperature, timeout):
+        sync_calls.append(messages)
+        return chat_response({'messages': messages})
+
+    translator._post_chat_completion = post
+    translator.translate_pdf(str(input_path), str(tmp_path / 'out.pdf'), 'en', 'zh', concurrency=2)
+
+    assert engine.payloads
+    if with_image:
+        assert any('文本块分组完成' in message for message in logs)
+    assert not sync_calls
+    assert not translator._prefetched_calls
+    assert not [message for message in logs if '未被使用' in message]
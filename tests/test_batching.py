@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from batching import BatchBudget, pack_blocks
+
+
+def make_blocks(rng, count):
+    return [
+        {'id': idx, 'text': 'x' * rng.choice([5, 12, 40, 90, 160, 400]), 'heading': rng.random() < 0.1}
+        for idx in range(count)
+    ]
+
+
+def text_length(block):
+    return len(block['text'])
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('max_output', [None, 260])
+def test_batches_respect_capacity_and_keep_every_block(seed, max_output):
+    rng = random.Random(seed)
+    blocks = make_blocks(rng, 120)
+    budget = BatchBudget(max_input=500, max_item=200, max_output=max_output, item_overhead=12)
+    output_measure = (lambda block: len(block['text']) // 2) if max_output else None
+
+    groups = pack_blocks(blocks, budget, text_length, output_measure, is_batchable=lambda block: not block['heading'])
+
+    # 每个块恰好出现一次，组按首块在文档里的位置排序，批内保持原顺序
+    assert sorted(block['id'] for _, group_blocks, _ in groups for block in group_blocks) == list(range(len(blocks)))
+    assert [group_blocks[0]['id'] for _, group_blocks, _ in groups] == sorted(
+        group_blocks[0]['id'] for _, group_blocks, _ in groups
+    )
+    for group_type, group_blocks, fill_ratio in groups:
+        ids = [block['id'] for block in group_blocks]
+        assert ids == sorted(ids)
+        if group_type == 'single':
+            assert len(group_blocks) == 1 and fill_ratio is None
+            block = group_blocks[0]
+            assert block['heading'] or text_length(block) > budget.max_item
+            continue
+        assert not any(block['heading'] or text_length(block) > budget.max_item for block in group_blocks)
+        input_cost = sum(text_length(block) + budget.item_overhead for block in group_blocks)
+        assert input_cost <= budget.max_input
+        ratio = input_cost / budget.max_input
+        if max_output:
+            output_cost = sum(output_measure(block) + budget.item_overhead for block in group_blocks)
+            assert output_cost <= max_output
+            ratio = max(ratio, output_cost / max_output)
+        assert fill_ratio == pytest.approx(ratio)
+
+
+def test_first_fit_decreasing_packs_tightly():
+    rng = random.Random(3)
+    blocks = make_blocks(rng, 200)
+    budget = BatchBudget(max_input=600, max_item=200, item_overhead=10)
+    groups = pack_blocks(blocks, budget, text_length)
+    batches = [group_blocks for group_type, group_blocks, _ in groups if group_type == 'batch']
+    total = sum(text_length(block) + budget.item_overhead for group_blocks in batches for block in group_blocks)
+    # 首次适应下至多一个批次不到半满
+    assert len(batches) <= 2 * total / budget.max_input + 1
+
+
+def test_non_adjacent_blocks_share_a_batch():
+    blocks = [{'id': 0, 'text': 'a' * 10}, {'id': 1, 'text': 'b' * 300}, {'id': 2, 'text': 'c' * 10}]
+    groups = pack_blocks(blocks, BatchBudget(max_input=100, max_item=50), text_length)
+    # 中间的长块单独翻译，不会把两侧的短块拆成两批
+    assert [(group_type, [block['id'] for block in group_blocks]) for group_type, group_blocks, _ in groups] == [
+        ('batch', [0, 2]),
+        ('single', [1]),
+    ]
+
+
+def test_pack_is_deterministic_for_equal_costs():
+    blocks = [{'id': idx, 'text': 'x' * 30} for idx in range(10)]
+    budget = BatchBudget(max_input=100, max_item=50)
+    first = pack_blocks(blocks, budget, text_length)
+    assert first == pack_blocks(list(blocks), budget, text_length)
+    assert [[block['id'] for block in group_blocks] for _, group_blocks, _ in first] == [
+        [0, 1, 2], [3, 4, 5], [6, 7, 8], [9]
+    ]
+    assert pack_blocks([], budget, text_length) == []
@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from translator import PDFTranslator
+
+
+def fake_chat(calls):
+    def chat_completion(messages, api_type=None, temperature=0.1, timeout=None, phase=None):
+        calls.append(phase)
+        content = messages[-1]['content']
+        if phase == 'polish':
+            return '润色后的中文译文。'
+        ids = re.findall(r'<item id="(\d+)">', content)
+        return '\n'.join(f'<item id="{idx}">第{idx}项的中文初稿。</item>' for idx in ids)
+    return chat_completion
+
+
+@pytest.mark.parametrize('mode, polished', [('normal', False), ('refined', True)])
+def test_batch_items_follow_translation_mode(mode, polished):
+    translator = PDFTranslator(api_type='deepseek', api_key='x', translation_mode=mode)
+    calls = []
+    translator._chat_completion = fake_chat(calls)
+    texts = ['Figure 1: system overview', 'Table 2: benchmark results', 'Section 3.1 Methods']
+
+    translated = translator._translate_text_chat_batch(texts, 'en', 'zh')
+
+    if polished:
+        # 精修模式下批次里的每一项都和单段翻译一样经过润色
+        assert translated == ['润色后的中文译文。'] * len(texts)
+        assert calls == ['batch'] + ['polish'] * len(texts)
+    else:
+        assert translated == [f'第{idx}项的中文初稿。' for idx in range(len(texts))]
+        assert calls == ['batch']
+
+
+def test_rejected_batch_items_are_not_polished():
+    translator = PDFTranslator(api_type='deepseek', api_key='x', translation_mode='refined')
+    calls = []
+
+    def chat_completion(messages, api_type=None, temperature=0.1, timeout=None, phase=None):
+        calls.append(phase)
+        if phase == 'polish':
+            return '润色后的中文译文。'
+        # 第二项原样返回英文，未通过校验，留给调用方补翻
+        return '<item id="0">第0项的中文初稿。</item>\n<item id="1">Table 2: benchmark results</item>'
+
+    translator._chat_completion = chat_completion
+    translated = translator._translate_text_chat_batch(['Figure 1: system overview', 'Table 2: benchmark results'], 'en', 'zh')
+
+    assert translated == ['润色后的中文译文。', None]
+    assert calls == ['batch', 'polish']
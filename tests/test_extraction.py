@@ -0,0 +1,143 @@
+import concurrent.futures
+import os
+
+import fitz
+import pytest
+
+from translator import PDFTranslator
+
+
+def make_image_pdf(path, pages=3):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f'Heading {page_num + 1}', fontsize=20)
+        page.insert_text((72, 120), f'Body text on page {page_num + 1}.', fontsize=11)
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), 0)
+        pixmap.clear_with(40 * page_num)
+        page.insert_image(fitz.Rect(300, 300, 400, 400), pixmap=pixmap)
+        page.draw_rect(fitz.Rect(72, 500, 300, 540), color=(0, 0, 0), fill=(0.9, 0.9, 0.2))
+    doc.save(str(path))
+    doc.close()
+
+
+@pytest.fixture
+def call_counts(monkeypatch):
+    counts = {'get_images': 0, 'get_drawings': 0}
+    for name in counts:
+        original = getattr(fitz.Page, name)
+
+        def wrapper(self, *args, _name=name, _original=original, **kwargs):
+            counts[_name] += 1
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(fitz.Page, name, wrapper)
+    return counts
+
+
+def test_page_record_lists_images_once(tmp_path, call_counts):
+    path = tmp_path / 'images.pdf'
+    make_image_pdf(path)
+    translator = PDFTranslator(api_type='google')
+    doc = fitz.open(str(path))
+    records = [translator._extract_page_record(doc, page_num, False, {}) for page_num in range(len(doc))]
+    doc.close()
+
+    assert call_counts['get_images'] == len(records)
+    assert call_counts['get_drawings'] == len(records)
+    for record in records:
+        assert record['has_images']
+        assert [len(rects) for _, rects in record['images']] == [1]
+        assert record['drawings']
+
+
+def test_overlay_extraction_skips_drawings(tmp_path, call_counts):
+    path = tmp_path / 'images.pdf'
+    make_image_pdf(path)
+    translator = PDFTranslator(api_type='google', render_mode='overlay')
+    doc = fitz.open(str(path))
+    records = list(translator._iter_page_records(doc, str(path), len(doc), False, drawings=False))
+    doc.close()
+
+    assert call_counts['get_drawings'] == 0
+    assert all(record['drawings'] == [] and record['images'] for record in records)
+
+
+def test_extraction_workers_follow_env(monkeypatch):
+    translator = PDFTranslator(api_type='google')
+    monkeypatch.setenv('PDFAPP_EXTRACT_WORKERS', '3')
+    assert translator._extraction_workers(translator.PARALLEL_EXTRACTION_MIN_PAGES - 1) == 0
+    assert translator._extraction_workers(200) == 3
+    # 进程数不超过页段数
+    assert translator._extraction_workers(translator.PARALLEL_EXTRACTION_MIN_PAGES) == min(
+        3, -(-translator.PARALLEL_EXTRACTION_MIN_PAGES // translator.EXTRACTION_SHARD_PAGES)
+    )
+    monkeypatch.setenv('PDFAPP_EXTRACT_WORKERS', '1')
+    assert translator._extraction_workers(200) == 0
+    monkeypatch.setenv('PDFAPP_EXTRACT_WORKERS', 'many')
+    default = min(4, os.cpu_count() or 1)
+    assert translator._extraction_workers(200) == (default if default > 1 else 0)
+
+
+def parallel_translator(monkeypatch, workers=2):
+    monkeypatch.setenv('PDFAPP_EXTRACT_WORKERS', str(workers))
+    logs = []
+    translator = PDFTranslator(api_type='google', log_callback=lambda message, level: logs.append(message))
+    translator.PARALLEL_EXTRACTION_MIN_PAGES = 1
+    translator.EXTRACTION_SHARD_PAGES = 3
+    return translator, logs
+
+
+def extract_all(translator, path, **kwargs):
+    doc = fitz.open(str(path))
+    try:
+        return list(translator._iter_page_records(doc, str(path), len(doc), False, **kwargs))
+    finally:
+        doc.close()
+
+
+def test_parallel_extraction_matches_serial(tmp_path, monkeypatch):
+    path = tmp_path / 'images.pdf'
+    make_image_pdf(path, pages=8)
+    serial = extract_all(PDFTranslator(api_type='google'), path)
+
+    translator, logs = parallel_translator(monkeypatch)
+    parallel = extract_all(translator, path)
+
+    assert any('并行提取: 2 个进程，3 个页段' in message for message in logs)
+    assert not any('串行' in message for message in logs)
+    assert [record['page_num'] for record in parallel] == list(range(8))
+    assert parallel == serial
+
+
+class FailingExecutor:
+    """在当前进程里同步执行页段，从 fail_from 页起的页段抛错，模拟进程池中途不可用。"""
+
+    def __init__(self, fail_from):
+        self.fail_from = fail_from
+
+    def submit(self, fn, input_path, start, end, *args):
+        future = concurrent.futures.Future()
+        if start >= self.fail_from:
+            future.set_exception(RuntimeError('worker died'))
+        else:
+            future.set_result(fn(input_path, start, end, *args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_parallel_extraction_falls_back_to_serial_from_first_missing_page(tmp_path, monkeypatch):
+    path = tmp_path / 'images.pdf'
+    make_image_pdf(path, pages=8)
+    serial = extract_all(PDFTranslator(api_type='google'), path, drawings=False)
+
+    translator, logs = parallel_translator(monkeypatch)
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', lambda **kwargs: FailingExecutor(3))
+    records = extract_all(translator, path, drawings=False)
+
+    # 第一个页段来自进程池，其余页从第 4 页起串行补齐，不重复也不缺页
+    assert [record['page_num'] for record in records] == list(range(8))
+    assert records == serial
+    assert any('从第 4 页起改为串行提取' in message for message in logs)
@@ -0,0 +1,120 @@
+import json
+import re
+
+import fitz
+import pytest
+
+import pdf_output
+from job_journal import JobJournal, build_job_key, journal_path_for
+from translator import PDFTranslator
+
+
+def test_journal_round_trip_skips_torn_lines(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = JobJournal(path, 'job-a')
+    journal.record('p:0', '第一页')
+    journal.record('b:1:0', '第二页第一块')
+    journal.record('b:1:1', None)
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"k": "b:1:2", "v": "写了一')  # 进程被杀时写了一半的行
+
+    resumed = JobJournal(path, 'job-a', resume=True)
+    assert resumed.resumed_count == 2
+    assert (resumed.get('p:0'), resumed.get('b:1:0'), resumed.get('b:1:1')) == ('第一页', '第二页第一块', None)
+    resumed.record('b:1:2', '第二页第三块')
+    resumed.close()
+
+    assert len(JobJournal(path, 'job-a', resume=True)) == 3
+
+
+def test_journal_from_another_job_is_ignored(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = JobJournal(path, 'job-a')
+    journal.record('p:0', '第一页')
+    journal.close()
+
+    assert JobJournal(path, 'job-b', resume=True).resumed_count == 0
+    # 不续传时直接覆盖旧日志，首行换成新的任务键
+    JobJournal(path, 'job-a', resume=False).close()
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['job'] for line in f] == ['job-a']
+    assert JobJournal(path, 'job-a', resume=True).resumed_count == 0
+
+
+def test_job_key_tracks_file_content_and_settings(tmp_path):
+    path = tmp_path / 'in.pdf'
+    path.write_bytes(b'%PDF-1.4 original')
+    key = build_job_key(str(path), ('pdf', 'en', 'zh'))
+    assert key == build_job_key(str(path), ('pdf', 'en', 'zh'))
+    assert key != build_job_key(str(path), ('pdf', 'en', 'es'))
+    path.write_bytes(b'%PDF-1.4 changed')
+    assert key != build_job_key(str(path), ('pdf', 'en', 'zh'))
+    assert journal_path_for(str(tmp_path), key) == str(tmp_path / f'journal_{key[:16]}.jsonl')
+
+
+def make_text_pdf(path, pages=3):
+    # 翻译记忆在进程内共享，正文带上文件所在目录名，各测试之间不会互相命中
+    tag = path.parent.name
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(72, 72, 520, 400),
+            f'Paragraph on page {page_num + 1} of {tag}. ' + 'This sentence is long enough to be translated on its own. ' * 5,
+            fontsize=11
+        )
+    doc.save(str(path))
+    doc.close()
+
+
+def fake_post(calls):
+    def post(config, messages, api_type, temperature, timeout):
+        content = messages[-1]['content']
+        calls.append(content)
+        pages = content.count('__PAGE_BREAK__') + 1
+        return {'choices': [{'message': {'content': '\n__PAGE_BREAK__\n'.join(['这是一段已经翻译好的中文正文内容。'] * pages)}}]}
+    return post
+
+
+def run_translation(tmp_path, resume, calls, logs):
+    translator = PDFTranslator(
+        api_type='deepseek', api_key='x', log_callback=lambda message, level: logs.append(message)
+    )
+    translator._post_chat_completion = fake_post(calls)
+    translator.translate_pdf(str(tmp_path / 'in.pdf'), str(tmp_path / 'out.pdf'), 'en', 'zh', concurrency=2, resume=resume)
+
+
+def test_resume_skips_units_finished_before_a_crash(tmp_path, monkeypatch):
+    make_text_pdf(tmp_path / 'in.pdf')
+    original_finish = pdf_output.ChunkedPdfWriter.finish
+
+    def crash(self, output_path, compression='small'):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(pdf_output.ChunkedPdfWriter, 'finish', crash)
+    first_calls, logs = [], []
+    with pytest.raises(RuntimeError):
+        run_translation(tmp_path, False, first_calls, logs)
+    assert first_calls
+    assert list(tmp_path.glob('journal_*.jsonl'))
+
+    monkeypatch.setattr(pdf_output.ChunkedPdfWriter, 'finish', original_finish)
+    resumed_calls, logs = [], []
+    run_translation(tmp_path, True, resumed_calls, logs)
+
+    # 已完成的翻译单元全部来自断点日志，不再请求服务；输出落盘后日志删除
+    assert resumed_calls == []
+    assert any(re.search(r'断点续传：已恢复 \d+ 个已完成的翻译单元', message) for message in logs)
+    assert not list(tmp_path.glob('journal_*.jsonl'))
+    doc = fitz.open(str(tmp_path / 'out.pdf'))
+    assert all('中文正文' in page.get_text() for page in doc)
+    doc.close()
+
+
+def test_resume_without_journal_starts_over(tmp_path):
+    make_text_pdf(tmp_path / 'in.pdf')
+    calls, logs = [], []
+    run_translation(tmp_path, True, calls, logs)
+    assert calls
+    assert '未找到可用的断点，从头开始翻译' in logs
@@ -0,0 +1,123 @@
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import worker as worker_module
+from job_store import JobStore, MemoryJobStore, SQLiteJobStore
+from worker import JobWorker
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_job_store_is_abstract():
+    with pytest.raises(TypeError):
+        JobStore()
+
+    class Partial(JobStore):
+        def enqueue(self, task_id, job, api_key=None):
+            pass
+
+    # 漏实现的方法在实例化时就报错，而不是运行到一半才抛 NotImplementedError
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_claim_hands_over_and_clears_api_key(store):
+    store.enqueue('t1', {'task_dir': '/tmp/t1'}, api_key='sk-secret')
+    store.enqueue('t2', {'task_dir': '/tmp/t2'})
+    task, api_key = store.claim('w1')
+    assert (task['task_id'], task['status'], task['worker_id'], api_key) == ('t1', 'running', 'w1', 'sk-secret')
+    task, api_key = store.claim('w1')
+    assert (task['task_id'], api_key) == ('t2', None)
+    assert store.claim('w1') is None
+    if isinstance(store, SQLiteJobStore):
+        assert store._conn.execute('SELECT COUNT(*) FROM jobs WHERE api_key IS NOT NULL').fetchone()[0] == 0
+
+
+def test_cancel_queued_and_running(store):
+    store.enqueue('queued', {}, api_key='sk-secret')
+    assert store.request_cancel('queued')
+    assert store.get_task('queued')['status'] == 'cancelled'
+    assert store.read_events('queued')[-1][1]['status'] == 'cancelled'
+    assert store.claim('w1') is None
+
+    store.enqueue('running', {})
+    store.claim('w1')
+    assert store.request_cancel('running')
+    assert store.is_cancel_requested('running')
+    assert store.get_task('running')['status'] == 'running'
+    store.finish('running', 'cancelled')
+    assert not store.request_cancel('running')
+
+
+def test_events_are_read_in_order(store):
+    store.enqueue('t1', {})
+    first = store.append_event('t1', {'type': 'log', 'message': 'a'})
+    store.append_event('t1', {'type': 'log', 'message': 'b'})
+    assert [event['message'] for _, event in store.read_events('t1')] == ['a', 'b']
+    assert [event['message'] for _, event in store.read_events('t1', after=first)] == ['b']
+    assert store.read_events('t1', after=first + 1, timeout=0.05) == []
+
+
+def test_heartbeat_keeps_lease_and_stale_tasks_expire(store):
+    store.enqueue('alive', {})
+    store.enqueue('lost', {})
+    store.claim('w1')
+    store.claim('w2')
+    time.sleep(0.05)
+    store.heartbeat(['alive'])
+    assert store.expire_stale(0.03) == ['lost']
+    assert store.get_task('alive')['status'] == 'running'
+    assert store.get_task('lost')['status'] == 'error'
+
+
+def test_sqlite_store_file_is_private(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    path.write_bytes(b'')
+    os.chmod(path, 0o644)
+    store = SQLiteJobStore(str(path))
+    store.enqueue('t1', {}, api_key='sk-secret')
+    for suffix in ['', '-wal', '-shm']:
+        target = str(path) + suffix
+        if os.path.exists(target):
+            assert stat.S_IMODE(os.stat(target).st_mode) == 0o600, suffix
+
+
+def test_stopped_worker_keeps_heartbeating_until_jobs_finish(monkeypatch):
+    store = MemoryJobStore()
+    release = threading.Event()
+    started = threading.Event()
+
+    def run_job(store, task, api_key=None):
+        started.set()
+        release.wait(5)
+        store.finish(task['task_id'], 'completed')
+
+    monkeypatch.setattr(worker_module, 'run_job', run_job)
+    monkeypatch.setattr(worker_module, 'HEARTBEAT_INTERVAL', 0.02)
+    monkeypatch.setattr(worker_module, 'IDLE_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(worker_module, 'LEASE_SECONDS', 0.2)
+
+    store.enqueue('long', {})
+    worker = JobWorker(store, concurrency=1).start()
+    assert started.wait(2)
+    worker.stop()
+
+    # 停止领取后任务还在跑：租期过了好几轮，另一个 worker 的过期检查也不能判它失联
+    for _ in range(5):
+        time.sleep(0.1)
+        assert store.expire_stale(0.2) == []
+        assert store.get_task('long')['status'] == 'running'
+    assert not worker.wait_drained(0)
+
+    release.set()
+    assert worker.wait_drained(2)
+    assert store.get_task('long')['status'] == 'completed'
@@ -0,0 +1,113 @@
+import re
+
+import fitz
+import pytest
+
+from page_templates import derive_template, fill_template, template_key
+from translator import PDFTranslator
+
+PAGE_HEIGHT = 792
+
+
+@pytest.mark.parametrize('text, rect, expected', [
+    ('Page 3 of 10', fitz.Rect(72, 20, 200, 40), ('header', 2, 'Page # of #')),
+    ('  Chapter  12 \n Methods ', fitz.Rect(72, 750, 300, 770), ('footer', 94, 'Chapter # Methods')),
+    # 不含数字、位于正文区域、过长的块都没有模板键
+    ('Annual Report', fitz.Rect(72, 20, 200, 40), None),
+    ('Page 3 of 10', fitz.Rect(72, 300, 200, 320), None),
+    ('Figure 7 ' + 'x' * 200, fitz.Rect(72, 20, 500, 40), None),
+    ('Page 3', None, None),
+])
+def test_template_key(text, rect, expected):
+    assert template_key(text, rect, PAGE_HEIGHT) == expected
+
+
+def test_template_key_tolerates_small_vertical_jitter():
+    first = template_key('Page 1 of 9', fitz.Rect(72, 753, 200, 765), PAGE_HEIGHT)
+    second = template_key('Page 2 of 9', fitz.Rect(72, 754, 200, 766), PAGE_HEIGHT)
+    assert first == second
+    assert template_key('Page 1 of 9', fitz.Rect(72, 770, 200, 780), PAGE_HEIGHT) != first
+
+
+def test_derive_and_fill_keep_number_order():
+    template = derive_template('Page 3 of 10', '第 3 页，共 10 页')
+    assert template == ['第 ', 0, ' 页，共 ', 1, ' 页']
+    assert fill_template(template, 'Page 7 of 10') == '第 7 页，共 10 页'
+    assert fill_template(template, 'Page 12 of 120') == '第 12 页，共 120 页'
+    # 数字个数对不上时不填
+    assert fill_template(template, 'Page 7') is None
+
+
+def test_derive_allows_reordered_distinct_numbers():
+    template = derive_template('Page 3 of 10', '共 10 页中的第 3 页')
+    assert template == ['共 ', 1, ' 页中的第 ', 0, ' 页']
+    assert fill_template(template, 'Page 8 of 42') == '共 42 页中的第 8 页'
+
+
+@pytest.mark.parametrize('source, translated', [
+    ('Page 3 of 10', '第三页，共十页'),  # 数字译成了汉字
+    ('Page 3 of 10', '第 3 页'),  # 丢了数字
+    ('Page 3 of 10', '第 3 页，共 10 页（2024）'),  # 多了数字
+    ('Annual Report', '年度报告'),  # 原文没有数字
+    ('Figure 2.2.3', '图 3.2.2'),  # 有重复数字时换了序，无法确定对应关系
+])
+def test_derive_rejects_unmatched_numbers(source, translated):
+    assert derive_template(source, translated) is None
+
+
+HEADER = re.compile(r'Quarterly Report, page (\d+) of (\d+)')
+
+
+def translate_item(text):
+    match = HEADER.search(text)
+    if match:
+        return f'季度报告，第 {match.group(1)} 页，共 {match.group(2)} 页'
+    return '这是一段已经翻译好的中文正文内容。'
+
+
+def test_headers_are_filled_from_one_translation(tmp_path):
+    input_path = tmp_path / 'report.pdf'
+    doc = fitz.open()
+    pages = 5
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), f'Quarterly Report, page {page_num + 1} of {pages}', fontsize=9)
+        # 页面带图片，按文本块翻译
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), 0)
+        pixmap.clear_with(page_num * 40)
+        page.insert_image(fitz.Rect(400, 300, 500, 400), pixmap=pixmap)
+        page.insert_textbox(
+            fitz.Rect(72, 120, 520, 280),
+            f'Body paragraph {page_num}. ' + 'This sentence is long enough to be translated on its own. ' * 4,
+            fontsize=11
+        )
+    doc.save(str(input_path))
+    doc.close()
+
+    requested = []
+
+    def post(config, messages, api_type, temperature, timeout):
+        content = messages[-1]['content']
+        items = re.findall(r'<item id="(\d+)">(.*?)</item>', content, re.S)
+        if items:
+            requested.extend(text for _, text in items)
+            reply = '\n'.join(f'<item id="{idx}">{translate_item(text)}</item>' for idx, text in items)
+        else:
+            source = content.rsplit('\n\n', 1)[-1]
+            requested.append(source)
+            reply = translate_item(source)
+        return {'choices': [{'message': {'content': reply}}]}
+
+    logs = []
+    translator = PDFTranslator(api_type='deepseek', api_key='x', log_callback=lambda message, level: logs.append(message))
+    translator._post_chat_completion = post
+    output_path = tmp_path / 'out.pdf'
+    translator.translate_pdf(str(input_path), str(output_path), 'en', 'zh', concurrency=2)
+
+    # 只有代表页的页眉发给服务，其余页按模板本地填充
+    assert len([text for text in requested if 'Quarterly Report' in text]) == 1
+    assert any(f'{pages - 1} 个块按模板本地填充' in message for message in logs)
+    doc = fitz.open(str(output_path))
+    for page_num, page in enumerate(doc):
+        assert f'第{page_num + 1}页，共{pages}页' in ''.join(page.get_text().split())
+    doc.close()
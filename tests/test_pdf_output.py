@@ -0,0 +1,87 @@
+import os
+
+import fitz
+import pytest
+
+import pdf_output
+from font_manager import DocumentFonts, FontLibrary
+from pdf_output import ChunkedPdfWriter
+from preview import list_fragments
+
+
+@pytest.fixture
+def cjk_font(tmp_path):
+    # 仓库里没有字体文件，用 PyMuPDF 自带的 CJK 字体代替系统字体
+    path = tmp_path / 'cjk.ttf'
+    path.write_bytes(fitz.Font('cjk').buffer)
+    return (('cjk', str(path)),)
+
+
+def write_pages(writer, font_files, pages, library):
+    for page_num in range(pages):
+        if writer.fonts is None:
+            writer.fonts = DocumentFonts(writer.doc, font_files, library=library)
+        page = writer.doc.new_page()
+        fontname = writer.fonts.register(page)[0]
+        page.insert_textbox(fitz.Rect(72, 72, 520, 300), f'第{page_num + 1}页的中文译文', fontname=fontname, fontsize=14)
+        writer.pages_rendered()
+
+
+def test_chunks_embed_only_used_glyphs(tmp_path, cjk_font):
+    chunk_dir = str(tmp_path / 'chunks')
+    writer = ChunkedPdfWriter(chunk_dir, chunk_pages=2)
+    write_pages(writer, cjk_font, 5, FontLibrary())
+    writer.flush()
+
+    font_size = os.path.getsize(cjk_font[0][1])
+    fragments = list_fragments(chunk_dir)
+    assert len(fragments) == 3
+    for _, _, path in fragments:
+        # 每个分片（也是预览分片）只带本分片用到的字形，而不是一份完整字体
+        assert os.path.getsize(path) < font_size / 20, path
+
+    output_path = str(tmp_path / 'out.pdf')
+    writer.finish(output_path, 'small')
+    assert writer.fonts_subset
+    doc = fitz.open(output_path)
+    assert [page.get_text().strip() for page in doc] == [f'第{n}页的中文译文' for n in range(1, 6)]
+    doc.close()
+
+
+def test_chunks_keep_full_fonts_without_fonttools(tmp_path, cjk_font, monkeypatch):
+    monkeypatch.setattr(pdf_output, 'subset_fonts', lambda doc: False)
+    writer = ChunkedPdfWriter(str(tmp_path / 'chunks'), chunk_pages=2)
+    write_pages(writer, cjk_font, 3, FontLibrary())
+    writer.finish(str(tmp_path / 'out.pdf'), 'small')
+    assert not writer.fonts_subset
+    assert writer.full_font_chunks == 2
+
+
+def test_unsubset_chunks_are_deduplicated_in_fast_profile(tmp_path, cjk_font, monkeypatch):
+    monkeypatch.setattr(pdf_output, 'subset_fonts', lambda doc: False)
+    chunk_dir = str(tmp_path / 'chunks')
+    writer = ChunkedPdfWriter(chunk_dir, chunk_pages=2)
+    write_pages(writer, cjk_font, 6, FontLibrary())
+    writer.flush()
+    chunk_size = max(os.path.getsize(path) for _, _, path in list_fragments(chunk_dir))
+
+    output_path = str(tmp_path / 'out.pdf')
+    writer.finish(output_path, 'fast')
+    # 三个分片各带一份完整字体，fast 档位此时也要按内容去重，只留一份
+    assert os.path.getsize(output_path) < chunk_size * 1.5
+
+
+@pytest.mark.parametrize('compression', ['small', 'fast'])
+def test_large_output_is_merged_in_batches(tmp_path, cjk_font, monkeypatch, compression):
+    monkeypatch.setattr(pdf_output, 'MERGE_BATCH_BYTES', 1)
+    writer = ChunkedPdfWriter(str(tmp_path / 'chunks'), chunk_pages=2)
+    write_pages(writer, cjk_font, 7, FontLibrary())
+    writer.flush()
+    assert [len(batch) for batch in writer._merge_batches()] == [1, 1, 1, 1]
+
+    output_path = str(tmp_path / 'out.pdf')
+    writer.finish(output_path, compression)
+    doc = fitz.open(output_path)
+    assert [page.get_text().strip() for page in doc] == [f'第{n}页的中文译文' for n in range(1, 8)]
+    doc.close()
+    assert not os.path.exists(output_path + '.merging')
@@ -0,0 +1,97 @@
+import pytest
+
+import perf_history
+from perf_history import PerformanceHistory, estimate_job, fit_throughput
+
+
+def job(translate_seconds, units=10, concurrency=4, pages=20, render=1.0, save=1.0, source=1000, inputs=1500,
+        outputs=1200, requests=5, **extra):
+    return dict({
+        'kind': 'pdf', 'provider': 'deepseek', 'pages': pages, 'units': units, 'concurrency': concurrency,
+        'translate_seconds': translate_seconds, 'render_seconds': render, 'save_seconds': save,
+        'source_tokens': source, 'input_tokens': inputs, 'output_tokens': outputs, 'requests': requests,
+    }, **extra)
+
+
+def plan(units=40, pages=100, source_tokens=20000, input_tokens=24000, output_tokens=22000, provider='deepseek'):
+    return {
+        'total_pages': pages,
+        'source_tokens': source_tokens,
+        'providers': {provider: {'units': units, 'input_tokens': input_tokens, 'output_tokens': output_tokens}},
+    }
+
+
+def test_fit_needs_enough_jobs_that_called_the_service():
+    records = [job(10), job(20), job(0, requests=0)]
+    # 全部命中翻译记忆的任务不算数
+    assert fit_throughput(records) is None
+    assert fit_throughput(records + [job(30)])['jobs'] == 3
+
+
+def test_fit_normalizes_by_effective_concurrency():
+    records = [
+        job(10, units=10, concurrency=4),  # 4 个并发槽：每单元 4 秒
+        job(12, units=2, concurrency=8),  # 只有 2 个单元，有效并发 2：每单元 12 秒
+        job(20, units=10, concurrency=None),  # 未记录并发按 1：每单元 2 秒
+        job(24, units=6, concurrency=2, pages=10, render=3, save=2, source=500, inputs=1000, outputs=250),
+    ]
+    model = fit_throughput(records)
+    # 每单元秒数 [4, 12, 2, 8]，排序后 [2, 4, 8, 12]
+    assert model['unit_seconds'] == pytest.approx((3.5, 6.0, 9.0))
+    assert model['page_seconds'] == pytest.approx((0.1, 0.1, 0.2))
+    assert model['input_ratio'] == pytest.approx((1.5, 1.5, 1.625))
+    assert model['output_ratio'] == pytest.approx((1.025, 1.2, 1.2))
+
+
+def test_estimate_with_priors():
+    google = estimate_job('google', plan(provider='google'), 4, {'input': 0, 'output': 0})
+    prior = perf_history.PRIOR_UNIT_SECONDS['google']
+    low, mid, high = (prior * factor for factor in (perf_history.PRIOR_SPREAD[0], 1, perf_history.PRIOR_SPREAD[1]))
+    page_cost = 100 * perf_history.PRIOR_PAGE_SECONDS
+    assert google['seconds'] == [round(40 * value / 4 + page_cost, 1) for value in (low, mid, high)]
+    assert google['cost'] == [0, 0, 0]
+    assert google['history_jobs'] == 0
+
+    chat = estimate_job('deepseek', plan(), 4, {'input': 1.0, 'output': 2.0})
+    assert chat['seconds'][1] == round(40 * perf_history.PRIOR_CHAT_UNIT_SECONDS / 4 + page_cost, 1)
+    assert chat['input_tokens'] == round(24000 * perf_history.PRIOR_CHAT_INPUT_RATIO[1])
+    assert chat['output_tokens'] == 22000
+    assert chat['cost'][0] < chat['cost'][1] < chat['cost'][2]
+
+
+def test_estimate_with_fitted_model():
+    model = {
+        'jobs': 7,
+        'unit_seconds': (2.0, 4.0, 8.0),
+        'page_seconds': (0.1, 0.1, 0.2),
+        'input_ratio': (1.2, 1.5, 2.0),
+        'output_ratio': (0.9, 1.1, 1.3),
+    }
+    estimate = estimate_job('deepseek', plan(units=40, pages=100), 100, {'input': 1.0, 'output': 2.0}, model)
+    # 并发数超过单元数时按单元数计
+    assert estimate['seconds'] == [12.0, 14.0, 28.0]
+    assert estimate['input_tokens'] == 30000
+    assert estimate['output_tokens'] == 22000
+    assert estimate['cost'] == [0.06, 0.074, 0.092]
+    assert estimate['history_jobs'] == 7
+
+
+def test_history_filters_compacts_and_fits_per_provider(tmp_path):
+    path = tmp_path / 'perf.jsonl'
+    history = PerformanceHistory(str(path), max_records=3)
+    for seconds in [10, 20, 30]:
+        history.append(job(seconds))
+    history.append(job(5, kind='text'))
+    history.append(job(40, provider='google'))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"kind": "pdf", "provi')  # 写了一半的行
+
+    assert [record['translate_seconds'] for record in history.records(kind='pdf', provider='deepseek')] == [10, 20, 30]
+    assert history.records(kind='pdf', limit=1)[0]['provider'] == 'google'
+    assert set(history.fit_models('pdf')) == {'deepseek'}
+
+    # 写了一半的行之后追加的记录不会和它粘在一起；超过 max_records 的两倍时压缩为最近的 max_records 条
+    history.append(job(50))
+    assert [record['translate_seconds'] for record in history.records(limit=None)][-1] == 50
+    history.append(job(60))
+    assert [record['translate_seconds'] for record in history.records(limit=None)] == [40, 50, 60]
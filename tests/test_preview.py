@@ -0,0 +1,59 @@
+import fitz
+import pytest
+
+from preview import available_pages, build_preview, list_fragments, parse_page_ranges
+
+
+@pytest.mark.parametrize('spec, max_page, expected', [
+    ('', 12, [(1, 12)]),
+    ('  ', 0, []),
+    ('5', 12, [(5, 5)]),
+    ('1-20', 12, [(1, 12)]),
+    ('3 - 4', 12, [(3, 4)]),
+    ('30-', 40, [(30, 40)]),
+    ('1-3,8, 10-', 12, [(1, 3), (8, 8), (10, 12)]),
+    # 超出已完成页数的部分截掉，整段都超出时不返回
+    ('15-20', 12, []),
+    ('13', 12, []),
+])
+def test_parse_page_ranges(spec, max_page, expected):
+    assert parse_page_ranges(spec, max_page) == expected
+
+
+@pytest.mark.parametrize('spec', ['0', '5-3', 'a-b', '1-3;5', '-4', '1,,2', '1-2-3'])
+def test_parse_page_ranges_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec, 12)
+
+
+def write_fragment(directory, start, end):
+    doc = fitz.open()
+    for page_no in range(start, end + 1):
+        doc.new_page().insert_text((72, 72), f'translated page {page_no}')
+    doc.save(str(directory / f'pages_{start:05d}-{end:05d}.pdf'))
+    doc.close()
+
+
+def test_fragments_are_listed_in_page_order(tmp_path):
+    for start, end in [(21, 40), (1, 20), (61, 70)]:
+        write_fragment(tmp_path, start, end)
+    (tmp_path / 'pages_00071-00080.pdf.tmp').write_bytes(b'partial')
+    (tmp_path / 'notes.txt').write_text('ignored')
+
+    fragments = list_fragments(str(tmp_path))
+    assert [(start, end) for start, end, _ in fragments] == [(1, 20), (21, 40), (61, 70)]
+    # 41-60 还没写出来，只有前 40 页连续可预览
+    assert available_pages(fragments) == 40
+    assert list_fragments(str(tmp_path / 'missing')) == []
+    assert available_pages([]) == 0
+
+
+def test_build_preview_takes_pages_across_fragments(tmp_path):
+    for start, end in [(1, 3), (4, 6), (7, 9)]:
+        write_fragment(tmp_path, start, end)
+    sources = list_fragments(str(tmp_path))
+
+    data = build_preview(sources, parse_page_ranges('2-5,9', available_pages(sources)))
+    doc = fitz.open('pdf', data)
+    assert [page.get_text().strip() for page in doc] == [f'translated page {n}' for n in [2, 3, 4, 5, 9]]
+    doc.close()
@@ -0,0 +1,80 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+import rate_limiter
+from rate_limiter import ProviderRateLimiter
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('1.5', 1.5),
+    (2, 2.0),
+    ('20ms', 0.02),
+    ('6m0s', 360.0),
+    ('1h30m', 5400.0),
+    ('', None),
+    (None, None),
+    ('soon', None),
+])
+def test_parse_duration(value, seconds):
+    result = rate_limiter._parse_duration(value)
+    if seconds is None:
+        assert result is None
+    else:
+        assert result == pytest.approx(seconds)
+
+
+def test_parse_retry_after_accepts_seconds_and_http_date():
+    assert rate_limiter._parse_retry_after('7') == 7.0
+    assert rate_limiter._parse_retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+    # 已经过去的时间点不产生负数等待
+    assert rate_limiter._parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+    assert rate_limiter._parse_retry_after('not a date') is None
+
+
+def test_parse_reset_accepts_durations_and_epoch_timestamps():
+    now = time.time()
+    assert rate_limiter._parse_reset('12s') == 12.0
+    assert rate_limiter._parse_reset(str(int(now + 20))) == pytest.approx(20, abs=2)
+    assert rate_limiter._parse_reset(str(int((now + 20) * 1000))) == pytest.approx(20, abs=2)
+    assert rate_limiter._parse_reset(str(int(now - 20))) == 0.0
+
+
+def test_observe_reads_limit_and_exhausted_remaining_headers():
+    limiter = ProviderRateLimiter(rpm=60)
+    wait = limiter.observe(200, {
+        'X-RateLimit-Limit-Requests': '120',
+        'X-RateLimit-Remaining-Requests': '5',
+        'X-RateLimit-Remaining-Tokens': '0',
+        'X-RateLimit-Reset-Tokens': '1.5s',
+    })
+    assert limiter.requests.capacity == 120
+    assert limiter.requests.rate == 2
+    # 只有耗尽的那一组按重置时间暂停
+    assert wait == 1.5
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(1.5, abs=0.2)
+
+
+def test_observe_ignores_malformed_headers():
+    limiter = ProviderRateLimiter(rpm=60)
+    assert limiter.observe(200, {'x-ratelimit-limit-requests': 'many', 'x-ratelimit-remaining': 'n/a'}) == 0.0
+    assert limiter.requests.capacity == 60
+    assert limiter.blocked_until == 0.0
+
+
+def test_observe_honours_retry_after_on_429():
+    limiter = ProviderRateLimiter(rpm=60)
+    assert limiter.observe(429, {'Retry-After': '3'}) == 3.0
+    assert limiter.blocked_until - time.monotonic() == pytest.approx(3, abs=0.2)
+    # 超过上限的等待按 MAX_BACKOFF_SECONDS 封顶
+    limiter = ProviderRateLimiter(rpm=60)
+    assert limiter.observe(503, {'retry-after': '600'}) == 600.0
+    assert limiter.blocked_until - time.monotonic() <= rate_limiter.MAX_BACKOFF_SECONDS
+
+
+def test_observe_backs_off_exponentially_without_headers():
+    limiter = ProviderRateLimiter(rpm=60)
+    assert [limiter.observe(429, {}) for _ in range(3)] == [1.0, 2.0, 4.0]
+    limiter.observe(200, {})
+    assert limiter.observe(429, None) == 1.0
@@ -0,0 +1,63 @@
+import random
+
+import fitz
+
+from spatial_index import RectGrid
+
+
+def brute_force(items, rect, key=lambda item: item):
+    qx0, qy0, qx1, qy1 = tuple(rect)
+    matches = []
+    for item in items:
+        x0, y0, x1, y1 = tuple(key(item))
+        if x0 <= qx1 and qx0 <= x1 and y0 <= qy1 and qy0 <= y1:
+            matches.append(item)
+    return matches
+
+
+def random_rect(rng, width=612, height=792, max_size=120):
+    x0 = rng.uniform(-50, width)
+    y0 = rng.uniform(-50, height)
+    return fitz.Rect(x0, y0, x0 + rng.uniform(0, max_size), y0 + rng.uniform(0, max_size))
+
+
+def test_query_matches_brute_force():
+    rng = random.Random(7)
+    for count in [1, 5, 60, 700]:
+        rects = [random_rect(rng) for _ in range(count)]
+        grid = RectGrid(rects)
+        assert len(grid) == count
+        for _ in range(200):
+            query = random_rect(rng, max_size=300)
+            # 结果按插入顺序返回，与逐个比较的结果完全一致
+            assert grid.query(query) == brute_force(rects, query)
+
+
+def test_touching_edges_and_degenerate_rects_count_as_intersecting():
+    rects = [fitz.Rect(0, 0, 10, 10), fitz.Rect(10, 10, 20, 20), fitz.Rect(30, 30, 30, 30)]
+    grid = RectGrid(rects)
+    assert grid.query(fitz.Rect(10, 0, 15, 5)) == [rects[0]]
+    assert grid.query(fitz.Rect(5, 5, 10, 10)) == [rects[0], rects[1]]
+    assert grid.query(fitz.Rect(30, 30, 30, 30)) == [rects[2]]
+    assert grid.query(fitz.Rect(21, 21, 29, 29)) == []
+
+
+def test_items_outside_bounds_are_still_found():
+    rng = random.Random(11)
+    rects = [random_rect(rng, width=1200, height=1600) for _ in range(100)]
+    # 网格范围只覆盖页面，越界的条目登记到边缘格子里
+    grid = RectGrid(rects, bounds=fitz.Rect(0, 0, 612, 792))
+    for _ in range(200):
+        query = random_rect(rng, width=1200, height=1600, max_size=400)
+        assert grid.query(query) == brute_force(rects, query)
+
+
+def test_key_and_empty_grid():
+    blocks = [{'id': idx, 'bbox': (idx * 20, 0, idx * 20 + 15, 15)} for idx in range(10)]
+    grid = RectGrid(blocks, key=lambda block: block['bbox'])
+    assert [block['id'] for block in grid.query(fitz.Rect(36, 5, 62, 6))] == [2, 3]
+    assert list(grid) == blocks
+
+    empty = RectGrid()
+    assert len(empty) == 0
+    assert empty.query(fitz.Rect(0, 0, 100, 100)) == []
@@ -0,0 +1,113 @@
+import fitz
+
+from translator import PDFTranslator
+
+SENTENCE = 'This sentence is long enough to be translated on its own. '
+
+
+def paragraphs_of(sizes):
+    return [(page_num, f'P{idx} ' + 'x' * (size - len(f'P{idx} '))) for idx, (page_num, size) in enumerate(sizes)]
+
+
+def test_chunks_break_only_at_paragraph_boundaries():
+    translator = PDFTranslator(api_type='google')
+    paragraphs = paragraphs_of([(0, 30), (0, 50), (1, 40), (1, 90), (2, 10), (2, 60), (3, 45)])
+    chunks = list(translator._iter_text_chunks(paragraphs, len, 100))
+
+    assert all(len(text) <= 100 for text, _ in chunks)
+    # 每块由完整段落组成，按顺序拼回来就是原文
+    assert [text.split('\n\n') for text, _ in chunks] == [
+        [paragraphs[0][1], paragraphs[1][1]],
+        [paragraphs[2][1]],
+        [paragraphs[3][1]],
+        [paragraphs[4][1], paragraphs[5][1]],
+        [paragraphs[6][1]],
+    ]
+    # 块带着块内最后一段的页号
+    assert [page_num for _, page_num in chunks] == [0, 1, 1, 2, 3]
+
+
+def test_long_paragraph_is_split_at_sentence_ends():
+    translator = PDFTranslator(api_type='google')
+    paragraph = (SENTENCE * 30).strip()
+    chunks = [text for text, _ in translator._iter_text_chunks([(0, paragraph)], len, 400)]
+
+    assert len(chunks) > 1
+    assert all(len(text) <= 400 for text in chunks)
+    assert all(text.endswith('own.') for text in chunks)
+    assert ' '.join(' '.join(text.split()) for text in chunks) == paragraph
+
+
+def test_boundaries_do_not_depend_on_later_text():
+    translator = PDFTranslator(api_type='deepseek', api_key='x')
+    measure, budget = translator._text_chunk_measure()
+    paragraphs = [(idx // 3, f'Paragraph {idx}. ' + SENTENCE * (idx % 7 + 1)) for idx in range(200)]
+    chunks = list(translator._iter_text_chunks(paragraphs, measure, budget))
+    edited = paragraphs[:150] + [(50, 'Edited ' + SENTENCE * 40)] + paragraphs[151:]
+    edited_chunks = list(translator._iter_text_chunks(edited, measure, budget))
+
+    # 续传时块按序号和文本摘要对上断点：改动之前的块边界必须原样不变
+    prefix = next(idx for idx, chunk in enumerate(chunks) if 'Paragraph 150.' in chunk[0])
+    assert prefix > 0
+    assert edited_chunks[:prefix] == chunks[:prefix]
+    assert all(measure(text) <= budget for text, _ in chunks)
+
+
+def test_chunks_are_produced_while_paragraphs_stream_in():
+    translator = PDFTranslator(api_type='google')
+    consumed = []
+
+    def paragraphs():
+        for idx in range(1000):
+            consumed.append(idx)
+            yield idx, f'Paragraph {idx}. ' + SENTENCE
+
+    chunks = translator._iter_text_chunks(paragraphs(), len, 500)
+    next(chunks)
+    # 产出第一块时只读了装满它所需的段落，不需要先拿到全文
+    assert len(consumed) < 10
+
+
+def make_text_pdf(path, pages=6):
+    tag = path.parent.name
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(72, 72, 520, 300), f'Page {page_num + 1} of {tag}. ' + SENTENCE * 4, fontsize=11)
+        page.insert_textbox(fitz.Rect(72, 320, 520, 560), f'Second paragraph on page {page_num + 1}. ' + SENTENCE * 4, fontsize=11)
+    doc.save(str(path))
+    doc.close()
+
+
+def run_text_translation(tmp_path, resume, failing=()):
+    requested = []
+
+    def post(config, messages, api_type, temperature, timeout):
+        content = messages[-1]['content']
+        requested.append(content)
+        if any(marker in content for marker in failing):
+            raise RuntimeError('service unavailable')
+        return {'choices': [{'message': {'content': '这是一段已经翻译好的中文正文内容。' * (content.count(SENTENCE.strip()) or 1)}}]}
+
+    translator = PDFTranslator(api_type='deepseek', api_key='x')
+    translator.TEXT_CHUNK_TOKENS = 200
+    translator._post_chat_completion = post
+    translator.translate_pdf_to_text(str(tmp_path / 'in.pdf'), str(tmp_path / 'out.txt'), 'en', 'zh', concurrency=2,
+                                     resume=resume)
+    return requested
+
+
+def test_resume_retranslates_only_failed_chunks(tmp_path):
+    make_text_pdf(tmp_path / 'in.pdf')
+    first = run_text_translation(tmp_path, False, failing=('Page 4 of',))
+    assert any('Page 4 of' in content for content in first)
+    # 失败的块保留原文，断点日志留给续传
+    assert 'Page 4 of' in (tmp_path / 'out.txt').read_text(encoding='utf-8')
+    assert list(tmp_path.glob('journal_*.jsonl'))
+
+    resumed = run_text_translation(tmp_path, True)
+    assert resumed
+    assert all('Page 4 of' in content for content in resumed)
+    output = (tmp_path / 'out.txt').read_text(encoding='utf-8')
+    assert 'Page' not in output
+    assert not list(tmp_path.glob('journal_*.jsonl'))
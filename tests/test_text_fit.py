@@ -0,0 +1,79 @@
+import fitz
+import pytest
+
+from text_fit import FIT_SIZE_PRECISION, TextFitter
+
+TEXTS = [
+    'The quick brown fox jumps over the lazy dog.',
+    'Supercalifragilisticexpialidocious-and-an-unbreakable-identifier-name',
+    'Line one\nLine two\n\nLine four after a blank line',
+    '这是一段较长的中文译文，用来检查逐字符折行时的行数计算是否与实际排版一致。',
+    '混合 mixed 文本 with English words 和中文标点，以及 tabs\tinside。',
+    '  leading and trailing spaces  ',
+]
+RECTS = [fitz.Rect(0, 0, 120, 40), fitz.Rect(0, 0, 300, 90), fitz.Rect(0, 0, 60, 200)]
+SIZES = [6, 9.5, 12, 18]
+
+
+@pytest.fixture
+def cjk_font(tmp_path):
+    path = tmp_path / 'cjk.ttf'
+    path.write_bytes(fitz.Font('cjk').buffer)
+    return str(path)
+
+
+def inserted(fontname, fontfile, text, fontsize, rect, lineheight=None):
+    """用 insert_textbox 实际排一次，返回是否放得下。"""
+    doc = fitz.open()
+    try:
+        page = doc.new_page()
+        rc = page.insert_textbox(rect, text, fontname=fontname, fontfile=fontfile, fontsize=fontsize, lineheight=lineheight)
+        return rc >= 0
+    finally:
+        doc.close()
+
+
+@pytest.mark.parametrize('fontname', ['helv', 'china-s', 'cjk'])
+def test_prediction_matches_insert_textbox(fontname, cjk_font):
+    fontfile = cjk_font if fontname == 'cjk' else None
+    fitter = TextFitter({'cjk': cjk_font})
+    metrics = fitter.metrics(fontname)
+    for text in TEXTS:
+        paragraphs = metrics.prepare(text)
+        for rect in RECTS:
+            for fontsize in SIZES:
+                for lineheight in (None, 1.4):
+                    expected = inserted(fontname, fontfile, text, fontsize, rect, lineheight)
+                    assert metrics.fits(paragraphs, fontsize, rect, lineheight) == expected, (text, rect, fontsize, lineheight)
+
+
+def test_fit_finds_largest_size_within_precision(cjk_font):
+    fitter = TextFitter({'cjk': cjk_font})
+    text = TEXTS[3]
+    rect = fitz.Rect(0, 0, 200, 60)
+    fontsize, fitted_rect = fitter.fit('cjk', text, [rect], 24, 4)
+    assert 4 < fontsize < 24
+    assert fitted_rect == rect
+    assert inserted('cjk', cjk_font, text, fontsize, rect)
+    assert not inserted('cjk', cjk_font, text, fontsize + FIT_SIZE_PRECISION, rect)
+
+
+def test_fit_prefers_earlier_rect_at_largest_size():
+    fitter = TextFitter()
+    narrow, wide = fitz.Rect(0, 0, 80, 30), fitz.Rect(0, 0, 400, 30)
+    # 最大字号下窄矩形放不下，宽矩形放得下，直接取最大字号
+    assert fitter.fit('helv', TEXTS[0], [narrow, wide], 12, 6) == (12, wide)
+    # 两个都放得下时按顺序取第一个
+    assert fitter.fit('helv', 'short', [narrow, wide], 12, 6) == (12, narrow)
+
+
+def test_fit_returns_none_when_nothing_fits():
+    fitter = TextFitter()
+    tiny = fitz.Rect(0, 0, 20, 5)
+    assert fitter.fit('helv', TEXTS[0], [tiny], 12, 8) is None
+    assert fitter.fit('helv', TEXTS[0], [tiny], 12) is None
+    assert fitter.fit('helv', '', [tiny], 12, 8) is None
+    assert fitter.fit('helv', TEXTS[0], [], 12, 8) is None
+    # 未知字体、缺失的字体文件都不可用
+    assert fitter.fit('no-such-font', TEXTS[0], RECTS, 12, 8) is None
+    assert TextFitter({'cjk': '/missing/font.ttf'}).metrics('cjk') is None
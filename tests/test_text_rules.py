@@ -0,0 +1,40 @@
+import text_rules
+
+# 覆盖各条清洗规则的触发关键字，以及一个关键字都没有、整组跳过的文本
+CORPUS = text_rules._benchmark_blocks() + [
+    '',
+    '纯中文段落，没有任何需要清洗的内容。',
+    'Visit W W W . example . org for details',
+    '（译文：以下内容保持原格式）\n正文第一段。',
+    '译文：\n智能体完成了任务。\n\n第二段正文。',
+    '硬性要求：所有术语保持英文。\n\n正文保留。',
+    '说明：\n- 保留了品牌名\n- 数字未改动\n正文。',
+    '注释：\n1. 第一条\n2. 第二条\n正文。',
+    '正文（注：这是译者补充的说明）继续。',
+    '正文 (注：补充) 继续。',
+    '????????\n正文',
+    '1. 保留原文中的术语\n2. 处理被动语态\n正文内容。',
+    'This line mentions 翻译 and has plenty of ASCII letters in it.',
+    '版本 4 . 2 . 1 发布于 2 0 2 4 年',
+    'API ( 应用程序接口 ) 调用',
+    '是否 A?B 测试\x00有效�',
+    '正文\n\n\n\n\n结尾',
+    '（保留原排版）正文',
+]
+
+
+def test_precompiled_rules_match_legacy_implementation():
+    for text in CORPUS:
+        assert text_rules._normalize_translated_text(text) == text_rules._legacy_normalize_translated_text(text), text
+        assert text_rules.normalize_translated_text(text) == text_rules._legacy_normalize_translated_text(text), text
+        assert text_rules.contains_meta_translation_note(text) == text_rules._legacy_contains_meta_translation_note(text), text
+        for line in text.splitlines():
+            assert text_rules.is_meta_translation_line(line) == text_rules._legacy_is_meta_translation_line(line), line
+
+
+def test_benchmark_reports_before_and_after():
+    results = text_rules.benchmark(repeat=3)
+    assert set(results) == {
+        'normalize (legacy)', 'normalize', 'normalize (memo hit)', 'meta_note (legacy)', 'meta_note',
+    }
+    assert all(cost > 0 for cost in results.values())
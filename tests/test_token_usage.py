@@ -0,0 +1,82 @@
+import pytest
+
+import token_usage
+from token_usage import TokenCalibrator, TokenUsage, parse_usage
+from translator import PDFTranslator
+
+
+@pytest.mark.parametrize('usage, expected', [
+    ({'prompt_tokens': 120, 'completion_tokens': 40}, (120, 40, 0)),
+    # OpenAI / OpenRouter
+    ({'prompt_tokens': 120, 'completion_tokens': 40, 'prompt_tokens_details': {'cached_tokens': 64}}, (120, 40, 64)),
+    ({'prompt_tokens': 120, 'completion_tokens': 40, 'prompt_tokens_details': None}, (120, 40, 0)),
+    # DeepSeek
+    ({'prompt_tokens': 120, 'completion_tokens': 40, 'prompt_cache_hit_tokens': 96, 'prompt_cache_miss_tokens': 24},
+     (120, 40, 96)),
+    ({'prompt_tokens': 0, 'completion_tokens': 0}, (0, 0, 0)),
+    # 缺字段或类型不对时不当作实测值
+    ({'prompt_tokens': 120}, None),
+    ({'completion_tokens': 40}, None),
+    ({'prompt_tokens': '120', 'completion_tokens': 40}, None),
+    ({'prompt_tokens': 120.0, 'completion_tokens': 40}, None),
+    ({}, None),
+    (None, None),
+    ('120/40', None),
+])
+def test_parse_usage(usage, expected):
+    assert parse_usage(usage) == expected
+
+
+def test_token_usage_accumulates_per_phase():
+    usage = TokenUsage()
+    usage.record('translate', 100, 50, cached_tokens=20)
+    usage.record('translate', 10, 5)
+    usage.record('polish', 30, 30, measured=False)
+
+    assert (usage.input_tokens, usage.output_tokens, usage.cached_tokens) == (140, 85, 20)
+    assert (usage.requests, usage.measured_requests) == (3, 2)
+    snapshot = usage.snapshot()
+    assert snapshot['translate'] == {
+        'requests': 2, 'measured_requests': 2, 'input_tokens': 110, 'output_tokens': 55, 'cached_tokens': 20,
+    }
+    # 快照是副本，不随后续记账变化
+    usage.record('polish', 1, 1)
+    assert snapshot['polish']['requests'] == 1
+
+
+def test_calibrator_learns_clamped_ratio_and_persists(tmp_path):
+    path = str(tmp_path / 'calibration.json')
+    calibrator = TokenCalibrator(path)
+    calibrator.observe('deepseek', 'prompt', 'cjk', token_usage.CALIBRATION_MIN_TOKENS // 2, 500)
+    # 样本不足时保持启发式估算
+    assert calibrator.ratio('deepseek', 'prompt', 'cjk') == 1.0
+    calibrator.observe('deepseek', 'prompt', 'cjk', token_usage.CALIBRATION_MIN_TOKENS, 1000)
+    assert calibrator.ratio('deepseek', 'prompt', 'cjk') == pytest.approx(1500 / (token_usage.CALIBRATION_MIN_TOKENS * 1.5))  # 实际 / 估算的累计比值
+
+    calibrator.observe('deepseek', 'completion', 'other', token_usage.CALIBRATION_MIN_TOKENS, 100 * token_usage.CALIBRATION_MIN_TOKENS)
+    assert calibrator.ratio('deepseek', 'completion', 'other') == token_usage.CALIBRATION_RATIO_RANGE[1]
+    calibrator.save()
+
+    reloaded = TokenCalibrator(path)
+    assert reloaded.ratios() == calibrator.ratios()
+    assert set(reloaded.ratios()) == {'deepseek/prompt/cjk', 'deepseek/completion/other'}
+
+
+def test_chat_usage_is_recorded_from_response_or_estimated(tmp_path):
+    translator = PDFTranslator(api_type='deepseek', api_key='x')
+    translator._calibrator = TokenCalibrator(str(tmp_path / 'calibration.json'))
+    messages = [{'role': 'user', 'content': 'Translate this sentence into Chinese please.'}]
+
+    translator._record_chat_usage('deepseek', 'translate', messages, '请翻译这句话。', {
+        'prompt_tokens': 30, 'completion_tokens': 8, 'prompt_cache_hit_tokens': 16,
+    })
+    translator._record_chat_usage('deepseek', 'polish', messages, '请翻译这句话。', {'total_tokens': 38})
+
+    snapshot = translator.usage.snapshot()
+    assert snapshot['translate'] == {
+        'requests': 1, 'measured_requests': 1, 'input_tokens': 30, 'output_tokens': 8, 'cached_tokens': 16,
+    }
+    # usage 不完整的响应按估算记账，不计入实测请求
+    assert snapshot['polish']['measured_requests'] == 0
+    assert snapshot['polish']['input_tokens'] == token_usage.raw_token_estimate(messages[0]['content'])[0]
+    assert snapshot['polish']['output_tokens'] == len('请翻译这句话。')
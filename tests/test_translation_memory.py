@@ -0,0 +1,70 @@
+from translation_memory import TranslationCache, TranslationMemory
+from translator import FallbackText, PDFTranslator
+
+
+def make_cache(memory=None):
+    translator = PDFTranslator(api_type='deepseek', api_key='x')
+    memory = memory or TranslationMemory(':memory:')
+    return TranslationCache(memory, ('deepseek',), is_fallback=translator._is_untranslated_fallback), memory
+
+
+def test_identity_translation_is_cached():
+    cache, _ = make_cache()
+    # 数字表格、代码、本来就是目标语言的文本：译文与原文相同是正常结果
+    for text in ['2023 2024 2025\n1.5 2.0 3.5', 'def main():\n    return 0', '这一页本来就是中文。']:
+        cache[(text, 'en', 'zh')] = text
+        assert cache.get((text, 'en', 'zh')) == text
+
+
+def test_provider_fallback_is_not_cached():
+    cache, memory = make_cache()
+    source = 'Hello world, this is a test sentence.'
+    cache[(source, 'en', 'zh')] = FallbackText(source)
+    cache[('Another block', 'en', 'zh')] = '   '
+    assert cache.get((source, 'en', 'zh')) is None
+    assert len(memory) == 0
+
+
+def test_text_mode_accepts_identity_translation(tmp_path):
+    import fitz
+
+    input_path = tmp_path / 'numbers.pdf'
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), '2023 2024 2025 1.5 2.0 3.5')
+    doc.save(str(input_path))
+    doc.close()
+
+    translator = PDFTranslator(api_type='deepseek', api_key='x')
+    translator._translate_text = lambda text, *args, **kwargs: text
+    output_path = tmp_path / 'out.txt'
+    translator.translate_pdf_to_text(str(input_path), str(output_path), 'en', 'zh', concurrency=1)
+    assert '2023 2024 2025' in output_path.read_text(encoding='utf-8')
+    # 没有失败的块，断点日志随任务完成删除
+    assert not list(tmp_path.glob('journal_*.jsonl'))
+
+
+def test_hits_do_not_write_until_flush():
+    memory = TranslationMemory(':memory:')
+    key = memory.build_key('hello', ('en', 'zh'))
+    memory.put(key, '你好')
+    written_at = memory._conn.execute('SELECT last_used FROM tm').fetchone()[0]
+    changes = memory._conn.total_changes
+    for _ in range(10):
+        assert memory.get(key) == '你好'
+    assert memory._conn.total_changes == changes
+    memory.flush()
+    assert memory._conn.total_changes == changes + 1
+    assert memory._conn.execute('SELECT last_used FROM tm').fetchone()[0] >= written_at
+
+
+def test_hits_are_flushed_in_batches():
+    memory = TranslationMemory(':memory:')
+    keys = [memory.build_key(f'text {i}', ('en', 'zh')) for i in range(memory.TOUCH_FLUSH_ENTRIES)]
+    for key in keys:
+        memory.put(key, 'x')
+    changes = memory._conn.total_changes
+    for key in keys:
+        memory.get(key)
+    # 攒满一批时一次 executemany 写回
+    assert memory._conn.total_changes == changes + len(keys)
+    assert memory._touched == {}
@@ -0,0 +1,101 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from upload_store import DOCUMENT_NAME, META_NAME, UploadStore
+
+PDF_BYTES = b'%PDF-1.4\n% test document\n'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'uploads'))
+
+
+def test_put_stores_each_content_once(store):
+    first = store.put(io.BytesIO(PDF_BYTES), 'a.pdf')
+    second = store.put(io.BytesIO(PDF_BYTES), 'renamed.pdf')
+
+    assert first == second == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert sorted(os.listdir(store.root)) == [first]
+    assert sorted(os.listdir(os.path.join(store.root, first))) == [DOCUMENT_NAME, META_NAME]
+    with open(store.path(first), 'rb') as f:
+        assert f.read() == PDF_BYTES
+    assert store.filename(first) == 'renamed.pdf'
+
+
+@pytest.mark.parametrize('doc_id', [
+    None,
+    '',
+    '../uploads',
+    '..',
+    'A' * 64,
+    'a' * 63,
+    'a' * 65,
+    'a' * 64 + '/../..',
+    '/' + 'a' * 63,
+])
+def test_invalid_ids_never_touch_the_filesystem(store, tmp_path, doc_id):
+    store.put(io.BytesIO(PDF_BYTES), 'a.pdf')
+    before = sorted(os.listdir(tmp_path))
+
+    assert store.path(doc_id) is None
+    assert store.filename(doc_id) is None
+    assert store.load_json(doc_id, META_NAME) is None
+    store.save_json(doc_id, 'analysis.json', {'pages': 1})
+    assert not store.copy_to(doc_id, str(tmp_path / 'copy.pdf'))
+    assert sorted(os.listdir(tmp_path)) == before
+
+
+def test_unknown_valid_id_is_not_found(store, tmp_path):
+    doc_id = hashlib.sha256(b'never uploaded').hexdigest()
+    assert store.path(doc_id) is None
+    assert not store.copy_to(doc_id, str(tmp_path / 'copy.pdf'))
+    # 合法但不存在的 id 也不会凭空建目录
+    store.save_json(doc_id, 'analysis.json', {'pages': 1})
+    assert not os.path.exists(os.path.join(store.root, doc_id))
+
+
+def test_copy_to_task_dir(store, tmp_path):
+    doc_id = store.put(io.BytesIO(PDF_BYTES), 'a.pdf')
+    dest = tmp_path / 'task' / 'input.pdf'
+    dest.parent.mkdir()
+    assert store.copy_to(doc_id, str(dest))
+    assert dest.read_bytes() == PDF_BYTES
+
+
+def test_prune_removes_expired_documents_and_stale_temp_files(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'), ttl=60)
+    old_id = store.put(io.BytesIO(PDF_BYTES), 'old.pdf')
+    fresh_id = store.put(io.BytesIO(PDF_BYTES + b'fresh'), 'fresh.pdf')
+    stale_tmp = os.path.join(store.root, 'upload_abandoned.tmp')
+    with open(stale_tmp, 'wb') as f:
+        f.write(b'partial')
+    unrelated = os.path.join(store.root, 'keep-me')
+    os.makedirs(unrelated)
+    long_ago = time.time() - 3600
+    for path in [os.path.join(store.root, old_id), stale_tmp, unrelated]:
+        os.utime(path, (long_ago, long_ago))
+
+    store.prune()
+
+    assert store.path(old_id) is None
+    assert store.path(fresh_id) is not None
+    assert not os.path.exists(stale_tmp)
+    # 不像文档 id 的目录不归上传区管理，不删
+    assert os.path.exists(unrelated)
+
+
+def test_reference_refreshes_expiry(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'), ttl=60)
+    doc_id = store.put(io.BytesIO(PDF_BYTES), 'a.pdf')
+    doc_dir = os.path.join(store.root, doc_id)
+    long_ago = time.time() - 3600
+    os.utime(doc_dir, (long_ago, long_ago))
+
+    assert store.path(doc_id) is not None
+    store.prune()
+    assert store.path(doc_id) is not None
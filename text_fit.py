@@ -0,0 +1,194 @@
+import os
+
+import fitz
+
+from font_manager import get_font_library
+
+# insert_textbox 对这些内置 CJK 字体按每个字符 1em 计宽
+CJK_BUILTIN_FONTS = ('china-s', 'china-t', 'china-ss', 'china-ts', 'japan', 'japan-s', 'korea', 'korea-s')
+# 与 insert_textbox 判断溢出时使用的容差一致
+FIT_EPSILON = 1e-5
+# 二分查找字号时的精度（pt）
+FIT_SIZE_PRECISION = 0.1
+
+
+class FontMetrics:
+    """insert_textbox 排版所需的字体度量：字宽、升部/降部，以及是否为单字节简单字体。"""
+
+    def __init__(self, font, simple=False, uniform=False):
+        self.font = font
+        self.simple = simple
+        self.uniform = uniform
+        self.ascender = font.ascender
+        self.descender = font.descender
+        # 外部字体文件：insert_textbox 把缺字按 0 宽计算，text_length 却会取回退字体的宽度，只能逐字查表
+        self._char_widths = None if (simple or uniform) else {}
+        self.space_width = 1.0 if uniform else self.unit_length(' ')
+
+    def unit_length(self, text):
+        """字号为 1 时的文本宽度；宽度与字号成正比，换字号只需相乘。"""
+        if self.uniform:
+            return float(len(text))
+        if self._char_widths is None:
+            return self.font.text_length(text, fontsize=1)
+        total = 0.0
+        for char in text:
+            width = self._char_widths.get(char)
+            if width is None:
+                code = ord(char)
+                width = self.font.glyph_advance(code) if self.font.has_glyph(code) else 0.0
+                self._char_widths[char] = width
+            total += width
+        return total
+
+    def lineheight_factor(self, lineheight=None):
+        if lineheight:
+            return lineheight
+        if self.ascender - self.descender <= 1:
+            return 1.2
+        return self.ascender - self.descender
+
+    def prepare(self, text):
+        """按 insert_textbox 的规则把文本拆成段落和单词，并量好每个单词的宽度。"""
+        if self.simple:
+            text = ''.join(c if ord(c) < 256 else '?' for c in text)
+        paragraphs = []
+        for line in text.splitlines():
+            paragraphs.append([
+                (word, self.unit_length(word), bool(word.strip()))
+                for word in line.expandtabs(1).split(' ')
+            ])
+        return paragraphs
+
+    def count_lines(self, paragraphs, fontsize, maxwidth):
+        """按 insert_textbox 的贪心换行算出实际输出的行数（长单词逐字符折行）。"""
+        blen = self.space_width * fontsize
+        newlines = 0
+        ends_with_newline = False
+        last = len(paragraphs) - 1
+
+        for i, words in enumerate(paragraphs):
+            has_buffer = False
+            has_content = False
+            rest = maxwidth
+            for word, unit_width, word_has_content in words:
+                width = unit_width * fontsize
+                if rest >= width:
+                    has_buffer = True
+                    has_content = has_content or word_has_content
+                    rest -= width + blen
+                    continue
+
+                if has_buffer:
+                    newlines += 1
+                    ends_with_newline = True
+                has_buffer = False
+                has_content = False
+                rest = maxwidth
+
+                if width <= maxwidth:
+                    has_buffer = True
+                    has_content = word_has_content
+                    rest = maxwidth - width - blen
+                    continue
+
+                # 长单词：逐字符折行
+                buffer_width = 0.0
+                for char in word:
+                    char_width = self.unit_length(char) * fontsize
+                    if buffer_width <= maxwidth - char_width:
+                        buffer_width += char_width
+                    else:
+                        newlines += 1
+                        ends_with_newline = True
+                        buffer_width = char_width
+                has_buffer = True
+                has_content = True
+                rest = maxwidth - buffer_width - blen
+
+            if has_buffer and has_content:
+                ends_with_newline = False
+            if i < last:
+                newlines += 1
+                ends_with_newline = True
+
+        if ends_with_newline:
+            newlines -= 1
+        return newlines + 1
+
+    def fits(self, paragraphs, fontsize, rect, lineheight=None):
+        line_count = self.count_lines(paragraphs, fontsize, rect.width)
+        text_height = fontsize * self.lineheight_factor(lineheight) * line_count - self.descender * fontsize
+        return text_height - rect.height <= FIT_EPSILON
+
+
+class TextFitter:
+    """写回排版用的字号拟合器。
+
+    用字体自身的字形宽度自行换行，预判 insert_textbox 能否放下，
+    在给定区间内二分查找能放进候选矩形的最大字号，每个文本块只需真正调用一次 insert_textbox。
+    字体度量按名称缓存，整份文档复用；外部字体文件由进程级的字体库加载，各任务共享。
+    """
+
+    def __init__(self, font_files=None):
+        self.font_files = dict(font_files or {})
+        self._metrics = {}
+        self.attempts = 0
+
+    def metrics(self, fontname):
+        """返回字体度量；insert_textbox 不认识或加载失败的字体返回 None。"""
+        if fontname in self._metrics:
+            return self._metrics[fontname]
+        metrics = None
+        try:
+            if fontname in fitz.Base14_fontdict:
+                metrics = FontMetrics(fitz.Font(fontname), simple=True)
+            elif fontname in CJK_BUILTIN_FONTS:
+                metrics = FontMetrics(fitz.Font(fontname), uniform=True)
+            elif os.path.exists(self.font_files.get(fontname) or ''):
+                font = get_font_library().font(self.font_files[fontname])
+                metrics = FontMetrics(font) if font is not None else None
+        except Exception as e:
+            print(f'[WARN] 字体度量加载失败({fontname}): {e}')
+            metrics = None
+        self._metrics[fontname] = metrics
+        return metrics
+
+    def fit(self, fontname, text, rects, max_size, min_size=None, lineheight=None):
+        """在 [min_size, max_size] 内二分查找能放进 rects 中某个矩形的最大字号。
+
+        同一字号下按 rects 的顺序取第一个放得下的矩形。返回 (fontsize, rect)；
+        字体不可用或最小字号也放不下时返回 None。
+        """
+        metrics = self.metrics(fontname)
+        if metrics is None or not text or not rects:
+            return None
+        if min_size is None or min_size > max_size:
+            min_size = max_size
+        paragraphs = metrics.prepare(text)
+
+        def first_fitting_rect(fontsize):
+            for rect in rects:
+                self.attempts += 1
+                if metrics.fits(paragraphs, fontsize, rect, lineheight):
+                    return rect
+            return None
+
+        rect = first_fitting_rect(max_size)
+        if rect is not None:
+            return max_size, rect
+        if min_size >= max_size:
+            return None
+        best_rect = first_fitting_rect(min_size)
+        if best_rect is None:
+            return None
+
+        low, high = min_size, max_size
+        while high - low > FIT_SIZE_PRECISION:
+            middle = (low + high) / 2
+            rect = first_fitting_rect(middle)
+            if rect is not None:
+                low, best_rect = middle, rect
+            else:
+                high = middle
+        return low, best_rect
@@ -0,0 +1,415 @@
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+
+# 译文清洗和质量检查用到的正则在模块加载时编译一次。
+# 每条清洗规则附带触发关键字：规则的任何一次匹配都必然包含其中某个关键字，
+# 文本里一个关键字都没有时直接跳过该规则，结果与逐条执行完全一致。
+
+
+# 同一段译文会在 provider、_ensure_target_translation 和写回阶段被反复清洗和检查，
+# 结果按文本记忆，重复调用只付一次 CPU 开销
+MEMO_MAX_ENTRIES = 8192
+# 超长文本（整页文本等）很少重复，不进记忆表，避免占用过多内存
+MEMO_MAX_TEXT_LENGTH = 20000
+
+_MISSING = object()
+
+
+class BoundedMemo:
+    """线程安全的有界记忆表：按键的哈希查找，超过容量时淘汰最久未用的条目。"""
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            value = self._items.get(key, _MISSING)
+            if value is not _MISSING:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return value
+
+
+def memoized(memo, key, size, compute):
+    """size 超过 MEMO_MAX_TEXT_LENGTH 时直接计算，否则经 memo 记忆。"""
+    if size > MEMO_MAX_TEXT_LENGTH:
+        return compute()
+    return memo.get_or_compute(key, compute)
+
+
+def _literal_pattern(words, flags=0):
+    """把一组关键字合并成一个交替正则，一次扫描判断是否出现任意一个。"""
+    return re.compile('|'.join(re.escape(word) for word in sorted(set(words), key=len, reverse=True)), flags)
+
+
+class Rule:
+    """一条替换规则：triggers 为 None 时无条件执行。"""
+
+    __slots__ = ('pattern', 'repl', 'triggers', 'trigger')
+
+    def __init__(self, pattern, repl, triggers=None, flags=0):
+        self.pattern = re.compile(pattern, flags)
+        self.repl = repl
+        self.triggers = tuple(triggers) if triggers is not None else None
+        self.trigger = _literal_pattern(self.triggers) if triggers is not None else None
+
+    def apply(self, text):
+        if self.trigger is not None and self.trigger.search(text) is None:
+            return text
+        return self.pattern.sub(self.repl, text)
+
+
+_CAMEL_BOUNDARY = re.compile(r'(?<=[a-z])(?=[A-Z])')
+_LETTER_QUESTION_LETTER = re.compile(r'[A-Za-z]\?[A-Za-z]')
+
+
+def _collapse_spaced_letters(match):
+    fragment = match.group(0)
+    pieces = fragment.split()
+    if len(pieces) < 3 or any(not piece.isalpha() or len(piece) > 2 for piece in pieces):
+        return fragment
+    collapsed = ''.join(pieces)
+    collapsed = _CAMEL_BOUNDARY.sub(' ', collapsed)
+    return collapsed
+
+
+def _collapse_spaced_digits(match):
+    pieces = match.group(0).split()
+    return ''.join(pieces)
+
+
+# 修复 PDF 抽取造成的字母/数字/网址被空格打散
+SPACING_RULES = (
+    Rule(r'(?<!\S)(?:[A-Za-z]{1,2}\s+){2,}[A-Za-z]{1,2}(?!\S)', _collapse_spaced_letters),
+    Rule(r'(?<!\S)(?:\d\s+){1,}\d(?!\S)', _collapse_spaced_digits),
+    Rule(r'([A-Za-z0-9])\s+\.\s+(?=[A-Za-z0-9])', r'\1.', triggers=('.',)),
+    Rule(r'([:/._-])\s+(?=[A-Za-z0-9])', r'\1', triggers=(':', '/', '.', '_', '-')),
+    Rule(r'(?<=[A-Za-z0-9])\s+([:/._-])', r'\1', triggers=(':', '/', '.', '_', '-')),
+    Rule(r'\bW\s+W\s+W\b', 'WWW', triggers=('W', 'w'), flags=re.IGNORECASE),
+    Rule(r'(?i)w\s+w\s+w\s*\.\s*', 'www.', triggers=('W', 'w')),
+    Rule(r'\s+\)', ')', triggers=(')',)),
+    Rule(r'\(\s+', '(', triggers=('(',)),
+)
+
+# 去掉模型附带的翻译说明、注释和要求复述
+_REQUIREMENT_WORDS = ('翻译要求', '硬性要求', '处理原则', '输出要求')
+META_RULES = (
+    Rule(r'(?is)[（(](?:根据(?:提供的)?翻译要求|译文|翻译说明|硬性要求|处理原则|输出要求)[^）)]{0,500}[）)]', '',
+         triggers=('译文', '翻译') + _REQUIREMENT_WORDS),
+    Rule(r'(?is)(?:根据(?:提供的)?翻译要求|硬性要求|处理原则|输出要求)[：:].{0,600}(?=\n{2,}|$)', '',
+         triggers=_REQUIREMENT_WORDS),
+    Rule(r'(?is)^（?(?:译文|翻译|根据提供的翻译要求|硬性要求)[^。\n]{0,120}[：:][\s\S]*?(?=\n{2,}|$)', '\n',
+         triggers=('译文', '翻译', '硬性要求')),
+    Rule(r'(?im)^\s*（?(?:译文|翻译|根据提供的翻译要求|硬性要求|处理原则|输出要求)[^)：:\n]{0,80}[：:）)]?\s*.*$', '',
+         triggers=('译文', '翻译') + _REQUIREMENT_WORDS),
+    Rule(r'(?im)^\s*\d+\.\s*(?:所有|保持|禁止|仅返回|不得|不允许|确保|输出|保留|根据).*$', '',
+         triggers=('所有', '保持', '禁止', '仅返回', '不得', '不允许', '确保', '输出', '保留', '根据')),
+    Rule(r'(?im)^\s*[（(]?(?:注|说明|译者注|翻译注)[：:].*$', '', triggers=('注:', '注：', '说明:', '说明：')),
+    Rule(r'(?im)^\s*[（(]?翻译\s*$', '', triggers=('翻译',)),
+    Rule(r'(?im)^\s*根据提供的翻译要求.*$', '', triggers=('根据提供的翻译要求',)),
+    Rule(r'(?im)^\s*硬性要求.*$', '', triggers=('硬性要求',)),
+    Rule(r'\n?注释[:：]\n?(?:\d+\.\s*.*(?:\n|$)){1,6}', '\n', triggers=('注释',), flags=re.IGNORECASE),
+    Rule(r'\n?说明[:：]\n?(?:[-•\d].*(?:\n|$)){1,8}', '\n', triggers=('说明',), flags=re.IGNORECASE),
+    Rule(r'(?s)[（(]说明[:：].*$', '', triggers=('说明',)),
+    Rule(r'(?s)说明[:：].*$', '', triggers=('说明',)),
+    Rule(r'[\(（]保留原排版.*?[\)）]', '', triggers=('保留原排版',)),
+    Rule(r'(?im)^.*(?:根据翻译要求|根据提供的翻译要求|硬性要求|处理原则|输出要求|已处理商标符号|已完整转化|未保留任何英文|未添加任何解释|解释性内容).*$', '',
+         triggers=_REQUIREMENT_WORDS + ('已处理商标符号', '已完整转化', '未保留任何英文', '未添加任何解释', '解释性内容')),
+    Rule(r'(?m)^(?:注[:：]|输出[:：]?|翻译[:：]?|完全符合要求.*|严格遵循要求.*|章节编号.*|括号使用.*|空行结构.*)$', '',
+         triggers=('注:', '注：', '输出', '翻译', '完全符合要求', '严格遵循要求', '章节编号', '括号使用', '空行结构')),
+    Rule(r'(?m)^\d+\.\s*(?:严格遵循要求.*|确保未出现.*|数字.*|空行结构.*|完全符合.*)$', '',
+         triggers=('严格遵循要求', '确保未出现', '数字', '空行结构', '完全符合')),
+    Rule(r'（注：.*?）', '', triggers=('（注：',), flags=re.DOTALL),
+    Rule(r'\(注：.*?\)', '', triggers=('(注：',), flags=re.DOTALL),
+    Rule(r'(?im)^\s*[?？]{4,}.*$', '', triggers=('?', '？')),
+)
+
+# 所有说明清洗规则的关键字：一个都没有时整组跳过
+_META_RULES_TRIGGER = _literal_pattern(trigger for rule in META_RULES for trigger in rule.triggers)
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+# 整段译文里的说明性内容（质量检查用）
+META_NOTE_PATTERN = re.compile(
+    '|'.join(re.escape(word) for word in (
+        '严格遵循', '严格遵照', '根据翻译要求', '根据提供的翻译要求', '处理原则', '处理方式', '处理要点',
+        '已处理', '已完整转化', '已消除', '未保留', '未添加任何解释', '符合以下', '未添加额外说明',
+        '完全符合要求', '交办要求', '解释性说明', '全数转换为', '不保留任何英文', '章节编号采用',
+        '括号使用', '保留原排版', '英文句子彻底转化', '根据硬性要求',
+    )) + r'|注释[:：]|^\d+\.\s+',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# 单行的说明性内容（清洗逐行过滤用）
+META_LINE_PATTERN = re.compile(
+    r'根据(?:提供的)?翻译要求|' + '|'.join(re.escape(word) for word in (
+        '硬性要求', '处理原则', '输出要求', '严格实现', '完整转化', '完整翻译', '已处理', '未保留',
+        '未添加任何解释', '解释性内容', '符合中文语序', '品牌名', '译为', '保留原文', '删除原文所有英文',
+        '不允许保留英文句子',
+    )),
+    re.IGNORECASE
+)
+_NUMBERED_PREFIX = re.compile(r'^\d+\.\s*')
+_NUMBERED_META_WORDS = re.compile(
+    r'(翻译|英文|中文|术语|原文|品牌|句式|语序|标点|被动语态|缩进|格式层级|原句|译法|关键概念|保留引号|处理)', re.IGNORECASE
+)
+_TRANSLATION_WORDS = re.compile(r'(译|翻译|原文|术语)')
+ASCII_LETTER = re.compile(r'[A-Za-z]')
+CJK_CHAR = re.compile(r'[\u4e00-\u9fff]')
+# 逐行过滤前的整段预检：任何一条单行规则命中都必然包含其中某个关键字
+_META_LINE_TRIGGER = _literal_pattern(
+    ('翻译要求', '硬性要求', '处理原则', '输出要求', '严格实现', '完整转化', '完整翻译', '已处理', '未保留',
+     '未添加任何解释', '解释性内容', '符合中文语序', '品牌名', '译为', '保留原文', '删除原文所有英文',
+     '不允许保留英文句子', '译', '英文', '中文', '术语', '原文', '品牌', '句式', '语序', '标点', '被动语态',
+     '缩进', '格式层级', '原句', '关键概念', '保留引号', '处理')
+)
+
+LONG_ENGLISH_RUN = re.compile(r'(?:[A-Za-z][A-Za-z\'’\-]{1,}(?:[\s\-/&,;:().]+|$)){6,}')
+LIST_LINE = re.compile(r'^\s*(?:[•●◆◾▪◦■□▪\-*]|(?:\d+|[A-Za-z])[.)])\s+')
+NUMBERED_LINE = re.compile(r'^\d+[.)]\s+')
+
+
+def contains_meta_translation_note(text):
+    normalized = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    return META_NOTE_PATTERN.search(normalized) is not None
+
+
+def is_meta_translation_line(line):
+    normalized = " ".join(line.strip().split())
+    if not normalized:
+        return False
+
+    if META_LINE_PATTERN.search(normalized):
+        return True
+
+    if _NUMBERED_PREFIX.match(normalized) and _NUMBERED_META_WORDS.search(normalized):
+        return True
+
+    if _TRANSLATION_WORDS.search(normalized) and len(ASCII_LETTER.findall(normalized)) >= 12:
+        return True
+
+    return False
+
+
+NORMALIZE_MEMO = BoundedMemo()
+# PDFTranslator._should_retry_translation 的判定，按 (原文, 译文) 记忆
+RETRY_VERDICT_MEMO = BoundedMemo()
+
+
+def normalize_translated_text(text):
+    """清洗译文：修复被打散的字母/数字/网址，去掉模型附带的说明和注释。"""
+    if not text:
+        return text
+    return memoized(NORMALIZE_MEMO, text, len(text), lambda: _normalize_translated_text(text))
+
+
+def _normalize_translated_text(text):
+
+    text = text.replace('\x00', '')
+    if '?' in text and _LETTER_QUESTION_LETTER.search(text):
+        text = text.replace('?', '？')
+    text = text.replace('�', '')
+    text = text.replace('•  ', '• ')
+    for rule in SPACING_RULES:
+        text = rule.apply(text)
+    if _META_RULES_TRIGGER.search(text):
+        for rule in META_RULES:
+            text = rule.apply(text)
+
+    # 没有任何单行规则的关键字时不必逐行判断，但仍按原样统一换行、清空纯空白行
+    check_lines = _META_LINE_TRIGGER.search(text) is not None
+    cleaned_lines = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            cleaned_lines.append('')
+            continue
+        if check_lines and is_meta_translation_line(line):
+            continue
+        cleaned_lines.append(raw_line)
+    text = "\n".join(cleaned_lines)
+    text = _BLANK_LINES.sub('\n\n', text)
+    return text.strip()
+
+
+def _calculate_ratio(matches, length):
+    # 与 difflib 的比值公式保持一致，保证与 ratio() 比较时的浮点结果相同
+    return 2.0 * matches / length if length else 1.0
+
+
+class LazySimilarity:
+    """按需计算 SequenceMatcher(None, a, b) 的相似度，只回答“是否达到阈值”。
+
+    长度上界（real_quick_ratio）和字符多重集上界（quick_ratio）都不小于 ratio()，
+    上界已低于阈值时直接判否，只有上界够高时才做最坏平方级的 ratio()，
+    因此判定结果与直接比较 ratio() 完全一致。
+    """
+
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+        self._quick = None
+        self._ratio = None
+
+    def at_least(self, threshold):
+        if self._ratio is None:
+            if self.a == self.b:
+                return 1.0 >= threshold
+            length = len(self.a) + len(self.b)
+            if _calculate_ratio(min(len(self.a), len(self.b)), length) < threshold:
+                return False
+            if self._quick is None:
+                matches = sum((Counter(self.a) & Counter(self.b)).values())
+                self._quick = _calculate_ratio(matches, length)
+            if self._quick < threshold:
+                return False
+            self._ratio = SequenceMatcher(None, self.a, self.b).ratio()
+        return self._ratio >= threshold
+
+
+# ---- 改造前的实现：每次调用都按字符串模式逐条 re.search / re.sub，不做关键字预检和记忆。
+# 只用于 benchmark() 的前后对比和一致性测试，线上路径不调用。
+
+def _legacy_contains_meta_translation_note(text):
+    normalized = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    patterns = [
+        r'严格遵循', r'严格遵照', r'根据翻译要求', r'根据提供的翻译要求', r'处理原则', r'处理方式', r'处理要点',
+        r'已处理', r'已完整转化', r'已消除', r'未保留', r'未添加任何解释', r'符合以下', r'未添加额外说明',
+        r'完全符合要求', r'交办要求', r'解释性说明', r'全数转换为', r'不保留任何英文', r'章节编号采用',
+        r'括号使用', r'保留原排版', r'英文句子彻底转化', r'根据硬性要求', r'注释[:：]', r'(?m)^\d+\.\s+',
+    ]
+    return any(re.search(pattern, normalized, flags=re.IGNORECASE) for pattern in patterns)
+
+
+def _legacy_is_meta_translation_line(line):
+    normalized = " ".join(line.strip().split())
+    if not normalized:
+        return False
+    patterns = [
+        r'根据(?:提供的)?翻译要求', r'硬性要求', r'处理原则', r'输出要求', r'严格实现', r'完整转化', r'完整翻译',
+        r'已处理', r'未保留', r'未添加任何解释', r'解释性内容', r'符合中文语序', r'品牌名', r'译为', r'保留原文',
+        r'删除原文所有英文', r'不允许保留英文句子',
+    ]
+    if any(re.search(pattern, normalized, flags=re.IGNORECASE) for pattern in patterns):
+        return True
+    if re.match(r'^\d+\.\s*', normalized) and re.search(
+        r'(翻译|英文|中文|术语|原文|品牌|句式|语序|标点|被动语态|缩进|格式层级|原句|译法|关键概念|保留引号|处理)',
+        normalized, flags=re.IGNORECASE
+    ):
+        return True
+    if len(re.findall(r'[A-Za-z]', normalized)) >= 12 and re.search(r'(译|翻译|原文|术语)', normalized):
+        return True
+    return False
+
+
+def _legacy_normalize_translated_text(text):
+    if not text:
+        return text
+
+    text = text.replace('\x00', '')
+    text = text.replace('?', '？') if re.search(r'[A-Za-z]\?[A-Za-z]', text) else text
+    text = text.replace('�', '')
+    text = text.replace('•  ', '• ')
+    text = re.sub(r'(?<!\S)(?:[A-Za-z]{1,2}\s+){2,}[A-Za-z]{1,2}(?!\S)', _collapse_spaced_letters, text)
+    text = re.sub(r'(?<!\S)(?:\d\s+){1,}\d(?!\S)', _collapse_spaced_digits, text)
+    text = re.sub(r'([A-Za-z0-9])\s+\.\s+(?=[A-Za-z0-9])', r'\1.', text)
+    text = re.sub(r'([:/._-])\s+(?=[A-Za-z0-9])', r'\1', text)
+    text = re.sub(r'(?<=[A-Za-z0-9])\s+([:/._-])', r'\1', text)
+    text = re.sub(r'\bW\s+W\s+W\b', 'WWW', text, flags=re.IGNORECASE)
+    text = re.sub(r'(?i)w\s+w\s+w\s*\.\s*', 'www.', text)
+    text = re.sub(r'\s+\)', ')', text)
+    text = re.sub(r'\(\s+', '(', text)
+    text = re.sub(r'(?is)[（(](?:根据(?:提供的)?翻译要求|译文|翻译说明|硬性要求|处理原则|输出要求)[^）)]{0,500}[）)]', '', text)
+    text = re.sub(r'(?is)(?:根据(?:提供的)?翻译要求|硬性要求|处理原则|输出要求)[：:].{0,600}(?=\n{2,}|$)', '', text)
+    text = re.sub(r'(?is)^（?(?:译文|翻译|根据提供的翻译要求|硬性要求)[^。\n]{0,120}[：:][\s\S]*?(?=\n{2,}|$)', '\n', text)
+    text = re.sub(r'(?im)^\s*（?(?:译文|翻译|根据提供的翻译要求|硬性要求|处理原则|输出要求)[^)：:\n]{0,80}[：:）)]?\s*.*$', '', text)
+    text = re.sub(r'(?im)^\s*\d+\.\s*(?:所有|保持|禁止|仅返回|不得|不允许|确保|输出|保留|根据).*$','', text)
+    text = re.sub(r'(?im)^\s*[（(]?(?:注|说明|译者注|翻译注)[：:].*$', '', text)
+    text = re.sub(r'(?im)^\s*[（(]?翻译\s*$', '', text)
+    text = re.sub(r'(?im)^\s*根据提供的翻译要求.*$', '', text)
+    text = re.sub(r'(?im)^\s*硬性要求.*$', '', text)
+    text = re.sub(r'\n?注释[:：]\n?(?:\d+\.\s*.*(?:\n|$)){1,6}', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'\n?说明[:：]\n?(?:[-•\d].*(?:\n|$)){1,8}', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'(?s)[（(]说明[:：].*$', '', text)
+    text = re.sub(r'(?s)说明[:：].*$', '', text)
+    text = re.sub(r'[\(（]保留原排版.*?[\)）]', '', text)
+    text = re.sub(r'(?im)^.*(?:根据翻译要求|根据提供的翻译要求|硬性要求|处理原则|输出要求|已处理商标符号|已完整转化|未保留任何英文|未添加任何解释|解释性内容).*$','', text)
+    text = re.sub(r'(?m)^(?:注[:：]|输出[:：]?|翻译[:：]?|完全符合要求.*|严格遵循要求.*|章节编号.*|括号使用.*|空行结构.*)$', '', text)
+    text = re.sub(r'(?m)^\d+\.\s*(?:严格遵循要求.*|确保未出现.*|数字.*|空行结构.*|完全符合.*)$', '', text)
+    text = re.sub(r'（注：.*?）', '', text, flags=re.DOTALL)
+    text = re.sub(r'\(注：.*?\)', '', text, flags=re.DOTALL)
+    text = re.sub(r'(?im)^\s*[?？]{4,}.*$', '', text)
+    cleaned_lines = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            cleaned_lines.append('')
+            continue
+        if _legacy_is_meta_translation_line(line):
+            continue
+        cleaned_lines.append(raw_line)
+    text = "\n".join(cleaned_lines)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+def _benchmark_blocks():
+    return [
+        '人工智能代理正在改变软件开发的方式。',
+        '第 3 章  构建可靠的 A I 系统：从原型到生产',
+        '访问 w w w . example . com / docs 获取更多信息 ( 见附录 A ) 。',
+        '版本 1 2 3 已发布，支持 HTTP / 2 和 JSON - RPC 。',
+        '根据提供的翻译要求，以下是译文：\n\n智能体可以调用工具完成多步任务。',
+        '模型会在每一步检查中间结果。\n注：已保留原文中的品牌名。',
+        '1. 所有术语保持英文原文\n2. 输出仅包含译文\n\n检索增强生成（RAG）把外部知识引入上下文。',
+        'The agent calls tools and checks the results before moving on to the next step.',
+        '我们在表 2 中比较了三种方法的延迟和成本，结果表明批处理可以显著降低开销。' * 3,
+    ]
+
+
+def benchmark(repeat=2000):
+    """微基准：逐块清洗和说明检测的平均耗时（微秒/块），与改造前逐条 re.sub 的实现对比。
+
+    返回 {名称: 耗时}；'normalize' 为预编译规则未命中记忆时的耗时，'(legacy)' 为改造前的实现。
+    """
+    blocks = _benchmark_blocks()
+    results = {}
+    cases = (
+        ('normalize (legacy)', _legacy_normalize_translated_text),
+        ('normalize', _normalize_translated_text),
+        ('normalize (memo hit)', normalize_translated_text),
+        ('meta_note (legacy)', _legacy_contains_meta_translation_note),
+        ('meta_note', contains_meta_translation_note),
+    )
+    for name, func in cases:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for block in blocks:
+                func(block)
+        results[name] = (time.perf_counter() - start) / (repeat * len(blocks)) * 1e6
+    return results
+
+
+if __name__ == '__main__':
+    results = benchmark()
+    for name, cost in results.items():
+        print(f'{name}: {cost:.1f} µs/块')
+    for name in ('normalize', 'meta_note'):
+        print(f'{name} 加速: {results[name + " (legacy)"] / results[name]:.1f}x')
@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 校准数据默认落盘到项目 cache 目录，进程重启后继续使用已学到的系数
+DEFAULT_CALIBRATION_PATH = os.path.join(BASE_DIR, 'cache', 'token_calibration.json')
+# 每个校准键累计的估算 tokens 超过这个数时整体按比例缩小，近期观测的权重更高
+CALIBRATION_WINDOW = 200000
+# 至少积累这么多估算 tokens 后才启用校准系数，样本太少时保持启发式估算
+CALIBRATION_MIN_TOKENS = 2000
+# 校准系数的取值范围，防止个别异常响应把估算带偏
+CALIBRATION_RATIO_RANGE = (0.25, 4.0)
+# 每观测这么多次落盘一次
+CALIBRATION_SAVE_INTERVAL = 50
+
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+
+def raw_token_estimate(text):
+    """启发式估算：中文约1字符=1token，英文约4字符=1token。返回 (tokens, 文字类别 'cjk'|'other')。"""
+    if not text:
+        return 0, 'other'
+    total_chars = len(text)
+    if len(CJK_PATTERN.findall(text)) > total_chars * 0.3:
+        return total_chars, 'cjk'
+    return max(1, total_chars // 4), 'other'
+
+
+def parse_usage(usage):
+    """从 OpenAI 兼容响应的 usage 字段取 (输入, 输出, 命中缓存的输入) tokens；缺字段时返回 None。
+
+    命中缓存的 tokens：OpenAI/OpenRouter 在 prompt_tokens_details.cached_tokens，DeepSeek 在 prompt_cache_hit_tokens。
+    """
+    if not isinstance(usage, dict):
+        return None
+    prompt_tokens = usage.get('prompt_tokens')
+    completion_tokens = usage.get('completion_tokens')
+    if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+        return None
+    details = usage.get('prompt_tokens_details') or {}
+    cached_tokens = details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or 0
+    return prompt_tokens, completion_tokens, int(cached_tokens)
+
+
+class TokenUsage:
+    """一个任务的 token 账本，按阶段（translate/batch/retry/polish）累计。
+
+    每个请求记一次：measured 为服务端 usage 字段给出的实际值，
+    没有 usage 的请求（Google、不返回 usage 的接口）按校准后的估算记账。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+
+    def record(self, phase, input_tokens, output_tokens, cached_tokens=0, measured=True):
+        with self._lock:
+            entry = self.phases.setdefault(phase, {
+                'requests': 0,
+                'measured_requests': 0,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'cached_tokens': 0,
+            })
+            entry['requests'] += 1
+            entry['measured_requests'] += 1 if measured else 0
+            entry['input_tokens'] += input_tokens
+            entry['output_tokens'] += output_tokens
+            entry['cached_tokens'] += cached_tokens
+
+    def _total(self, field):
+        with self._lock:
+            return sum(entry[field] for entry in self.phases.values())
+
+    @property
+    def input_tokens(self):
+        return self._total('input_tokens')
+
+    @property
+    def output_tokens(self):
+        return self._total('output_tokens')
+
+    @property
+    def cached_tokens(self):
+        return self._total('cached_tokens')
+
+    @property
+    def requests(self):
+        return self._total('requests')
+
+    @property
+    def measured_requests(self):
+        return self._total('measured_requests')
+
+    def snapshot(self):
+        with self._lock:
+            return {phase: dict(entry) for phase, entry in self.phases.items()}
+
+
+class TokenCalibrator:
+    """按 (服务, 输入/输出, 文字类别) 学习 服务端实际 tokens / 启发式估算 tokens 的比值。
+
+    批次装箱、限流器的 tokens 额度和无 usage 请求的记账都乘以这个系数，
+    同一进程内所有任务共享（见 get_token_calibrator），定期落盘。
+    """
+
+    def __init__(self, path=DEFAULT_CALIBRATION_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # 'provider/kind/script' -> [实际 tokens, 估算 tokens]
+        self._samples = {}
+        self._unsaved = 0
+        self._load()
+
+    @staticmethod
+    def _key(provider, kind, script):
+        return f'{provider}/{kind}/{script}'
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, sample in (data or {}).items():
+            if isinstance(sample, list) and len(sample) == 2:
+                self._samples[key] = [float(sample[0]), float(sample[1])]
+
+    def observe(self, provider, kind, script, estimated, observed):
+        if estimated <= 0 or observed < 0:
+            return
+        with self._lock:
+            sample = self._samples.setdefault(self._key(provider, kind, script), [0.0, 0.0])
+            sample[0] += observed
+            sample[1] += estimated
+            if sample[1] > CALIBRATION_WINDOW:
+                scale = CALIBRATION_WINDOW / sample[1]
+                sample[0] *= scale
+                sample[1] *= scale
+            self._unsaved += 1
+            should_save = self._unsaved >= CALIBRATION_SAVE_INTERVAL
+        if should_save:
+            self.save()
+
+    def ratio(self, provider, kind, script):
+        sample = self._samples.get(self._key(provider, kind, script))
+        if not sample or sample[1] < CALIBRATION_MIN_TOKENS:
+            return 1.0
+        low, high = CALIBRATION_RATIO_RANGE
+        return min(high, max(low, sample[0] / sample[1]))
+
+    def ratios(self):
+        """已启用的校准系数，供日志展示。"""
+        with self._lock:
+            keys = list(self._samples)
+        ratios = {}
+        for key in keys:
+            provider, kind, script = key.split('/')
+            if self._samples[key][1] >= CALIBRATION_MIN_TOKENS:
+                ratios[key] = round(self.ratio(provider, kind, script), 3)
+        return ratios
+
+    def save(self):
+        with self._lock:
+            if not self._unsaved:
+                return
+            data = {key: [round(value, 1) for value in sample] for key, sample in self._samples.items()}
+            self._unsaved = 0
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f'[WARN] token 校准数据写入失败: {e}')
+
+
+_calibrator = None
+_calibrator_lock = threading.Lock()
+
+
+def get_token_calibrator():
+    """返回进程级共享的校准器（路径可用 PDFAPP_TOKEN_CALIBRATION_PATH 覆盖）。"""
+    global _calibrator
+    with _calibrator_lock:
+        if _calibrator is None:
+            _calibrator = TokenCalibrator(os.environ.get('PDFAPP_TOKEN_CALIBRATION_PATH') or DEFAULT_CALIBRATION_PATH)
+        return _calibrator
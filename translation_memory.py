@@ -0,0 +1,206 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 翻译记忆默认落盘到项目 cache 目录，进程重启后仍可复用
+DEFAULT_TM_PATH = os.path.join(BASE_DIR, 'cache', 'translation_memory.sqlite3')
+DEFAULT_TM_MAX_ENTRIES = 200000
+
+
+def normalize_source_text(text):
+    """规范化原文：去掉行尾空白、合并行内连续空白，保留换行结构。"""
+    if not text:
+        return ''
+    lines = [" ".join(line.split()) for line in str(text).strip().splitlines()]
+    return "\n".join(lines)
+
+
+class TranslationMemory:
+    """基于 SQLite 的持久化翻译记忆，按 last_used 做容量受限的 LRU 淘汰。
+
+    同一进程内所有任务共享一个实例（见 get_translation_memory），
+    多个进程可以同时打开同一个文件（WAL 模式）。
+    """
+
+    EVICT_CHECK_INTERVAL = 256
+    # 命中只在内存里记下使用时间，攒够这么多条、或距上次落盘超过这么多秒时随下一次读写批量更新 last_used
+    TOUCH_FLUSH_ENTRIES = 256
+    TOUCH_FLUSH_SECONDS = 30
+
+    def __init__(self, path=DEFAULT_TM_PATH, max_entries=DEFAULT_TM_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._writes_since_check = 0
+        # key -> 最近一次命中的时间，尚未写回 last_used
+        self._touched = {}
+        self._touched_flushed_at = time.time()
+        self._conn = self._connect(path)
+
+    def _connect(self, path):
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        except Exception as e:
+            # 只读文件系统等情况下退化为进程内存库，至少保证单进程内复用
+            print(f'[WARN] 翻译记忆无法写入 {path}，改用内存模式: {e}')
+            self.path = ':memory:'
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS tm ('
+            ' key TEXT PRIMARY KEY,'
+            ' translated TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS tm_last_used ON tm(last_used)')
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def build_key(text, scope):
+        """scope 为 (源语言, 目标语言, provider, model, mode, audience, style, 术语库哈希)。"""
+        raw = "\x1f".join([str(part) for part in scope] + [normalize_source_text(text)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                row = self._conn.execute('SELECT translated FROM tm WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                self._touched[key] = now
+                if (
+                    len(self._touched) >= self.TOUCH_FLUSH_ENTRIES
+                    or now - self._touched_flushed_at >= self.TOUCH_FLUSH_SECONDS
+                ):
+                    self._flush_touched_locked()
+                    self._conn.commit()
+                return row[0]
+            except sqlite3.Error as e:
+                print(f'[WARN] 翻译记忆读取失败: {e}')
+                return None
+
+    def put(self, key, translated):
+        if translated is None:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    'INSERT INTO tm (key, translated, created_at, last_used) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET translated = excluded.translated, last_used = excluded.last_used',
+                    (key, translated, now, now)
+                )
+                self._touched.pop(key, None)
+                self._writes_since_check += 1
+                if self._writes_since_check >= self.EVICT_CHECK_INTERVAL:
+                    self._writes_since_check = 0
+                    # 淘汰按 last_used 排序，先把攒下的命中时间写回
+                    self._flush_touched_locked()
+                    self._evict_locked()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f'[WARN] 翻译记忆写入失败: {e}')
+
+    def _flush_touched_locked(self):
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE tm SET last_used = ? WHERE key = ?',
+                [(used_at, key) for key, used_at in self._touched.items()]
+            )
+            self._touched = {}
+        self._touched_flushed_at = time.time()
+
+    def flush(self):
+        """把攒下的命中时间写回 last_used。"""
+        with self._lock:
+            try:
+                self._flush_touched_locked()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f'[WARN] 翻译记忆写入失败: {e}')
+
+    def _evict_locked(self):
+        count = self._conn.execute('SELECT COUNT(*) FROM tm').fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            'DELETE FROM tm WHERE key IN (SELECT key FROM tm ORDER BY last_used ASC LIMIT ?)',
+            (excess,)
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM tm').fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._touched = {}
+            self._conn.execute('DELETE FROM tm')
+            self._conn.commit()
+
+
+class TranslationCache:
+    """绑定到某个翻译器配置的缓存视图。
+
+    保持与旧版 dict 缓存相同的 (text, source_lang, target_lang) 元组键接口，
+    其余维度（provider/model/mode/audience/style/术语库）由 scope 补齐。
+    is_fallback(原文, 译文) 为真的结果（服务失败时回退的原文）不写入，已写入的也不当作命中。
+    """
+
+    def __init__(self, memory, scope, is_fallback=None):
+        self._memory = memory
+        self._scope = tuple(scope)
+        self._is_fallback = is_fallback or (lambda source, translated: False)
+
+    def _key(self, cache_key):
+        text, source_lang, target_lang = cache_key
+        return self._memory.build_key(text, (source_lang, target_lang) + self._scope)
+
+    def get(self, cache_key, default=None):
+        value = self._memory.get(self._key(cache_key))
+        if value is None or self._is_fallback(cache_key[0], value):
+            return default
+        return value
+
+    def __getitem__(self, cache_key):
+        value = self.get(cache_key)
+        if value is None:
+            raise KeyError(cache_key)
+        return value
+
+    def __setitem__(self, cache_key, translated):
+        if self._is_fallback(cache_key[0], translated):
+            return
+        self._memory.put(self._key(cache_key), translated)
+
+    def __contains__(self, cache_key):
+        return self.get(cache_key) is not None
+
+    def flush(self):
+        self._memory.flush()
+
+
+_memory_instance = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """返回进程级共享的翻译记忆实例（路径和容量可用环境变量覆盖）。"""
+    global _memory_instance
+    with _memory_lock:
+        if _memory_instance is None:
+            path = os.environ.get('PDFAPP_TM_PATH') or DEFAULT_TM_PATH
+            max_entries = int(os.environ.get('PDFAPP_TM_MAX_ENTRIES') or DEFAULT_TM_MAX_ENTRIES)
+            _memory_instance = TranslationMemory(path, max_entries)
+        return _memory_instance
@@ -1,4 +1,5 @@
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import TooManyRequests
 import fitz  # PyMuPDF
 import requests
 import io
@@ -7,7 +8,39 @@ import os
 import time
 import html
 import json
-from difflib import SequenceMatcher
+import hashlib
+import threading
+import concurrent.futures
+import multiprocessing
+import queue
+from contextlib import contextmanager
+
+from async_engine import get_async_engine
+from batching import BatchBudget, pack_blocks
+from doc_stats import (
+    SAMPLE_BATCH_PAGES, SAMPLE_MAX_PAGES, SAMPLE_MIN_PAGES, SAMPLE_TARGET_MARGIN,
+    TextStats, sample_order, total_margin,
+)
+from font_manager import DocumentFonts, get_font_library
+from page_templates import derive_template, fill_template, template_key
+from pdf_output import COMPRESSION_LABELS, ChunkedPdfWriter, normalize_compression
+from preview import PREVIEW_INTERVAL, preview_dir_for
+from job_journal import JobJournal, build_job_key, journal_path_for
+from rate_limiter import get_rate_limiter
+from spatial_index import RectGrid
+from text_fit import TextFitter
+from token_usage import TokenUsage, get_token_calibrator, parse_usage, raw_token_estimate
+import text_rules
+from translation_memory import TranslationCache, get_translation_memory, normalize_source_text
+
+
+class FallbackText(str):
+    """服务调用失败时回退的原文。
+
+    只有失败分支返回这个类型；与原文相同的正常译文（数字表格、代码、本来就是目标语言的文本）是普通 str，
+    照常写入翻译记忆和断点日志。
+    """
+
 
 class PDFTranslator:
     SYSTEM_FONT_CANDIDATES = [
@@ -27,6 +60,13 @@ class PDFTranslator:
         'ar': '阿拉伯语',
         'auto': '自动检测'
     }
+    # token 记账的阶段
+    USAGE_PHASE_LABELS = {
+        'translate': '逐块翻译',
+        'batch': '批量翻译',
+        'retry': '补翻',
+        'polish': '润色'
+    }
     MODE_LABELS = {
         'quick': '快速',
         'normal': '标准',
@@ -67,6 +107,54 @@ class PDFTranslator:
         'Boilerplate': '样板代码'
     }
 
+    # 各 LLM 服务单段翻译请求的 (system 提示, temperature, 超时秒数)
+    SINGLE_TRANSLATION_PROFILES = {
+        'deepseek': ('你是专业翻译助手。请保证准确、自然、术语一致，只输出译文本身。', 0.2, 60),
+        'zhipu': ('你是专业翻译助手。请保证准确、自然、术语一致，只输出译文本身。', 0.2, 60),
+        'openrouter': ('你是严格的翻译引擎，只输出译文本身。禁止添加解释、备注、示例、总结或引号。', 0, 60),
+        'kimi': ('你是专业翻译助手。请准确翻译文本，保持原文格式和语气，只输出译文本身。', 0.1, 120),
+        'gpt': ('你是专业翻译助手。请准确翻译文本，保持原文格式和语气，只输出译文本身。', 0.1, 120),
+    }
+    # deep-translator 使用的 Google 语言代码
+    GOOGLE_LANG_CODES = {
+        'zh': 'zh-CN',
+        'en': 'en',
+        'ja': 'ja',
+        'ko': 'ko',
+        'fr': 'fr',
+        'de': 'de',
+        'es': 'es',
+        'ru': 'ru',
+        'ar': 'ar'
+    }
+
+    # 遇到 429/503 时由限流器控制等待后重试的次数
+    RATE_LIMIT_RETRIES = 4
+    # 页数达到阈值才启用多进程提取，每个进程一次处理一个页段
+    PARALLEL_EXTRACTION_MIN_PAGES = 64
+    EXTRACTION_SHARD_PAGES = 16
+    # 翻译前干跑（plan_translation）最多提取这么多页，按页数比例外推全文
+    PLAN_SAMPLE_PAGES = 32
+    # 异步引擎下流水线允许更多在途翻译单元，让首轮请求尽早全部提交到事件循环
+    ASYNC_PIPELINE_PENDING_UNITS = 256
+    # 短文本块批量请求的容量。Google 按字符计（deep-translator 单次上限 5000 字符）；
+    # LLM 服务走 XML item 结构化批次，按预估 tokens 计，输入和输出分别限额，item_overhead 为每项的 XML 包装
+    CHAT_BATCH_BUDGET = {'measure': 'tokens', 'max_input': 600, 'max_output': 900, 'max_item': 55, 'item_overhead': 6}
+    BATCH_BUDGETS = {
+        'google': {'measure': 'chars', 'max_input': 4000, 'max_item': 499},
+        'deepseek': CHAT_BATCH_BUDGET,
+        'zhipu': CHAT_BATCH_BUDGET,
+        'openrouter': CHAT_BATCH_BUDGET,
+        'kimi': CHAT_BATCH_BUDGET,
+        'gpt': CHAT_BATCH_BUDGET,
+    }
+    # 文本模式每个翻译块的容量：Google 按字符计（单次请求上限），LLM 按预估输入 tokens 计
+    TEXT_CHUNK_BUDGETS = {'google': ('chars', 4000)}
+    TEXT_CHUNK_TOKENS = 2000
+    # 未装满的批次最多等后续几页的短块一起装箱，装填率达到阈值即派发，避免前面的页面迟迟不能写回
+    BATCH_WINDOW_PAGES = 3
+    BATCH_DISPATCH_FILL = 0.8
+
     # API价格（每1M tokens的价格，单位：美元）
     PRICING = {
         'google': {
@@ -75,6 +163,7 @@ class PDFTranslator:
         },
         'deepseek': {
             'input': 0.14,  # $0.14 per 1M tokens
+            'cached_input': 0.014,  # 命中上下文缓存的输入: $0.014 per 1M tokens
             'output': 0.28  # $0.28 per 1M tokens
         },
         'zhipu': {
@@ -105,23 +194,42 @@ class PDFTranslator:
         glossary_terms=None,
         translation_mode='normal',
         audience='general',
-        style='storytelling'
+        style='storytelling',
+        engine='thread',
+        render_mode='rebuild',
+        compression='small'
     ):
         self.api_type = api_type
         self.api_key = api_key
         self.progress_callback = progress_callback
         self.log_callback = log_callback
         self.cancel_callback = cancel_callback
-        self.input_tokens = 0
-        self.output_tokens = 0
+        # 按阶段记账的 token 用量：有 usage 字段的请求记服务端实际值，否则记校准后的估算
+        self.usage = TokenUsage()
+        self._calibrator = get_token_calibrator()
+        self._usage_state = threading.local()
+        self._first_request_logged = False
+        # 任务完成后的性能记录（规模、tokens、各阶段耗时），由 worker 写入 perf_history
+        self.perf_stats = None
         self.translator = None  # 初始化为None
-        self._translation_cache = {}  # 翻译缓存：(text, src, tgt) -> translated
         self._session = requests.Session()  # 复用 HTTP 连接，减少握手开销
         self.glossary_terms = self._normalize_glossary_terms(glossary_terms or [])
         self.translation_mode = self._normalize_translation_mode(translation_mode)
         self.audience = self._normalize_audience(audience)
         self.style = self._normalize_style(style)
         self._strategy_notice_emitted = False
+        # 服务调用引擎：thread=每个请求占一个线程；async=由共享事件循环预取首轮请求
+        self.engine = 'async' if engine == 'async' else 'thread'
+        self._prefetched_calls = {}
+        self._prefetch_lock = threading.Lock()
+        # 写回方式：rebuild=新建空白页再复制图片和色块；overlay=复制原页面，用涂抹注释去掉原文后叠加译文
+        self.render_mode = 'overlay' if render_mode == 'overlay' else 'rebuild'
+        # 输出 PDF 的压缩档位：small=体积优先，fast=保存速度优先
+        self.compression = normalize_compression(compression)
+        # 翻译缓存：(text, src, tgt) -> translated，落盘共享，跨任务和重启复用；失败回退的原文不写入
+        self._translation_cache = TranslationCache(
+            get_translation_memory(), self._translation_memory_scope(), is_fallback=self._is_untranslated_fallback
+        )
 
         # 只在需要时初始化translator
         if self.api_type == 'google':
@@ -132,6 +240,22 @@ class PDFTranslator:
         # deep-translator 不需要预先设置translator实例
         pass
 
+    def _translation_memory_scope(self):
+        """翻译记忆键中除原文和语言外的维度：同样的原文换了模型或风格不能复用。"""
+        try:
+            model = self._provider_config()['model']
+        except ValueError:
+            model = self.api_type
+        glossary_hash = hashlib.sha1("\n".join(self.glossary_terms).encode('utf-8')).hexdigest()[:16]
+        return (
+            self.api_type,
+            model,
+            self._effective_translation_mode(),
+            self.audience,
+            self.style,
+            glossary_hash,
+        )
+
     def _normalize_glossary_terms(self, terms):
         seen = set()
         normalized = []
@@ -251,7 +375,7 @@ class PDFTranslator:
             prompt_lines.append(glossary_instruction)
         return '\n'.join(prompt_lines)
 
-    def _extract_openrouter_batch_items(self, content, expected_count):
+    def _extract_batch_items(self, content, expected_count):
         """尽量从模型返回中提取 item，允许部分成功，缺项由调用方补翻。"""
         cleaned = (content or '').strip()
         if cleaned.startswith('```'):
@@ -321,24 +445,280 @@ class PDFTranslator:
             }
         raise ValueError(f'Unsupported provider for chat completion: {provider}')
 
-    def _chat_completion(self, messages, api_type=None, temperature=0.1, timeout=None):
-        config = self._provider_config(api_type)
-        data = {
+    def _chat_request_payload(self, config, messages, temperature):
+        return {
             'model': config['model'],
             'messages': messages,
             'temperature': temperature
         }
-        response = self._session.post(
-            config['url'],
-            headers=config['headers'],
-            json=data,
-            timeout=timeout or config['timeout']
-        )
-        result = response.json()
+
+    def _chat_request_key(self, api_type, messages, temperature):
+        raw = json.dumps([api_type or self.api_type, messages, temperature], ensure_ascii=False, sort_keys=True)
+        return ('chat', hashlib.sha1(raw.encode('utf-8')).hexdigest())
+
+    def _google_lang_codes(self, source_lang, target_lang):
+        """所有 Google 调用共用的 (源, 目标) 语言代码；源语言为 auto 时交给 Google 自动检测。"""
+        normalized_target = self.GOOGLE_LANG_CODES.get(target_lang, target_lang)
+        if source_lang == 'auto':
+            return 'auto', normalized_target
+        return self.GOOGLE_LANG_CODES.get(source_lang, source_lang), normalized_target
+
+    def _chat_completion(self, messages, api_type=None, temperature=0.1, timeout=None, phase=None):
+        config = self._provider_config(api_type)
+        result = self._take_prefetched(self._chat_request_key(api_type, messages, temperature))
+        if result is None:
+            result = self._post_chat_completion(config, messages, api_type, temperature, timeout)
         if 'choices' in result and result['choices']:
-            return result['choices'][0]['message']['content'].strip()
+            content = result['choices'][0]['message']['content'].strip()
+            self._record_chat_usage(api_type or self.api_type, phase, messages, content, result.get('usage'))
+            return content
         raise Exception(f"API Error: {result}")
 
+    @contextmanager
+    def _usage_phase(self, phase):
+        """把当前线程里发出的请求记到 phase 阶段（可嵌套）；未指定时记为 translate。"""
+        previous = getattr(self._usage_state, 'phase', None)
+        self._usage_state.phase = phase
+        try:
+            yield
+        finally:
+            self._usage_state.phase = previous
+
+    def _current_phase(self, phase=None):
+        return phase or getattr(self._usage_state, 'phase', None) or 'translate'
+
+    def _record_chat_usage(self, provider, phase, messages, content, usage):
+        """按服务端 usage 字段记账，并用它校准估算；没有 usage 时按校准后的估算记账。"""
+        phase = self._current_phase(phase)
+        prompt_estimate, prompt_script = self._raw_request_tokens(messages)
+        completion_estimate, completion_script = raw_token_estimate(content)
+        parsed = parse_usage(usage)
+        if parsed is None:
+            self.usage.record(
+                phase,
+                self._calibrated(prompt_estimate, provider, 'prompt', prompt_script),
+                self._calibrated(completion_estimate, provider, 'completion', completion_script),
+                measured=False
+            )
+            return
+        prompt_tokens, completion_tokens, cached_tokens = parsed
+        self.usage.record(phase, prompt_tokens, completion_tokens, cached_tokens)
+        self._calibrator.observe(provider, 'prompt', prompt_script, prompt_estimate, prompt_tokens)
+        self._calibrator.observe(provider, 'completion', completion_script, completion_estimate, completion_tokens)
+
+    def _raw_request_tokens(self, messages):
+        """请求各条消息的启发式估算之和；文字类别取最后一条（用户消息，即待译文本）的类别。"""
+        tokens, script = 0, 'other'
+        for message in messages:
+            message_tokens, script = raw_token_estimate(message.get('content', ''))
+            tokens += message_tokens
+        return tokens, script
+
+    def _calibrated(self, tokens, provider, kind, script):
+        if not tokens:
+            return tokens
+        return max(1, round(tokens * self._calibrator.ratio(provider, kind, script)))
+
+    def _calibrated_tokens(self, text, kind='prompt'):
+        """按当前服务已观测到的实际 tokens 校准后的估算，用于批次装箱和限流额度。"""
+        tokens, script = raw_token_estimate(text)
+        return self._calibrated(tokens, self.api_type, kind, script)
+
+    @property
+    def input_tokens(self):
+        return self.usage.input_tokens
+
+    @property
+    def output_tokens(self):
+        return self.usage.output_tokens
+
+    def _log_token_usage(self):
+        """任务结束时输出 token 用量和费用（按阶段拆分），并把本任务学到的校准数据落盘。"""
+        self._add_log(f'输入tokens: {self.input_tokens:,}', 'info')
+        self._add_log(f'输出tokens: {self.output_tokens:,}', 'info')
+        cached_tokens = self.usage.cached_tokens
+        if cached_tokens:
+            self._add_log(f'  其中命中缓存的输入tokens: {cached_tokens:,}', 'info')
+        requests_count = self.usage.requests
+        if requests_count:
+            self._add_log(
+                f'服务请求: {requests_count} 次，其中 {self.usage.measured_requests} 次按服务端返回的用量计，其余为估算',
+                'info'
+            )
+            for phase, entry in self.usage.snapshot().items():
+                self._add_log(
+                    f'  - {self.USAGE_PHASE_LABELS.get(phase, phase)}: {entry["requests"]} 次，'
+                    f'输入 {entry["input_tokens"]:,} / 输出 {entry["output_tokens"]:,} tokens',
+                    'info'
+                )
+        self._add_log(f'预估费用: ${self._calculate_cost():.4f} USD', 'info')
+        self._calibrator.save()
+
+    def _perf_record(self, kind, concurrency, **measurements):
+        """一次任务的性能记录：服务设置、规模（页/块/翻译单元/原文 tokens）、实际 tokens 和各阶段耗时（秒）。"""
+        record = {
+            'kind': kind,
+            'provider': self.api_type,
+            'engine': self.engine,
+            'render_mode': self.render_mode,
+            'translation_mode': self._effective_translation_mode(),
+            'concurrency': concurrency,
+            'requests': self.usage.requests,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+        }
+        for key, value in measurements.items():
+            record[key] = round(value, 2) if isinstance(value, float) else value
+        return record
+
+    def _log_first_request(self, text):
+        """只在第一次请求时显示详细 token 信息。"""
+        if self._first_request_logged:
+            return
+        self._first_request_logged = True
+        self._add_log(f'开始翻译，文本长度: {len(text)} 字符, 输入tokens: {self._calibrated_tokens(text)}', 'info')
+
+    def _post_chat_completion(self, config, messages, api_type, temperature, timeout):
+        data = self._chat_request_payload(config, messages, temperature)
+        # 所有任务共用同一服务 + Key 的限流器；预估 tokens 按输入的两倍（含输出）占用额度
+        limiter = get_rate_limiter(api_type or self.api_type, self.api_key)
+        estimated_tokens = self._estimate_request_tokens(messages, api_type)
+        for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+            with limiter.slot(estimated_tokens, cancel_check=self._check_cancelled):
+                response = self._session.post(
+                    config['url'],
+                    headers=config['headers'],
+                    json=data,
+                    timeout=timeout or config['timeout']
+                )
+            wait = limiter.observe(response.status_code, response.headers)
+            if response.status_code in (429, 503) and attempt < self.RATE_LIMIT_RETRIES:
+                print(f'[WARN] {api_type or self.api_type} 限流 (HTTP {response.status_code})，{wait:.1f}s 后重试')
+                continue
+            break
+        return response.json()
+
+    def _estimate_request_tokens(self, messages, api_type=None):
+        tokens, script = self._raw_request_tokens(messages)
+        return 2 * self._calibrated(tokens, api_type or self.api_type, 'prompt', script)
+
+    def _google_translate(self, text, source, target, phase=None):
+        """经过进程级限流器调用 Google Translate；429 时整体退避后重试。Google 不返回用量，按估算记账。"""
+        translated = self._post_google_translate(text, source, target)
+        self.usage.record(
+            self._current_phase(phase), raw_token_estimate(text)[0], raw_token_estimate(translated)[0], measured=False
+        )
+        return translated
+
+    def _post_google_translate(self, text, source, target):
+        limiter = get_rate_limiter('google')
+        for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+            with limiter.slot(cancel_check=self._check_cancelled):
+                try:
+                    return GoogleTranslator(source=source, target=target).translate(text)
+                except TooManyRequests:
+                    if attempt >= self.RATE_LIMIT_RETRIES:
+                        raise
+            wait = limiter.penalize()
+            print(f'[WARN] Google Translate 限流，{wait:.1f}s 后重试')
+
+    def _single_translation_request(self, provider, text, source_lang, target_lang):
+        system_prompt, temperature, timeout = self.SINGLE_TRANSLATION_PROFILES[provider]
+        messages = [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': self._build_translation_prompt(text, source_lang, target_lang)}
+        ]
+        return messages, temperature, timeout
+
+    def _first_pass_requests(self, text, source_lang, target_lang, strict=False):
+        """预测 _translate_text / _strict_translate_text 首次会发出的 chat 请求，供异步引擎预取。"""
+        if not text or not text.strip() or self._translate_special_text(text, target_lang) is not None:
+            return []
+        if strict and self.api_type == 'openrouter':
+            return [('chat', 'openrouter', self._force_chinese_messages(self._clean_text(text), target_lang), 0, 75)]
+        if self.api_type not in self.SINGLE_TRANSLATION_PROFILES:
+            return []
+        messages, temperature, timeout = self._single_translation_request(
+            self.api_type, self._clean_text(text), source_lang, target_lang
+        )
+        return [('chat', None, messages, temperature, timeout)]
+
+    def _plan_unit_requests(self, unit, source_lang, target_lang):
+        """与 translate_pdf 中 translate_unit 的分支保持一致，列出该单元首轮会发出的 chat 请求。"""
+        group_type, blocks = unit
+        pending_texts = []
+        for block_info in blocks:
+            text = self._clean_text(block_info['text'])
+            if self._translation_cache.get((text, source_lang, target_lang)) is None:
+                pending_texts.append((text, block_info))
+        if not pending_texts:
+            return []
+        if len(pending_texts) == 1 and pending_texts[0][1].get('font_info', {}).get('layout_hint', 'body') != 'body':
+            if self._is_url_only_text(pending_texts[0][0]):
+                return []
+            return self._first_pass_requests(pending_texts[0][0], source_lang, target_lang, strict=True)
+        if group_type == 'batch' and len(pending_texts) > 1:
+            messages, temperature, timeout = self._chat_batch_request(
+                [text for text, _ in pending_texts], source_lang, target_lang
+            )
+            return [('chat', None, messages, temperature, timeout)]
+        return self._first_pass_requests(pending_texts[0][0], source_lang, target_lang)
+
+    def _prefetch_requests(self, requests_to_send):
+        """把 chat 请求提交到异步引擎，返回本次新提交的请求键。
+
+        同步翻译流程随后在 _chat_completion 中按同一个键直接取结果；提交方在翻译单元结束后
+        用 _discard_prefetched(keys) 取消没被取走的请求。
+        """
+        engine = get_async_engine()
+        if engine is None:
+            return []
+        submitted = []
+        for _, api_type, messages, temperature, timeout in requests_to_send:
+            key = self._chat_request_key(api_type, messages, temperature)
+            config = self._provider_config(api_type)
+            with self._prefetch_lock:
+                if key in self._prefetched_calls:
+                    continue
+                self._prefetched_calls[key] = engine.submit(engine.post_chat_completion(
+                    get_rate_limiter(api_type or self.api_type, self.api_key),
+                    config['url'],
+                    config['headers'],
+                    self._chat_request_payload(config, messages, temperature),
+                    timeout or config['timeout'],
+                    estimated_tokens=self._estimate_request_tokens(messages, api_type),
+                    retries=self.RATE_LIMIT_RETRIES
+                ))
+            submitted.append(key)
+        return submitted
+
+    def _take_prefetched(self, key):
+        """取出预取结果；没有预取或预取失败时返回 None，由调用方改走同步请求。"""
+        with self._prefetch_lock:
+            future = self._prefetched_calls.pop(key, None)
+        if future is None:
+            return None
+        while True:
+            try:
+                return future.result(timeout=1)
+            except concurrent.futures.TimeoutError:
+                self._check_cancelled()
+            except Exception as e:
+                print(f'[WARN] 预取请求失败，改为同步重试: {str(e)[:120]}')
+                return None
+
+    def _discard_prefetched(self, keys=None):
+        """取消尚未被取走的预取请求；keys 为 None 时取消全部。返回取消的个数。"""
+        with self._prefetch_lock:
+            if keys is None:
+                pending = list(self._prefetched_calls.values())
+                self._prefetched_calls.clear()
+            else:
+                pending = [self._prefetched_calls.pop(key) for key in keys if key in self._prefetched_calls]
+        for future in pending:
+            future.cancel()
+        return len(pending)
+
     def _maybe_polish_translation(self, source_text, translated_text, source_lang, target_lang):
         if self._effective_translation_mode() != 'refined' or not self._supports_advanced_strategy():
             return translated_text
@@ -350,7 +730,8 @@ class PDFTranslator:
                     {'role': 'system', 'content': '你是资深翻译审校编辑。你会在忠实原文的前提下，把译稿润色成自然、准确、可发布的最终版本，只输出最终译文。'},
                     {'role': 'user', 'content': self._build_polish_prompt(source_text, translated_text, source_lang, target_lang)}
                 ],
-                temperature=0
+                temperature=0,
+                phase='polish'
             )
             polished = self._normalize_translated_text(polished)
             return polished or translated_text
@@ -375,43 +756,56 @@ class PDFTranslator:
         return True
 
     def _group_short_blocks(self, all_blocks, max_group_chars=800, short_threshold=150):
-        """将连续短文本块合并成批次，减少 API 调用次数。
+        """将短正文块装箱成批次，减少 API 调用次数（按字符计）。
         返回 list of ('single'|'batch', [block_info, ...])。"""
-        SEPARATOR = "\n---SPLIT---\n"
-        sep_len = len(SEPARATOR)
-        groups = []
-        current_group = []
-        current_len = 0
-
-        for block in all_blocks:
-            text_len = len(block['text'].strip())
-            layout_hint = block.get('font_info', {}).get('layout_hint', 'body')
-            if layout_hint != 'body':
-                if current_group:
-                    groups.append(('batch', current_group))
-                    current_group, current_len = [], 0
-                groups.append(('single', [block]))
-                continue
-            if text_len >= short_threshold:
-                # 长文本块：先把当前积累的短块入队，再单独处理
-                if current_group:
-                    groups.append(('batch', current_group))
-                    current_group, current_len = [], 0
-                groups.append(('single', [block]))
-            else:
-                # 短文本块：尝试合并到当前批次
-                added_len = text_len + (sep_len if current_group else 0)
-                if current_group and current_len + added_len > max_group_chars:
-                    groups.append(('batch', current_group))
-                    current_group, current_len = [], 0
-                    added_len = text_len
-                current_group.append(block)
-                current_len += added_len
-
-        if current_group:
-            groups.append(('batch', current_group))
+        groups = self._pack_blocks_by_chars(all_blocks, max_group_chars, short_threshold - 1)
+        return [(group_type, blocks) for group_type, blocks, _ in groups]
+
+    def _pack_blocks_by_chars(self, blocks, max_chars, max_item_chars):
+        # 批内各块以分隔符拼接，分隔符计入容量
+        separator_len = len("\n---SPLIT---\n")
+        budget = BatchBudget(
+            max_input=max_chars + separator_len,
+            max_item=max_item_chars,
+            item_overhead=separator_len
+        )
+        return pack_blocks(
+            blocks, budget,
+            measure=lambda block: len(block['text'].strip()),
+            is_batchable=self._is_batchable_block
+        )
 
-        return groups
+    def _is_batchable_block(self, block):
+        # 标题、页眉等非正文块走单独的严格翻译
+        return block.get('font_info', {}).get('layout_hint', 'body') == 'body'
+
+    def _estimate_output_tokens(self, text, target_lang):
+        """粗估译文 tokens：非中日韩原文译成中日韩文时，字数约为原文字符数的一半，每字约 1 token；按服务的输出系数校准。"""
+        tokens = self._estimate_tokens(text)
+        cjk_target = target_lang in ('zh', 'ja', 'ko')
+        if cjk_target and tokens < len(text):
+            tokens = max(1, len(text) // 2)
+        return self._calibrated(tokens, self.api_type, 'completion', 'cjk' if cjk_target else 'other')
+
+    def _pack_translation_blocks(self, blocks, target_lang):
+        """按当前服务的批量容量装箱，返回 [('single'|'batch', [block_info, ...], fill_ratio), ...]。"""
+        config = self.BATCH_BUDGETS.get(self.api_type)
+        if config is None:
+            return [('single', [block], None) for block in blocks]
+        if config['measure'] == 'chars':
+            return self._pack_blocks_by_chars(blocks, config['max_input'], config['max_item'])
+        budget = BatchBudget(
+            max_input=config['max_input'],
+            max_item=config['max_item'],
+            max_output=config.get('max_output'),
+            item_overhead=config.get('item_overhead', 0)
+        )
+        return pack_blocks(
+            blocks, budget,
+            measure=lambda block: self._calibrated_tokens(self._clean_text(block['text'])),
+            output_measure=lambda block: self._estimate_output_tokens(self._clean_text(block['text']), target_lang),
+            is_batchable=self._is_batchable_block
+        )
 
     def _should_use_fast_block_extraction(self, total_pages, file_size_mb):
         """大文件优先使用 blocks 提取，减少 dict/span 解析开销。"""
@@ -458,6 +852,53 @@ class PDFTranslator:
 
         return runs
 
+    def _text_chunk_measure(self):
+        """文本模式的分块度量函数和容量。
+
+        用未校准的启发式估算：校准系数随请求变化并跨任务落盘，用它分块时续传的任务块边界会变。
+        """
+        measure, budget = self.TEXT_CHUNK_BUDGETS.get(self.api_type, ('tokens', self.TEXT_CHUNK_TOKENS))
+        return (len if measure == 'chars' else self._estimate_tokens), budget
+
+    def _iter_page_paragraphs(self, doc):
+        """逐页产出 (页号, 段落文本)；段落取自 PyMuPDF 的文本块，按阅读顺序排列。"""
+        for page_num in range(len(doc)):
+            self._check_cancelled()
+            for block in doc[page_num].get_text('blocks', sort=True):
+                if block[6] != 0:
+                    continue
+                text = self._clean_text(self._normalize_extracted_block_text(block[4])).strip()
+                if text:
+                    yield page_num, text
+
+    def _iter_text_chunks(self, paragraphs, measure, budget, separator='\n\n'):
+        """把段落依次装进不超过 budget 的文本块，只在段落边界切分；单段超限时按句子拆开。
+
+        产出 (块文本, 块内最后一段的页号)，边提取边产出，不需要先拿到全文。
+        """
+        separator_cost = measure(separator)
+        current = []
+        current_cost = 0
+        last_page = 0
+        for page_num, paragraph in paragraphs:
+            cost = measure(paragraph)
+            pieces = [(paragraph, cost)]
+            if cost > budget:
+                max_chars = max(200, int(len(paragraph) * budget / cost))
+                pieces = [(piece, measure(piece)) for piece in self._split_text_for_strict_retry(paragraph, max_chars=max_chars)]
+            for piece, piece_cost in pieces:
+                if current and current_cost + separator_cost + piece_cost > budget:
+                    yield separator.join(current), last_page
+                    current = []
+                    current_cost = 0
+                if current:
+                    current_cost += separator_cost
+                current.append(piece)
+                current_cost += piece_cost
+                last_page = page_num
+        if current:
+            yield separator.join(current), last_page
+
     def _normalize_extracted_block_text(self, text):
         """规范化提取出的块文本，减少字体私有区符号导致的乱码。"""
         if not text:
@@ -481,46 +922,13 @@ class PDFTranslator:
 
     def _contains_long_english_run(self, text):
         normalized = " ".join(text.split())
-        return bool(re.search(r'(?:[A-Za-z][A-Za-z\'’\-]{1,}(?:[\s\-/&,;:().]+|$)){6,}', normalized))
+        return bool(text_rules.LONG_ENGLISH_RUN.search(normalized))
 
     def _contains_meta_translation_note(self, text):
-        normalized = "\n".join(line.strip() for line in text.splitlines() if line.strip())
-        patterns = [
-            r'严格遵循',
-            r'严格遵照',
-            r'根据翻译要求',
-            r'根据提供的翻译要求',
-            r'处理原则',
-            r'处理方式',
-            r'处理要点',
-            r'已处理',
-            r'已完整转化',
-            r'已消除',
-            r'未保留',
-            r'未添加任何解释',
-            r'符合以下',
-            r'未添加额外说明',
-            r'完全符合要求',
-            r'交办要求',
-            r'解释性说明',
-            r'全数转换为',
-            r'不保留任何英文',
-            r'章节编号采用',
-            r'括号使用',
-            r'保留原排版',
-            r'英文句子彻底转化',
-            r'根据硬性要求',
-            r'注释[:：]',
-            r'(?m)^\d+\.\s+',
-        ]
-        return any(re.search(pattern, normalized, flags=re.IGNORECASE) for pattern in patterns)
+        return text_rules.contains_meta_translation_note(text)
 
     def _count_list_lines(self, text):
-        return sum(
-            1
-            for line in text.splitlines()
-            if re.match(r'^\s*(?:[•●◆◾▪◦■□▪\-*]|(?:\d+|[A-Za-z])[.)])\s+', line.strip())
-        )
+        return sum(1 for line in text.splitlines() if text_rules.LIST_LINE.match(line.strip()))
 
     def _has_suspicious_structure_drift(self, source_text, translated_text):
         source_lines = [line.strip() for line in source_text.splitlines() if line.strip()]
@@ -535,49 +943,15 @@ class PDFTranslator:
         if translated_list_lines >= source_list_lines + 3 and translated_list_lines >= 4:
             return True
 
-        source_numbered = sum(1 for line in source_lines if re.match(r'^\d+[.)]\s+', line))
-        translated_numbered = sum(1 for line in translated_lines if re.match(r'^\d+[.)]\s+', line))
+        source_numbered = sum(1 for line in source_lines if text_rules.NUMBERED_LINE.match(line))
+        translated_numbered = sum(1 for line in translated_lines if text_rules.NUMBERED_LINE.match(line))
         if translated_numbered >= source_numbered + 2 and translated_numbered >= 2:
             return True
 
         return False
 
     def _is_meta_translation_line(self, line):
-        normalized = " ".join(line.strip().split())
-        if not normalized:
-            return False
-
-        patterns = [
-            r'根据(?:提供的)?翻译要求',
-            r'硬性要求',
-            r'处理原则',
-            r'输出要求',
-            r'严格实现',
-            r'完整转化',
-            r'完整翻译',
-            r'已处理',
-            r'未保留',
-            r'未添加任何解释',
-            r'解释性内容',
-            r'符合中文语序',
-            r'品牌名',
-            r'译为',
-            r'保留原文',
-            r'删除原文所有英文',
-            r'不允许保留英文句子',
-        ]
-        if any(re.search(pattern, normalized, flags=re.IGNORECASE) for pattern in patterns):
-            return True
-
-        if re.match(r'^\d+\.\s*', normalized) and (
-            re.search(r'(翻译|英文|中文|术语|原文|品牌|句式|语序|标点|被动语态|缩进|格式层级|原句|译法|关键概念|保留引号|处理)', normalized, flags=re.IGNORECASE)
-        ):
-            return True
-
-        if len(re.findall(r'[A-Za-z]', normalized)) >= 12 and re.search(r'(译|翻译|原文|术语)', normalized):
-            return True
-
-        return False
+        return text_rules.is_meta_translation_line(line)
 
     def _has_repeated_lines(self, text):
         lines = [" ".join(line.split()) for line in text.splitlines() if line.strip()]
@@ -595,16 +969,19 @@ class PDFTranslator:
         """OpenRouter 二次强制重翻，尽量消除长英文残留。"""
         text = self._clean_text(text)
         result = self._chat_completion(
-            [
-                {'role': 'system', 'content': '你是严格的中文翻译引擎。必须输出完整中文译文，不能保留整句英文，只输出译文本身。'},
-                {'role': 'user', 'content': self._build_translation_prompt(text, 'auto', target_lang, strict=True)}
-            ],
+            self._force_chinese_messages(text, target_lang),
             api_type='openrouter',
             temperature=0,
             timeout=75
         )
         return self._normalize_translated_text(result)
 
+    def _force_chinese_messages(self, text, target_lang='zh'):
+        return [
+            {'role': 'system', 'content': '你是严格的中文翻译引擎。必须输出完整中文译文，不能保留整句英文，只输出译文本身。'},
+            {'role': 'user', 'content': self._build_translation_prompt(text, 'auto', target_lang, strict=True)}
+        ]
+
     def _split_text_for_strict_retry(self, text, max_chars=260):
         """把长文本拆成更稳的小段，降低模型漏译后半段的概率。"""
         chunks = []
@@ -683,26 +1060,29 @@ class PDFTranslator:
     def _should_retry_translation(self, source_text, translated_text, target_lang):
         if target_lang != 'zh':
             return False
+        # 判定只取决于原文和译文，结果在各调用点之间共享
+        return text_rules.memoized(
+            text_rules.RETRY_VERDICT_MEMO,
+            (source_text, translated_text),
+            len(source_text) + len(translated_text),
+            lambda: self._retry_verdict(source_text, translated_text)
+        )
+
+    def _retry_verdict(self, source_text, translated_text):
         source = " ".join(source_text.strip().split())
         translated = " ".join(translated_text.strip().split())
         if not source or not translated:
             return False
 
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', translated))
-        ascii_chars = len(re.findall(r'[A-Za-z]', translated))
-        source_ascii_chars = len(re.findall(r'[A-Za-z]', source))
-        similarity = SequenceMatcher(None, source.lower(), translated.lower()).ratio()
-
-        if similarity >= 0.72 and chinese_chars < max(8, len(translated) * 0.08):
-            return True
+        chinese_chars = len(text_rules.CJK_CHAR.findall(translated))
+        ascii_chars = len(text_rules.ASCII_LETTER.findall(translated))
+        source_ascii_chars = len(text_rules.ASCII_LETTER.findall(source))
+        # 各条件是纯粹的“或”关系，顺序不影响结果：先算廉价的计数和正则，相似度放到最后。
+        # 合并块可达数千字符，完整 ratio() 最坏是平方级，用上界先排除，必要时才精算
         if self._contains_long_english_run(translated):
             return True
-        if ascii_chars > chinese_chars * 4 and similarity >= 0.55:
-            return True
         if source_ascii_chars >= 12 and chinese_chars == 0 and ascii_chars >= max(10, source_ascii_chars * 0.6):
             return True
-        if source_ascii_chars >= 24 and chinese_chars < 6 and similarity >= 0.35:
-            return True
         if source_ascii_chars >= 40 and ascii_chars >= 24:
             return True
         if self._has_repeated_lines(translated):
@@ -711,6 +1091,14 @@ class PDFTranslator:
             return True
         if self._contains_meta_translation_note(translated):
             return True
+
+        similarity = text_rules.LazySimilarity(source.lower(), translated.lower())
+        if chinese_chars < max(8, len(translated) * 0.08) and similarity.at_least(0.72):
+            return True
+        if ascii_chars > chinese_chars * 4 and similarity.at_least(0.55):
+            return True
+        if source_ascii_chars >= 24 and chinese_chars < 6 and similarity.at_least(0.35):
+            return True
         return False
 
     def _ensure_target_translation(self, source_text, translated_text, source_lang, target_lang):
@@ -720,12 +1108,13 @@ class PDFTranslator:
 
         retried = translated_text
         for _ in range(2):
-            if self.api_type == 'google':
-                retried = self._translate_text_google(source_text, source_lang, target_lang)
-            elif self.api_type == 'openrouter':
-                retried = self._strict_translate_text(source_text, source_lang, target_lang)
-            else:
-                retried = self._translate_text(source_text, source_lang, target_lang)
+            with self._usage_phase('retry'):
+                if self.api_type == 'google':
+                    retried = self._translate_text_google(source_text, source_lang, target_lang)
+                elif self.api_type == 'openrouter':
+                    retried = self._strict_translate_text(source_text, source_lang, target_lang)
+                else:
+                    retried = self._translate_text(source_text, source_lang, target_lang)
 
             retried = self._normalize_translated_text(retried if retried else translated_text)
             if not self._should_retry_translation(source_text, retried, target_lang):
@@ -734,79 +1123,23 @@ class PDFTranslator:
         return retried
 
     def _normalize_translated_text(self, text):
-        if not text:
+        if isinstance(text, FallbackText):
+            # 回退的原文不做译文清洗，保留失败标记
             return text
+        return text_rules.normalize_translated_text(text)
 
-        text = text.replace('\x00', '')
-        text = text.replace('?', '？') if re.search(r'[A-Za-z]\?[A-Za-z]', text) else text
-        text = text.replace('�', '')
-        def collapse_spaced_letters(match):
-            fragment = match.group(0)
-            pieces = fragment.split()
-            if len(pieces) < 3 or any(not piece.isalpha() or len(piece) > 2 for piece in pieces):
-                return fragment
-            collapsed = ''.join(pieces)
-            collapsed = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', collapsed)
-            return collapsed
-
-        def collapse_spaced_digits(match):
-            pieces = match.group(0).split()
-            return ''.join(pieces)
-
-        text = text.replace('•  ', '• ')
-        text = re.sub(r'(?<!\S)(?:[A-Za-z]{1,2}\s+){2,}[A-Za-z]{1,2}(?!\S)', collapse_spaced_letters, text)
-        text = re.sub(r'(?<!\S)(?:\d\s+){1,}\d(?!\S)', collapse_spaced_digits, text)
-        text = re.sub(r'([A-Za-z0-9])\s+\.\s+(?=[A-Za-z0-9])', r'\1.', text)
-        text = re.sub(r'([:/._-])\s+(?=[A-Za-z0-9])', r'\1', text)
-        text = re.sub(r'(?<=[A-Za-z0-9])\s+([:/._-])', r'\1', text)
-        text = re.sub(r'\bW\s+W\s+W\b', 'WWW', text, flags=re.IGNORECASE)
-        text = re.sub(r'(?i)w\s+w\s+w\s*\.\s*', 'www.', text)
-        text = re.sub(r'\s+\)', ')', text)
-        text = re.sub(r'\(\s+', '(', text)
-        text = re.sub(r'(?is)[（(](?:根据(?:提供的)?翻译要求|译文|翻译说明|硬性要求|处理原则|输出要求)[^）)]{0,500}[）)]', '', text)
-        text = re.sub(r'(?is)(?:根据(?:提供的)?翻译要求|硬性要求|处理原则|输出要求)[：:].{0,600}(?=\n{2,}|$)', '', text)
-        text = re.sub(r'(?is)^（?(?:译文|翻译|根据提供的翻译要求|硬性要求)[^。\n]{0,120}[：:][\s\S]*?(?=\n{2,}|$)', '\n', text)
-        text = re.sub(r'(?im)^\s*（?(?:译文|翻译|根据提供的翻译要求|硬性要求|处理原则|输出要求)[^)：:\n]{0,80}[：:）)]?\s*.*$', '', text)
-        text = re.sub(r'(?im)^\s*\d+\.\s*(?:所有|保持|禁止|仅返回|不得|不允许|确保|输出|保留|根据).*$','', text)
-        text = re.sub(r'(?im)^\s*[（(]?(?:注|说明|译者注|翻译注)[：:].*$', '', text)
-        text = re.sub(r'(?im)^\s*[（(]?翻译\s*$', '', text)
-        text = re.sub(r'(?im)^\s*根据提供的翻译要求.*$', '', text)
-        text = re.sub(r'(?im)^\s*硬性要求.*$', '', text)
-        text = re.sub(r'\n?注释[:：]\n?(?:\d+\.\s*.*(?:\n|$)){1,6}', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'\n?说明[:：]\n?(?:[-•\d].*(?:\n|$)){1,8}', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'(?s)[（(]说明[:：].*$', '', text)
-        text = re.sub(r'(?s)说明[:：].*$', '', text)
-        text = re.sub(r'[\(（]保留原排版.*?[\)）]', '', text)
-        text = re.sub(r'(?im)^.*(?:根据翻译要求|根据提供的翻译要求|硬性要求|处理原则|输出要求|已处理商标符号|已完整转化|未保留任何英文|未添加任何解释|解释性内容).*$','', text)
-        text = re.sub(r'(?m)^(?:注[:：]|输出[:：]?|翻译[:：]?|完全符合要求.*|严格遵循要求.*|章节编号.*|括号使用.*|空行结构.*)$', '', text)
-        text = re.sub(r'(?m)^\d+\.\s*(?:严格遵循要求.*|确保未出现.*|数字.*|空行结构.*|完全符合.*)$', '', text)
-        text = re.sub(r'（注：.*?）', '', text, flags=re.DOTALL)
-        text = re.sub(r'\(注：.*?\)', '', text, flags=re.DOTALL)
-        text = re.sub(r'(?im)^\s*[?？]{4,}.*$', '', text)
-        cleaned_lines = []
-        for raw_line in text.splitlines():
-            line = raw_line.strip()
-            if not line:
-                cleaned_lines.append('')
-                continue
-            if self._is_meta_translation_line(line):
-                continue
-            cleaned_lines.append(raw_line)
-        text = "\n".join(cleaned_lines)
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        return text.strip()
-
-    def _register_page_fonts(self, page):
-        registered = []
-        for font_name, font_path in self.SYSTEM_FONT_CANDIDATES:
-            if not os.path.exists(font_path):
-                continue
-            try:
-                page.insert_font(fontname=font_name, fontfile=font_path)
-                registered.append(font_name)
-            except Exception:
-                continue
-        return registered
+    def _document_fonts(self, output_writer):
+        """当前输出分片的系统字体：每个分片只嵌入一次，各页引用同一组 xref。
+
+        首次调用会往分片里拷入再删掉一页，须在创建本页之前调用，否则已取得的 Page 对象会失效。
+        """
+        if output_writer.fonts is None:
+            output_writer.fonts = DocumentFonts(output_writer.doc, self.SYSTEM_FONT_CANDIDATES)
+        return output_writer.fonts
+
+    def _font_covers(self, font_name, text):
+        font_path = dict(self.SYSTEM_FONT_CANDIDATES).get(font_name)
+        return bool(font_path) and get_font_library().covers(font_path, text)
 
     def _pdf_color_to_rgb(self, color_value):
         if isinstance(color_value, tuple) and len(color_value) == 3:
@@ -822,12 +1155,13 @@ class PDFTranslator:
         r, g, b = self._pdf_color_to_rgb(color_value)
         return (r + g + b) / 3 >= 0.72
 
-    def _extract_span_style_hints(self, page):
+    def _extract_span_style_hints(self, page, text_dict=None):
         span_hints = []
-        try:
-            text_dict = page.get_text("dict")
-        except Exception:
-            return span_hints
+        if text_dict is None:
+            try:
+                text_dict = page.get_text("dict")
+            except Exception:
+                return span_hints
 
         for block in text_dict.get('blocks', []):
             if block.get('type') != 0:
@@ -847,14 +1181,21 @@ class PDFTranslator:
                     })
         return span_hints
 
+    def _rect_index(self, rects, key=None, bounds=None):
+        """把矩形列表包装成网格索引；已经是索引的直接返回，整页只建一次。"""
+        if isinstance(rects, RectGrid):
+            return rects
+        return RectGrid(rects or [], key=key, bounds=bounds)
+
     def _apply_block_style_hints(self, page_blocks, span_hints):
         if not page_blocks or not span_hints:
             return page_blocks
 
+        span_index = self._rect_index(span_hints, key=lambda span: span['rect'])
         for block in page_blocks:
             block_rect = block['rect']
             overlaps = []
-            for span in span_hints:
+            for span in span_index.query(block_rect):
                 inter = block_rect & span['rect']
                 if inter.is_empty:
                     continue
@@ -872,23 +1213,68 @@ class PDFTranslator:
             })
         return page_blocks
 
-    def _copy_vector_drawings(self, source_page, target_page):
+    def _extract_page_drawings(self, page):
+        """只保留写回时会重画的矩形色块/描边字段，结果可缓存到写回阶段或跨进程传递。"""
         try:
-            drawings = source_page.get_drawings()
+            drawings = page.get_drawings()
         except Exception:
-            return
+            return []
 
+        kept = []
         for drawing in drawings:
-            rect = drawing.get('rect')
-            if not rect:
+            if not drawing.get('rect') or drawing.get('type') not in ('f', 'fs', 'sf', 's'):
                 continue
+            kept.append({
+                'rect': fitz.Rect(drawing['rect']),
+                'type': drawing.get('type'),
+                'fill': drawing.get('fill'),
+                'color': drawing.get('color'),
+                'width': drawing.get('width') or 0,
+                'fill_opacity': drawing.get('fill_opacity', 1.0),
+                'stroke_opacity': drawing.get('stroke_opacity', 1.0),
+            })
+        return kept
+
+    def _extract_page_images(self, page, text_page=None, image_digests=None, image_list=None):
+        """返回 [(xref, [Rect, ...]), ...]，顺序与 get_images 一致，位置与逐个 get_image_rects 相同。
+
+        get_image_rects 每调用一次都要解码图片算摘要并重新解析页面；这里整页只取一次图片信息，
+        各 xref 的摘要按文档缓存在 image_digests 里，跨页复用的图片只解码一次。
+        调用方已经取过 page.get_images() 时通过 image_list 传入，不再重复解析页面资源。
+        """
+        if image_digests is None:
+            image_digests = {}
+        if image_list is None:
+            image_list = page.get_images()
+        if not image_list:
+            return []
+        if text_page is not None:
+            infos = text_page.extractIMGINFO(hashes=True)
+        else:
+            infos = page.get_image_info(hashes=True)
 
-            fill = drawing.get('fill')
-            color = drawing.get('color')
-            width = drawing.get('width') or 0
-            fill_opacity = drawing.get('fill_opacity', 1.0)
-            stroke_opacity = drawing.get('stroke_opacity', 1.0)
-            drawing_type = drawing.get('type')
+        placements = []
+        for img in image_list:
+            xref = img[0]
+            try:
+                digest = image_digests.get(xref)
+                if digest is None:
+                    digest = fitz.Pixmap(page.parent, xref).digest
+                    image_digests[xref] = digest
+                placements.append((xref, [fitz.Rect(info['bbox']) for info in infos if info['digest'] == digest]))
+            except Exception as img_err:
+                print(f'[DEBUG] 图片定位失败(页{page.number + 1}, xref {xref}): {str(img_err)[:50]}')
+        return placements
+
+    def _copy_vector_drawings(self, drawings, target_page):
+        for drawing in drawings:
+            rect = drawing['rect']
+            fill = drawing['fill']
+            color = drawing['color']
+            width = drawing['width']
+            fill_opacity = drawing['fill_opacity']
+            stroke_opacity = drawing['stroke_opacity']
+            drawing_type = drawing['type']
 
             try:
                 if drawing_type in ('f', 'fs', 'sf'):
@@ -912,18 +1298,31 @@ class PDFTranslator:
             except Exception:
                 continue
 
+    def _redact_original_text(self, page, page_translations):
+        """overlay 模式：用不填充的涂抹注释删掉将被译文覆盖的原文，图片和矢量图形不动。
+
+        整页文本（page_translations 为 str）涂抹整页文字；文本块页只涂抹有译文的块，
+        没有译文的原文（页码、公式、翻译失败的块）原样保留。
+        """
+        if isinstance(page_translations, str):
+            rects = [page.rect]
+        else:
+            rects = [rect for rect, _, _ in page_translations]
+        if not rects:
+            return
+        for rect in rects:
+            page.add_redact_annot(rect, fill=False)
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE)
+
     def _has_cjk_chars(self, text):
         return bool(text and re.search(r'[\u4e00-\u9fff]', text))
 
     def _build_font_candidates(self, registered_fonts, translated_text, original_font, is_bold, is_italic, has_cjk_chars):
-        has_latin = bool(re.search(r'[A-Za-z0-9]', translated_text))
-
         if has_cjk_chars:
-            base = []
-            if has_latin:
-                base.extend([name for name in ('ui_unicode', 'ui_heiti', 'ui_cjk') if name in registered_fonts])
-            else:
-                base.extend([name for name in ('ui_unicode', 'ui_heiti', 'ui_cjk') if name in registered_fonts])
+            # 能显示全部字符的系统字体优先；都有缺字时仍按原顺序尝试，最后退回内置 CJK 字体
+            system_fonts = [name for name in ('ui_unicode', 'ui_heiti', 'ui_cjk') if name in registered_fonts]
+            covering = [name for name in system_fonts if self._font_covers(name, translated_text)]
+            base = covering + [name for name in system_fonts if name not in covering]
             base.extend(['china-s', 'china-t', 'china-ss'])
             return base
 
@@ -951,6 +1350,7 @@ class PDFTranslator:
         right_margin = 72
         next_block_ceiling = page_bottom if next_top is None else max(text_rect.y1, next_top - 6)
         expanded = fitz.Rect(text_rect)
+        image_index = self._rect_index(image_rects, bounds=page_rect)
 
         if layout_hint in ('caption', 'heading', 'short'):
             extra_bottom = original_size * 1.6
@@ -961,18 +1361,27 @@ class PDFTranslator:
 
         expanded.y1 = min(next_block_ceiling, text_rect.y1 + extra_bottom)
 
+        # 只有左边缘落在文本右侧可扩展范围内、且与扩展区纵向重叠的图片才会收窄右边界
         candidate_x1 = page_rect.width - right_margin
-        for image_rect in image_rects:
+        right_band = fitz.Rect(text_rect.x0, expanded.y0, max(text_rect.x0, candidate_x1), expanded.y1)
+        for image_rect in image_index.query(right_band):
             if self._rect_vertical_overlap(expanded, image_rect) < 6:
                 continue
             if image_rect.x0 > text_rect.x0 and image_rect.x0 < candidate_x1:
                 candidate_x1 = min(candidate_x1, max(text_rect.x1, image_rect.x0 - 8))
 
         lower_limit = min(expanded.y1, next_block_ceiling)
-        for image_rect in image_rects:
+        min_overlap = min(24, expanded.width * 0.2)
+        if min_overlap > 0:
+            # 顶边比 lower_limit + 8 更靠下的图片不会再压低下边界
+            below_band = fitz.Rect(expanded.x0, text_rect.y0, expanded.x1, max(text_rect.y0, lower_limit + 8))
+            images_below = image_index.query(below_band)
+        else:
+            images_below = image_index
+        for image_rect in images_below:
             if image_rect.y0 <= text_rect.y0 + 6:
                 continue
-            if self._rect_horizontal_overlap(expanded, image_rect) < min(24, expanded.width * 0.2):
+            if self._rect_horizontal_overlap(expanded, image_rect) < min_overlap:
                 continue
             lower_limit = min(lower_limit, max(text_rect.y1, image_rect.y0 - 8))
         expanded.y1 = min(next_block_ceiling, max(text_rect.y1, lower_limit))
@@ -1122,7 +1531,8 @@ class PDFTranslator:
     def _clip_rect_to_avoid_images(self, rect, image_rects, min_width=90, min_height=16):
         clipped = fitz.Rect(rect)
 
-        for image_rect in image_rects:
+        # clipped 只会缩小，与它相交的图片一定也与原始 rect 相交
+        for image_rect in self._rect_index(image_rects).query(rect):
             inter = clipped & image_rect
             if inter.is_empty or inter.get_area() <= 20:
                 continue
@@ -1141,32 +1551,60 @@ class PDFTranslator:
             return fitz.Rect(rect)
         return clipped
 
-    def analyze_pdf(self, input_path):
-        """分析PDF文件，返回页数、字数、语言等信息"""
+    def analyze_pdf(self, input_path, page_texts=None, sample=False, sampled_texts=None):
+        """分析PDF文件，返回页数、字数、语言等信息；调用方已提取过逐页文本时传入 page_texts，不再重复解析。
+
+        sample=True 且页数超过 SAMPLE_MAX_PAGES 时按伪随机页序抽样，总字数的估计误差足够小即停止，
+        计数按页数比例外推：exact 为 False，confidence 为 1 减去 95% 置信水平下的相对误差。
+        sampled_texts 为列表时追加读到的 (页码, 文本)，供调用方复用。
+        """
+        doc = None
         try:
-            doc = fitz.open(input_path)
-            total_pages = len(doc)
+            if page_texts is not None:
+                total_pages = len(page_texts)
+            else:
+                doc = fitz.open(input_path)
+                total_pages = len(doc)
+            sampling = sample and total_pages > SAMPLE_MAX_PAGES
+            order = sample_order(total_pages) if sampling else range(total_pages)
 
-            # 提取所有文本
+            # 逐批统计字符类别，不拼接全文
+            stats = TextStats()
+            page_sizes = []
             parts = []
-            for page in doc:
-                text = page.get_text("text")
+            for page_num in order:
+                text = page_texts[page_num] if page_texts is not None else doc[page_num].get_text("text")
                 parts.append(text)
-            all_text = " ".join(parts)
-
-            doc.close()
+                page_sizes.append(len(text))
+                if sampled_texts is not None:
+                    sampled_texts.append((page_num, text))
+                if len(parts) < SAMPLE_BATCH_PAGES:
+                    continue
+                stats.add(" ".join(parts))
+                parts = []
+                if sampling and len(page_sizes) >= SAMPLE_MIN_PAGES and (
+                    len(page_sizes) >= SAMPLE_MAX_PAGES
+                    or total_margin(page_sizes, total_pages) <= SAMPLE_TARGET_MARGIN
+                ):
+                    break
+            if parts or not stats.segments:
+                stats.add(" ".join(parts))
+
+            sampled_pages = len(page_sizes)
+            margin = total_margin(page_sizes, total_pages) if total_pages else 0.0
+            scale = total_pages / sampled_pages if sampled_pages else 1
 
             # 统计字数
-            char_count = len(all_text.strip())
-            word_count = len(all_text.split())
+            char_count = round(stats.char_count * scale)
+            word_count = round(stats.word_count * scale)
 
-            # 检测主要语言
-            chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', all_text))
-            english_chars = len(re.findall(r'[a-zA-Z]', all_text))
-            japanese_chars = len(re.findall(r'[\u3040-\u309f\u30a0-\u30ff]', all_text))
-            korean_chars = len(re.findall(r'[\uac00-\ud7af]', all_text))
+            # 检测主要语言（比例与抽样无关，直接用样本计数）
+            chinese_chars = stats.counts['cjk']
+            english_chars = stats.counts['latin']
+            japanese_chars = stats.counts['kana']
+            korean_chars = stats.counts['hangul']
 
-            total_chars = len(all_text)
+            total_chars = stats.total_chars
 
             # 判断主要语言
             if chinese_chars > total_chars * 0.3:
@@ -1185,8 +1623,13 @@ class PDFTranslator:
                 detected_lang = 'auto'
                 lang_name = '混合/其他'
 
-            # 估算总tokens
-            total_tokens = self._estimate_tokens(all_text)
+            # 估算总tokens（与 _estimate_tokens 同一口径）
+            if not total_chars:
+                total_tokens = 0
+            elif chinese_chars > total_chars * 0.3:
+                total_tokens = round(total_chars * scale)
+            else:
+                total_tokens = max(1, round(total_chars * scale) // 4)
 
             return {
                 'total_pages': total_pages,
@@ -1194,7 +1637,10 @@ class PDFTranslator:
                 'word_count': word_count,
                 'detected_lang': detected_lang,
                 'lang_name': lang_name,
-                'total_tokens': total_tokens
+                'total_tokens': total_tokens,
+                'sampled_pages': sampled_pages,
+                'exact': sampled_pages >= total_pages,
+                'confidence': round(max(0.0, 1 - margin), 3)
             }
 
         except Exception as e:
@@ -1205,8 +1651,76 @@ class PDFTranslator:
                 'word_count': 0,
                 'detected_lang': 'auto',
                 'lang_name': '未知',
-                'total_tokens': 0
+                'total_tokens': 0,
+                'sampled_pages': 0,
+                'exact': False,
+                'confidence': 0.0
+            }
+        finally:
+            if doc is not None:
+                doc.close()
+
+    def plan_translation(self, input_path, target_lang='zh', providers=None):
+        """翻译前的干跑：用翻译时的提取方式抽样提取页面，按各服务的批量容量分组，
+        外推全文的文本块数、翻译单元数和 tokens，不调用任何服务。
+
+        页数超过 PLAN_SAMPLE_PAGES 时抽样，抽到的纯文字页按连续页合并成 run；
+        样本内文本相同的块只计一次（同任务内去重），页眉页脚模板和翻译记忆不计入，单元数偏保守。
+        """
+        providers = list(providers or [self.api_type])
+        doc = fitz.open(input_path)
+        try:
+            total_pages = len(doc)
+            file_size_mb = os.path.getsize(input_path) / (1024 * 1024)
+            use_fast_extraction = self._should_use_fast_block_extraction(total_pages, file_size_mb)
+            if total_pages > self.PLAN_SAMPLE_PAGES:
+                page_nums = sorted(sample_order(total_pages)[:self.PLAN_SAMPLE_PAGES])
+            else:
+                page_nums = list(range(total_pages))
+            blocks = []
+            text_pages = []
+            seen_texts = set()
+            block_count = 0
+            source_tokens = 0
+            for page_num in page_nums:
+                record = self._extract_page_record(doc, page_num, use_fast_extraction, layout=False)
+                if record['error']:
+                    continue
+                if record['text_page']:
+                    text_pages.append(dict(record['text_page'], page_num=len(text_pages)))
+                    continue
+                for block_entry in record['blocks']:
+                    block_count += 1
+                    source_tokens += self._estimate_tokens(block_entry['text'])
+                    key = normalize_source_text(self._clean_text(block_entry['text']))
+                    if key in seen_texts:
+                        continue
+                    seen_texts.add(key)
+                    block_entry['seq'] = len(blocks)
+                    blocks.append(block_entry)
+        finally:
+            doc.close()
+
+        scale = total_pages / len(page_nums) if page_nums else 0
+        texts = [self._clean_text(block['text']) for block in blocks] + [item['text'] for item in text_pages]
+        text_runs = len(self._build_text_page_runs(text_pages, max_chars=12000))
+        plan = {
+            'total_pages': total_pages,
+            'sampled_pages': len(page_nums),
+            'blocks': round(block_count * scale),
+            'text_pages': round(len(text_pages) * scale),
+            'source_tokens': round((source_tokens + sum(self._estimate_tokens(item['text']) for item in text_pages)) * scale),
+            'providers': {}
+        }
+        for provider in providers:
+            planner = self if provider == self.api_type else PDFTranslator(api_type=provider)
+            groups = planner._pack_translation_blocks(blocks, target_lang)
+            plan['providers'][provider] = {
+                'units': round((len(groups) + text_runs) * scale),
+                'input_tokens': round(sum(planner._calibrated_tokens(text) for text in texts) * scale),
+                'output_tokens': round(sum(planner._estimate_output_tokens(text, target_lang) for text in texts) * scale)
             }
+        return plan
 
     def _clean_text(self, text):
         """清理文本中的特殊Unicode字符，避免编码错误"""
@@ -1320,27 +1834,17 @@ class PDFTranslator:
         return text
 
     def _estimate_tokens(self, text):
-        """估算文本的token数量（粗略估计：中文约1字符=1token，英文约4字符=1token）"""
-        if not text:
-            return 0
-
-        # 检测是否主要是中文
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        total_chars = len(text)
-
-        if chinese_chars > total_chars * 0.3:
-            # 主要是中文
-            return len(text)
-        else:
-            # 主要是英文或其他语言，约4字符=1token
-            return max(1, len(text) // 4)
+        """估算文本的token数量（粗略估计：中文约1字符=1token，英文约4字符=1token）；按服务校准的估算见 _calibrated_tokens"""
+        return raw_token_estimate(text)[0]
 
     def _calculate_cost(self):
-        """计算预估费用"""
+        """按记账的 tokens 计算费用；命中上下文缓存的输入按缓存价格计"""
         pricing = self.PRICING.get(self.api_type, {'input': 0, 'output': 0})
-        input_cost = (self.input_tokens / 1_000_000) * pricing['input']
+        cached_tokens = self.usage.cached_tokens
+        input_cost = ((self.input_tokens - cached_tokens) / 1_000_000) * pricing['input']
+        cached_cost = (cached_tokens / 1_000_000) * pricing.get('cached_input', pricing['input'])
         output_cost = (self.output_tokens / 1_000_000) * pricing['output']
-        return input_cost + output_cost
+        return input_cost + cached_cost + output_cost
 
     def _check_cancelled(self):
         """检查是否需要取消翻译"""
@@ -1368,6 +1872,11 @@ class PDFTranslator:
             }
             self.progress_callback(progress_data)
 
+    def _emit_preview(self, pages_ready, total_pages):
+        """通知前端已有 pages_ready 页可以通过 /preview 预览。"""
+        if self.progress_callback:
+            self.progress_callback({'type': 'preview', 'pages_ready': pages_ready, 'total_pages': total_pages})
+
     def _add_log(self, message, log_type='info'):
         """添加日志"""
         if self.log_callback:
@@ -1383,50 +1892,27 @@ class PDFTranslator:
             return special_text
 
         # 语言代码映射 (deep-translator使用的代码)
-        lang_mapping = {
-            'zh': 'zh-CN',
-            'en': 'en',
-            'ja': 'ja',
-            'ko': 'ko',
-            'fr': 'fr',
-            'de': 'de',
-            'es': 'es-ES',
-            'ru': 'ru',
-            'ar': 'ar'
-        }
-
-        normalized_target = lang_mapping.get(target_lang, target_lang)
-        # deep-translator 使用 'auto' 作为源语言
-        normalized_source = 'auto'
+        normalized_source, normalized_target = self._google_lang_codes(source_lang, target_lang)
 
         # 保护特殊格式字符（项目符号、链接等）
         protected_text, placeholders = self._protect_formatting(text)
 
-        # 记录输入token（确保总是执行）
-        input_tokens = self._estimate_tokens(text)
-        self.input_tokens += input_tokens
-
-        # 只在第一页显示详细token信息
-        if self.input_tokens == input_tokens:  # 这是第一次调用
-            self._add_log(f'开始翻译，文本长度: {len(text)} 字符, 输入tokens: {input_tokens}', 'info')
+        # 只在第一次显示详细token信息
+        self._log_first_request(text)
 
         max_length = 4000
         if len(protected_text) <= max_length:
             try:
-                translated = GoogleTranslator(source=normalized_source, target=normalized_target).translate(protected_text)
+                translated = self._google_translate(protected_text, normalized_source, normalized_target)
 
                 # 恢复被保护的格式字符
                 translated = self._restore_formatting(translated, placeholders)
 
-                # 记录输出token
-                output_tokens = self._estimate_tokens(translated)
-                self.output_tokens += output_tokens
-
                 return translated
             except Exception as e:
                 print(f'Translation error: {e}')
                 self._add_log(f'Google翻译错误: {str(e)}', 'error')
-                return text
+                return FallbackText(text)
 
         # 分段翻译
         segments = []
@@ -1448,15 +1934,11 @@ class PDFTranslator:
         for i, segment in enumerate(segments):
             try:
                 self._add_log(f'翻译段落 {i+1}/{len(segments)}', 'info')
-                translated = GoogleTranslator(source=normalized_source, target=normalized_target).translate(segment)
+                translated = self._google_translate(segment, normalized_source, normalized_target)
                 # 恢复被保护的格式字符
                 translated = self._restore_formatting(translated, placeholders)
                 translated_segments.append(translated)
 
-                # 记录输出token
-                output_tokens = self._estimate_tokens(translated)
-                self.output_tokens += output_tokens
-
             except Exception as e:
                 print(f'Translation error in segment: {e}')
                 self._add_log(f'段落翻译错误: {str(e)}', 'error')
@@ -1475,29 +1957,15 @@ class PDFTranslator:
             # 清理文本中的特殊Unicode字符
             text = self._clean_text(text)
 
-            # 记录输入token
-            input_tokens = self._estimate_tokens(text)
-            self.input_tokens += input_tokens
-
             # 只在第一次显示详细token信息
-            if self.input_tokens == input_tokens:
-                self._add_log(f'开始翻译，文本长度: {len(text)} 字符, 输入tokens: {input_tokens}', 'info')
+            self._log_first_request(text)
 
-            translated = self._chat_completion(
-                [
-                    {'role': 'system', 'content': '你是专业翻译助手。请保证准确、自然、术语一致，只输出译文本身。'},
-                    {'role': 'user', 'content': self._build_translation_prompt(text, source_lang, target_lang)}
-                ],
-                temperature=0.2,
-                timeout=60
-            )
+            messages, temperature, timeout = self._single_translation_request('deepseek', text, source_lang, target_lang)
+            translated = self._chat_completion(messages, temperature=temperature, timeout=timeout)
             translated = self._normalize_translated_text(translated)
             translated = self._ensure_target_translation(text, translated, source_lang, target_lang)
             translated = self._maybe_polish_translation(text, translated, source_lang, target_lang)
 
-            output_tokens = self._estimate_tokens(translated)
-            self.output_tokens += output_tokens
-
             return translated
 
         except Exception as e:
@@ -1512,7 +1980,7 @@ class PDFTranslator:
             else:
                 self._add_log(f'DeepSeek翻译错误: {error_msg}', 'error')
 
-            return text
+            return FallbackText(text)
 
     def _translate_text_zhipu(self, text, source_lang='auto', target_lang='en'):
         """使用智谱AI API翻译"""
@@ -1523,25 +1991,12 @@ class PDFTranslator:
             # 清理文本中的特殊Unicode字符
             text = self._clean_text(text)
 
-            # 记录输入token
-            input_tokens = self._estimate_tokens(text)
-            self.input_tokens += input_tokens
-
-            translated = self._chat_completion(
-                [
-                    {'role': 'system', 'content': '你是专业翻译助手。请保证准确、自然、术语一致，只输出译文本身。'},
-                    {'role': 'user', 'content': self._build_translation_prompt(text, source_lang, target_lang)}
-                ],
-                temperature=0.2,
-                timeout=60
-            )
+            messages, temperature, timeout = self._single_translation_request('zhipu', text, source_lang, target_lang)
+            translated = self._chat_completion(messages, temperature=temperature, timeout=timeout)
             translated = self._normalize_translated_text(translated)
             translated = self._ensure_target_translation(text, translated, source_lang, target_lang)
             translated = self._maybe_polish_translation(text, translated, source_lang, target_lang)
 
-            output_tokens = self._estimate_tokens(translated)
-            self.output_tokens += output_tokens
-
             return translated
 
         except Exception as e:
@@ -1556,7 +2011,7 @@ class PDFTranslator:
             else:
                 self._add_log(f'智谱AI翻译错误: {error_msg}', 'error')
 
-            return text
+            return FallbackText(text)
 
     def _translate_text_openrouter(self, text, source_lang='auto', target_lang='en'):
         """使用OpenRouter的DeepSeek API翻译"""
@@ -1567,29 +2022,15 @@ class PDFTranslator:
             # 清理文本中的特殊Unicode字符
             text = self._clean_text(text)
 
-            # 记录输入token
-            input_tokens = self._estimate_tokens(text)
-            self.input_tokens += input_tokens
-
             # 只在第一次显示详细token信息
-            if self.input_tokens == input_tokens:
-                self._add_log(f'开始翻译，文本长度: {len(text)} 字符, 输入tokens: {input_tokens}', 'info')
+            self._log_first_request(text)
 
-            translated = self._chat_completion(
-                [
-                    {'role': 'system', 'content': '你是严格的翻译引擎，只输出译文本身。禁止添加解释、备注、示例、总结或引号。'},
-                    {'role': 'user', 'content': self._build_translation_prompt(text, source_lang, target_lang)}
-                ],
-                temperature=0,
-                timeout=60
-            )
+            messages, temperature, timeout = self._single_translation_request('openrouter', text, source_lang, target_lang)
+            translated = self._chat_completion(messages, temperature=temperature, timeout=timeout)
             translated = self._normalize_translated_text(translated)
             translated = self._ensure_target_translation(text, translated, source_lang, target_lang)
             translated = self._maybe_polish_translation(text, translated, source_lang, target_lang)
 
-            output_tokens = self._estimate_tokens(translated)
-            self.output_tokens += output_tokens
-
             return translated
 
         except Exception as e:
@@ -1604,30 +2045,19 @@ class PDFTranslator:
             else:
                 self._add_log(f'OpenRouter翻译错误: {error_msg}', 'error')
 
-            return text
+            return FallbackText(text)
 
-    def _translate_text_openrouter_batch(self, texts, source_lang='auto', target_lang='en'):
-        """使用 OpenRouter 批量翻译短文本块，要求返回稳定的 XML 结构。"""
+    def _translate_text_chat_batch(self, texts, source_lang='auto', target_lang='en'):
+        """用当前 LLM 服务批量翻译短文本块，要求返回按 id 标注的 XML item；缺项和未通过校验的项返回 None。
+
+        精修模式下通过校验的项和单段翻译一样再经过润色。
+        """
         if not texts:
             return []
 
-        items = []
-        for idx, text in enumerate(texts):
-            safe_text = html.escape(text, quote=False)
-            items.append(f'<item id="{idx}">{safe_text}</item>')
-        payload = "\n".join(items)
-        prompt = f"{self._build_batch_translation_prompt(texts, source_lang, target_lang)}\n\n{payload}"
-
-        content = self._chat_completion(
-            [
-                {'role': 'system', 'content': '你是严格的 XML 翻译引擎。必须返回合法 XML，保持 item id 不变，只输出 XML。'},
-                {'role': 'user', 'content': prompt}
-            ],
-            api_type='openrouter',
-            temperature=0,
-            timeout=90
-        )
-        translated = self._extract_openrouter_batch_items(content, len(texts))
+        messages, temperature, timeout = self._chat_batch_request(texts, source_lang, target_lang)
+        content = self._chat_completion(messages, temperature=temperature, timeout=timeout, phase='batch')
+        translated = self._extract_batch_items(content, len(texts))
         if all(item is None for item in translated):
             raise ValueError("批量返回未解析出任何 item")
 
@@ -1636,9 +2066,25 @@ class PDFTranslator:
                 continue
             if self._should_retry_translation(texts[idx], translated_text, target_lang):
                 translated[idx] = None
+            else:
+                # 与单段翻译一致：精修模式下通过校验的项逐项润色
+                translated[idx] = self._maybe_polish_translation(texts[idx], translated_text, source_lang, target_lang)
 
         return translated
 
+    def _chat_batch_request(self, texts, source_lang, target_lang):
+        items = []
+        for idx, text in enumerate(texts):
+            safe_text = html.escape(text, quote=False)
+            items.append(f'<item id="{idx}">{safe_text}</item>')
+        payload = "\n".join(items)
+        prompt = f"{self._build_batch_translation_prompt(texts, source_lang, target_lang)}\n\n{payload}"
+        messages = [
+            {'role': 'system', 'content': '你是严格的 XML 翻译引擎。必须返回合法 XML，保持 item id 不变，只输出 XML。'},
+            {'role': 'user', 'content': prompt}
+        ]
+        return messages, 0, self._provider_config()['timeout']
+
     def _translate_text_kimi(self, text, source_lang='auto', target_lang='en'):
         """使用OpenRouter的Kimi (moonshot-v1-auto) API翻译"""
         if not text or not text.strip():
@@ -1648,29 +2094,15 @@ class PDFTranslator:
             # 清理文本中的特殊Unicode字符
             text = self._clean_text(text)
 
-            # 记录输入token
-            input_tokens = self._estimate_tokens(text)
-            self.input_tokens += input_tokens
-
             # 只在第一次显示详细token信息
-            if self.input_tokens == input_tokens:
-                self._add_log(f'开始翻译，文本长度: {len(text)} 字符, 输入tokens: {input_tokens}', 'info')
+            self._log_first_request(text)
 
-            translated = self._chat_completion(
-                [
-                    {'role': 'system', 'content': '你是专业翻译助手。请准确翻译文本，保持原文格式和语气，只输出译文本身。'},
-                    {'role': 'user', 'content': self._build_translation_prompt(text, source_lang, target_lang)}
-                ],
-                temperature=0.1,
-                timeout=120
-            )
+            messages, temperature, timeout = self._single_translation_request('kimi', text, source_lang, target_lang)
+            translated = self._chat_completion(messages, temperature=temperature, timeout=timeout)
             translated = self._normalize_translated_text(translated)
             translated = self._ensure_target_translation(text, translated, source_lang, target_lang)
             translated = self._maybe_polish_translation(text, translated, source_lang, target_lang)
 
-            output_tokens = self._estimate_tokens(translated)
-            self.output_tokens += output_tokens
-
             return translated
 
         except Exception as e:
@@ -1684,7 +2116,7 @@ class PDFTranslator:
             else:
                 self._add_log(f'Kimi翻译错误: {error_msg}', 'error')
 
-            return text
+            return FallbackText(text)
 
     def _translate_text_gpt(self, text, source_lang='auto', target_lang='en'):
         """使用OpenRouter的GPT-4.1 API翻译"""
@@ -1695,29 +2127,15 @@ class PDFTranslator:
             # 清理文本中的特殊Unicode字符
             text = self._clean_text(text)
 
-            # 记录输入token
-            input_tokens = self._estimate_tokens(text)
-            self.input_tokens += input_tokens
-
             # 只在第一次显示详细token信息
-            if self.input_tokens == input_tokens:
-                self._add_log(f'开始翻译，文本长度: {len(text)} 字符, 输入tokens: {input_tokens}', 'info')
+            self._log_first_request(text)
 
-            translated = self._chat_completion(
-                [
-                    {'role': 'system', 'content': '你是专业翻译助手。请准确翻译文本，保持原文格式和语气，只输出译文本身。'},
-                    {'role': 'user', 'content': self._build_translation_prompt(text, source_lang, target_lang)}
-                ],
-                temperature=0.1,
-                timeout=120
-            )
+            messages, temperature, timeout = self._single_translation_request('gpt', text, source_lang, target_lang)
+            translated = self._chat_completion(messages, temperature=temperature, timeout=timeout)
             translated = self._normalize_translated_text(translated)
             translated = self._ensure_target_translation(text, translated, source_lang, target_lang)
             translated = self._maybe_polish_translation(text, translated, source_lang, target_lang)
 
-            output_tokens = self._estimate_tokens(translated)
-            self.output_tokens += output_tokens
-
             return translated
 
         except Exception as e:
@@ -1731,7 +2149,7 @@ class PDFTranslator:
             else:
                 self._add_log(f'GPT翻译错误: {error_msg}', 'error')
 
-            return text
+            return FallbackText(text)
 
     def _translate_text(self, text, source_lang='auto', target_lang='en'):
         """根据API类型选择翻译方法"""
@@ -1752,7 +2170,7 @@ class PDFTranslator:
         elif self.api_type == 'gpt':
             return self._translate_text_gpt(text, source_lang, target_lang)
         else:
-            return text
+            return FallbackText(text)
 
     def _translate_text_batch(self, texts, source_lang='auto', target_lang='en'):
         """批量翻译多个文本，提高速度"""
@@ -1781,20 +2199,7 @@ class PDFTranslator:
 
         try:
             # 语言代码映射
-            lang_mapping = {
-                'zh': 'zh-CN',
-                'en': 'en',
-                'ja': 'ja',
-                'ko': 'ko',
-                'fr': 'fr',
-                'de': 'de',
-                'es': 'es-ES',
-                'ru': 'ru',
-                'ar': 'ar'
-            }
-
-            normalized_target = lang_mapping.get(target_lang, target_lang)
-            normalized_source = 'auto'  # deep-translator 使用 auto
+            normalized_source, normalized_target = self._google_lang_codes(source_lang, target_lang)
 
             results = {}
             lock = threading.Lock()
@@ -1807,18 +2212,8 @@ class PDFTranslator:
                     # 清理文本
                     text = self._clean_text(text)
 
-                    # 记录输入token
-                    input_tokens = self._estimate_tokens(text)
-                    with lock:
-                        self.input_tokens += input_tokens
-
                     # 翻译
-                    translated = GoogleTranslator(source=normalized_source, target=normalized_target).translate(text)
-
-                    # 记录输出token
-                    output_tokens = self._estimate_tokens(translated)
-                    with lock:
-                        self.output_tokens += output_tokens
+                    translated = self._google_translate(text, normalized_source, normalized_target)
 
                     return (idx, translated, None)
                 except Exception as e:
@@ -1852,43 +2247,274 @@ class PDFTranslator:
             for idx, text in valid_texts:
                 try:
                     text = self._clean_text(text)
-                    translated = GoogleTranslator(source=normalized_source, target=normalized_target).translate(text)
+                    translated = self._google_translate(text, normalized_source, normalized_target)
                     results[idx] = translated
                 except Exception as e:
                     print(f'Single translation error: {e}')
                     results[idx] = text
             return [results.get(i, None) for i in range(len(valid_texts))]
 
-    def translate_pdf(self, input_path, output_path, source_lang='auto', target_lang='en', concurrency=4):
-        """翻译PDF文件（并发翻译）"""
-        import concurrent.futures
-        import threading
-        import os
+    def _extraction_workers(self, total_pages):
+        """含图页提取的进程数；小文档或单核环境返回 0，走串行路径。"""
+        if total_pages < self.PARALLEL_EXTRACTION_MIN_PAGES:
+            return 0
+        raw = os.environ.get('PDFAPP_EXTRACT_WORKERS')
+        workers = min(4, os.cpu_count() or 1)
+        if raw:
+            try:
+                workers = int(raw)
+            except ValueError:
+                print(f'[WARN] PDFAPP_EXTRACT_WORKERS 无效，使用默认值: {raw}')
+        workers = min(workers, -(-total_pages // self.EXTRACTION_SHARD_PAGES))
+        return workers if workers > 1 else 0
+
+    def _extract_page_record(self, doc, page_num, use_fast_extraction, image_digests=None, layout=True,
+                             drawings=True):
+        """提取单页，返回可跨进程传递的提取记录：纯文字页给整页文本，其余页给文本块。
+
+        整页只解析一次（一个 TextPage），文本块、span 样式、图片位置都从它导出；
+        图片位置和矢量色块一并放进记录，写回阶段直接使用，不再重新解析原页面。
+        layout=False 时不取图片位置和矢量色块（只需要文本的干跑）；drawings=False 时不取矢量色块
+        （overlay 模式保留原页面，不重画色块）。
+        块不带 seq，由调用方按页序合并时统一编号。
+        """
+        record = {
+            'page_num': page_num,
+            'has_images': False,
+            'text_page': None,
+            'blocks': [],
+            'raw_block_count': 0,
+            'page_height': None,
+            'images': None,
+            'drawings': None,
+            'error': None,
+        }
+        try:
+            page = doc[page_num]
+            record['page_height'] = page.rect.height
+            text_page = page.get_textpage(flags=fitz.TEXTFLAGS_DICT)
+            image_list = page.get_images()
+            if layout:
+                record['images'] = self._extract_page_images(page, text_page, image_digests, image_list)
+                record['drawings'] = self._extract_page_drawings(page) if drawings else []
+            record['has_images'] = bool(image_list)
+
+            if not record['has_images']:
+                page_text = self._clean_text(text_page.extractText())
+                if page_text and page_text.strip() and self._is_translatable(page_text):
+                    record['text_page'] = {
+                        'page_num': page_num,
+                        'text': page_text
+                    }
+                    return record
+
+            text_dict = text_page.extractDICT()
+            if use_fast_extraction:
+                # 与 get_text("blocks") 相同的块（含图片块，保证 block_idx 编号不变），但复用同一份 dict
+                blocks = [
+                    tuple(block['bbox']) + (
+                        ''.join(''.join(span['text'] for span in line['spans']) + '\n' for line in block.get('lines', [])),
+                        block['number'],
+                        block['type'],
+                    )
+                    for block in text_dict.get('blocks', [])
+                ]
+                blocks.sort(key=lambda b: (b[1], b[0]))
+                page_blocks = []
+                span_hints = self._extract_span_style_hints(page, text_dict)
+
+                for block_idx, block in enumerate(blocks):
+                    if block[6] != 0:
+                        continue
 
-        # 调试：打印并发参数
-        print(f"[DEBUG] translate_pdf called with concurrency={concurrency}")
+                    text = self._normalize_extracted_block_text(block[4])
+                    if not text or not text.strip() or not self._is_translatable(text):
+                        continue
 
-        doc = None
-        try:
-            self._emit_strategy_notice_once()
-            self._add_log('========== 开始翻译任务 ==========', 'info')
-            self._add_log(f'使用文本块级并发翻译，{concurrency} 个线程同时工作 ⚡', 'success')
-            self._add_log(
-                f'翻译策略: mode={self._effective_translation_mode()} audience={self.audience} style={self.style}',
-                'info'
-            )
+                    try:
+                        rect = fitz.Rect(block[0], block[1], block[2], block[3])
+                    except Exception as rect_err:
+                        print(f'[WARN] 第{page_num+1}页块{block_idx}坐标异常: {rect_err}')
+                        continue
 
-            # 检查文件是否存在
-            self._add_log(f'输入文件: {input_path}', 'info')
-            self._add_log(f'输出文件: {output_path}', 'info')
+                    page_blocks.append({
+                        'page_num': page_num,
+                        'block_idx': block_idx,
+                        'text': text,
+                        'rect': rect,
+                        'font_info': {}
+                    })
 
-            # 检查文件大小
-            self._add_log('正在检查文件大小...', 'info')
-            file_size = os.path.getsize(input_path)
-            file_size_mb = file_size / (1024 * 1024)
-            self._add_log(f'文件大小: {file_size_mb:.2f} MB', 'info')
+                page_blocks = self._apply_block_style_hints(page_blocks, span_hints)
+                record['raw_block_count'] = len(page_blocks)
+                is_toc_page = self._is_toc_like_page(page_blocks)
+                if is_toc_page:
+                    merged_page_blocks = page_blocks
+                else:
+                    merged_page_blocks = self._merge_page_blocks_for_translation(page_num, page_blocks)
+                for merged_block in merged_page_blocks:
+                    if is_toc_page:
+                        merged_block['font_info']['layout_hint'] = 'toc'
+                    else:
+                        merged_block['font_info']['layout_hint'] = self._classify_block_for_merge(merged_block)['kind']
+                record['blocks'] = merged_page_blocks
+                return record
 
-            # 打开原始PDF
+            # 小文件保留 span 级字体信息，提升写回质量。
+            raw_page_blocks = []
+
+            block_idx = 0
+            for block in text_dict['blocks']:
+                if block['type'] != 0:
+                    continue
+
+                spans_data = []
+                block_text = ""
+                for line in block['lines']:
+                    for span in line['spans']:
+                        text = self._normalize_extracted_block_text(span['text'])
+                        block_text += text
+                        spans_data.append({
+                            'text': text,
+                            'font': span['font'],
+                            'size': span['size'],
+                            'flags': span['flags'],
+                            'color': span['color']
+                        })
+
+                if not block_text or not block_text.strip() or not self._is_translatable(block_text):
+                    continue
+
+                try:
+                    rect = fitz.Rect(block['bbox'])
+                except Exception as rect_err:
+                    print(f'[WARN] 第{page_num+1}页块{block_idx}坐标异常: {rect_err}')
+                    continue
+
+                first_span = spans_data[0] if spans_data else None
+                layout_hint = self._classify_block_for_merge({
+                    'text': block_text,
+                    'rect': rect,
+                    'font_info': {}
+                })['kind']
+                font_info = {
+                    'font': first_span['font'] if first_span else 'helv',
+                    'size': first_span['size'] if first_span else 11,
+                    'flags': first_span['flags'] if first_span else 0,
+                    'color': first_span['color'] if first_span else 0,
+                    'spans': spans_data,
+                    'layout_hint': layout_hint,
+                }
+
+                raw_page_blocks.append({
+                    'page_num': page_num,
+                    'block_idx': block_idx,
+                    'text': block_text,
+                    'rect': rect,
+                    'font_info': font_info
+                })
+                block_idx += 1
+
+            if raw_page_blocks and self._is_toc_like_page(raw_page_blocks):
+                for block_entry in raw_page_blocks:
+                    block_entry['font_info']['layout_hint'] = 'toc'
+            record['blocks'] = raw_page_blocks
+        except Exception as page_err:
+            record['error'] = str(page_err)
+            record['blocks'] = []
+        return record
+
+    def _iter_page_records(self, doc, input_path, total_pages, use_fast_extraction, drawings=True):
+        """按页序逐页产出提取记录。
+
+        大文档按页段分片交给进程池，每个 worker 自己打开文档，绕开 GIL；
+        进程池不可用时从未产出的页开始退回串行提取，结果与串行路径一致。
+        """
+        next_page = 0
+        workers = self._extraction_workers(total_pages)
+        if workers:
+            shard_pages = self.EXTRACTION_SHARD_PAGES
+            page_ranges = [(start, min(start + shard_pages, total_pages)) for start in range(0, total_pages, shard_pages)]
+            self._add_log(f'并行提取: {workers} 个进程，{len(page_ranges)} 个页段', 'info')
+            executor = None
+            try:
+                # 用 spawn 启动 worker：Web 进程里有多个线程，fork 可能继承被占用的锁
+                executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                futures = [
+                    executor.submit(_extract_page_range, input_path, start, end, use_fast_extraction, drawings)
+                    for start, end in page_ranges
+                ]
+                for future in futures:
+                    for record in future.result():
+                        yield record
+                        next_page = record['page_num'] + 1
+            except Exception as e:
+                self._add_log(f'并行提取不可用，从第 {next_page + 1} 页起改为串行提取: {e}', 'error')
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+        image_digests = {}
+        for page_num in range(next_page, total_pages):
+            yield self._extract_page_record(doc, page_num, use_fast_extraction, image_digests, drawings=drawings)
+
+    def _is_untranslated_fallback(self, source_text, translated_text):
+        """服务调用失败回退的原文（FallbackText）或空译文：不写入翻译记忆和断点日志，续传时重新翻译。
+
+        只看失败标记，不比较文本：与原文相同的译文可能是正常结果。
+        """
+        if isinstance(translated_text, FallbackText):
+            return True
+        return not translated_text or not translated_text.strip()
+
+    def _open_job_journal(self, input_path, output_path, kind, source_lang, target_lang, resume):
+        """在输出目录（任务工作区）打开断点日志，键为输入文件哈希 + 翻译设置。"""
+        try:
+            settings = (kind, source_lang, target_lang) + self._translation_memory_scope()
+            job_key = build_job_key(input_path, settings)
+            journal = JobJournal(journal_path_for(os.path.dirname(output_path), job_key), job_key, resume=resume)
+        except OSError as e:
+            self._add_log(f'断点日志不可用，本次任务无法续传: {e}', 'error')
+            return None
+        if journal.resumed_count:
+            self._add_log(f'断点续传：已恢复 {journal.resumed_count} 个已完成的翻译单元', 'success')
+        elif resume:
+            self._add_log('未找到可用的断点，从头开始翻译', 'info')
+        return journal
+
+    def translate_pdf(self, input_path, output_path, source_lang='auto', target_lang='en', concurrency=4, resume=False,
+                      preview=False):
+        """翻译PDF文件（并发翻译）；resume=True 时从输出目录里的断点日志续传"""
+        import concurrent.futures
+        import threading
+        import os
+
+        doc = None
+        journal = None
+        output_writer = None
+        try:
+            self._emit_strategy_notice_once()
+            self._add_log('========== 开始翻译任务 ==========', 'info')
+            self._add_log(f'使用文本块级并发翻译，{concurrency} 个线程同时工作 ⚡', 'success')
+            self._add_log(
+                f'翻译策略: mode={self._effective_translation_mode()} audience={self.audience} style={self.style}',
+                'info'
+            )
+
+            # 检查文件是否存在
+            self._add_log(f'输入文件: {input_path}', 'info')
+            self._add_log(f'输出文件: {output_path}', 'info')
+
+            # 检查文件大小
+            self._add_log('正在检查文件大小...', 'info')
+            file_size = os.path.getsize(input_path)
+            file_size_mb = file_size / (1024 * 1024)
+            self._add_log(f'文件大小: {file_size_mb:.2f} MB', 'info')
+
+            # 打开原始PDF
             self._add_log('正在打开PDF文件...', 'info')
             start_time = time.time()
             translation_start_time = start_time
@@ -1903,25 +2529,13 @@ class PDFTranslator:
 
             total_pages = len(doc)
             self._add_log(f'PDF总页数: {total_pages} 页', 'info')
+            journal = self._open_job_journal(input_path, output_path, 'pdf', source_lang, target_lang, resume)
 
             # 每N页记录一次日志
             log_interval = max(1, total_pages // 10)
 
-            # 语言代码映射
-            lang_mapping = {
-                'zh': 'zh-CN',
-                'en': 'en',
-                'ja': 'ja',
-                'ko': 'ko',
-                'fr': 'fr',
-                'de': 'de',
-                'es': 'es',
-                'ru': 'ru',
-                'ar': 'ar'
-            }
-
-            normalized_target = lang_mapping.get(target_lang, target_lang)
-            normalized_source = 'auto' if source_lang == 'auto' else lang_mapping.get(source_lang, source_lang)
+            # Google 路径使用的语言代码
+            normalized_source, normalized_target = self._google_lang_codes(source_lang, target_lang)
 
             # 使用用户设置的并发数
             self._add_log(f'📖 开始提取和翻译（并发数: {concurrency}）...', 'info')
@@ -1934,161 +2548,33 @@ class PDFTranslator:
             page_translations_map = {}
             text_page_results = {}
             page_has_images = {}
+            # 提取记录里的图片位置和矢量色块，写回该页时取出
+            page_layouts = {}
+            render_image_digests = {}
             text_only_pages = []
             extraction_start_time = time.time()
             raw_image_page_blocks = 0
-
-            # 收集需要保真翻译的含图页文本块，以及纯文字页整页文本
             all_blocks = []
-            for page_num in range(total_pages):
-                try:
-                    page = doc[page_num]
-                    image_count = len(page.get_images())
-                    page_has_images[page_num] = image_count > 0
-
-                    if not page_has_images[page_num]:
-                        page_text = self._clean_text(page.get_text("text"))
-                        if page_text and page_text.strip() and self._is_translatable(page_text):
-                            text_only_pages.append({
-                                'page_num': page_num,
-                                'text': page_text
-                            })
-                            continue
-
-                    if use_fast_extraction:
-                        blocks = page.get_text("blocks")
-                        blocks.sort(key=lambda b: (b[1], b[0]))
-                        page_blocks = []
-                        span_hints = self._extract_span_style_hints(page)
-
-                        for block_idx, block in enumerate(blocks):
-                            if block[6] != 0:
-                                continue
-
-                            text = self._normalize_extracted_block_text(block[4])
-                            if not text or not text.strip() or not self._is_translatable(text):
-                                continue
-
-                            try:
-                                rect = fitz.Rect(block[0], block[1], block[2], block[3])
-                            except Exception as rect_err:
-                                print(f'[WARN] 第{page_num+1}页块{block_idx}坐标异常: {rect_err}')
-                                continue
-
-                            page_blocks.append({
-                                'page_num': page_num,
-                                'block_idx': block_idx,
-                                'text': text,
-                                'rect': rect,
-                                'font_info': {}
-                            })
-
-                        page_blocks = self._apply_block_style_hints(page_blocks, span_hints)
-                        raw_image_page_blocks += len(page_blocks)
-                        is_toc_page = self._is_toc_like_page(page_blocks)
-                        if is_toc_page:
-                            merged_page_blocks = page_blocks
-                        else:
-                            merged_page_blocks = self._merge_page_blocks_for_translation(page_num, page_blocks)
-                        for merged_block in merged_page_blocks:
-                            if is_toc_page:
-                                merged_block['font_info']['layout_hint'] = 'toc'
-                            else:
-                                merged_block['font_info']['layout_hint'] = self._classify_block_for_merge(merged_block)['kind']
-                            merged_block['seq'] = len(all_blocks)
-                            all_blocks.append(merged_block)
-                    else:
-                        # 小文件保留 span 级字体信息，提升写回质量。
-                        text_dict = page.get_text("dict")
-                        raw_page_blocks = []
-
-                        block_idx = 0
-                        for block in text_dict['blocks']:
-                            if block['type'] != 0:
-                                continue
-
-                            spans_data = []
-                            block_text = ""
-                            for line in block['lines']:
-                                for span in line['spans']:
-                                    text = self._normalize_extracted_block_text(span['text'])
-                                    block_text += text
-                                    spans_data.append({
-                                        'text': text,
-                                        'font': span['font'],
-                                        'size': span['size'],
-                                        'flags': span['flags'],
-                                        'color': span['color']
-                                    })
-
-                            if not block_text or not block_text.strip() or not self._is_translatable(block_text):
-                                continue
-
-                            try:
-                                rect = fitz.Rect(block['bbox'])
-                            except Exception as rect_err:
-                                print(f'[WARN] 第{page_num+1}页块{block_idx}坐标异常: {rect_err}')
-                                continue
-
-                            first_span = spans_data[0] if spans_data else None
-                            layout_hint = self._classify_block_for_merge({
-                                'text': block_text,
-                                'rect': rect,
-                                'font_info': {}
-                            })['kind']
-                            font_info = {
-                                'font': first_span['font'] if first_span else 'helv',
-                                'size': first_span['size'] if first_span else 11,
-                                'flags': first_span['flags'] if first_span else 0,
-                                'color': first_span['color'] if first_span else 0,
-                                'spans': spans_data,
-                                'layout_hint': layout_hint,
-                            }
-
-                            block_entry = {
-                                'page_num': page_num,
-                                'block_idx': block_idx,
-                                'seq': len(all_blocks),
-                                'text': block_text,
-                                'rect': rect,
-                                'font_info': font_info
-                            }
-                            raw_page_blocks.append(block_entry)
-                            all_blocks.append(block_entry)
-                            block_idx += 1
-
-                        if raw_page_blocks and self._is_toc_like_page(raw_page_blocks):
-                            for block_entry in raw_page_blocks:
-                                block_entry['font_info']['layout_hint'] = 'toc'
-                except Exception as page_err:
-                    self._add_log(f'第{page_num+1}页文本提取失败（已跳过）: {page_err}', 'error')
-                    continue
-
-            extraction_elapsed = time.time() - extraction_start_time
-            total_blocks = len(all_blocks)
-            total_text_pages = len(text_only_pages)
-            total_translation_units = total_blocks + total_text_pages
-            self._add_log(f'纯文字页: {total_text_pages} 页，含图/保真页文本块: {total_blocks} 个', 'info')
-            if raw_image_page_blocks:
-                self._add_log(f'含图页块合并: {raw_image_page_blocks} -> {total_blocks}', 'info')
-            self._add_log(f'文本提取完成 (耗时: {extraction_elapsed:.1f}秒)', 'info')
-
-            # 并发翻译所有文本块
-            self._add_log('=' * 60, 'info')
-            self._add_log('开始调用翻译API...', 'info')
+            # 页号 -> 该页的文本块；写回时按页取块，不再扫描 all_blocks
+            page_blocks_map = {}
 
+            # 翻译单元在提取过程中陆续产生，总数随提取推进更新（提取结束后为准确值）
             completed_count = [0]
             lock = threading.Lock()
-            text_page_runs = self._build_text_page_runs(text_only_pages, max_chars=12000)
-            self._add_log(f'纯文字页合并为 {len(text_page_runs)} 个跨页翻译批次', 'info')
+            total_blocks = 0
+            total_text_pages = 0
+            total_translation_units = 0
+            extraction_finished = False
 
             def _calc_remaining(elapsed, done, total):
                 if done <= 0:
                     return 0
                 return (elapsed / done) * (total - done)
 
+            TEXT_PAGE_SEPARATOR = "\n__PAGE_BREAK__\n"
+
             def translate_text_page_run(run):
-                page_separator = "\n__PAGE_BREAK__\n"
+                page_separator = TEXT_PAGE_SEPARATOR
                 page_numbers = [item['page_num'] + 1 for item in run]
                 combined = page_separator.join(item['text'] for item in run)
                 api_start_time = time.time()
@@ -2100,7 +2586,10 @@ class PDFTranslator:
                 else:
                     translated_combined = self._translate_text(combined, source_lang, target_lang)
 
-                parts = translated_combined.split(page_separator)
+                if isinstance(translated_combined, FallbackText):
+                    parts = [FallbackText(item['text']) for item in run]
+                else:
+                    parts = translated_combined.split(page_separator)
                 if len(parts) != len(run):
                     parts = []
                     for item in run:
@@ -2109,7 +2598,7 @@ class PDFTranslator:
                             translated = self._translate_text_google(text, source_lang, target_lang)
                         else:
                             translated = self._translate_text(text, source_lang, target_lang)
-                        parts.append(translated if translated else text)
+                        parts.append(translated if translated else FallbackText(text))
 
                 api_time = time.time() - api_start_time
 
@@ -2118,6 +2607,8 @@ class PDFTranslator:
                         page_num = item['page_num']
                         translated_text = parts[idx] if idx < len(parts) else item['text']
                         text_page_results[page_num] = translated_text
+                        if idx < len(parts):
+                            self._translation_cache[(item['text'], source_lang, target_lang)] = translated_text
                         current = completed_count[0] + 1
                         if self._should_emit_detail_log(current, total_translation_units):
                             self._add_log(
@@ -2143,30 +2634,42 @@ class PDFTranslator:
                     'info'
                 )
 
-            if self.api_type == 'google':
-                groups = self._group_short_blocks(all_blocks, max_group_chars=4000, short_threshold=500)
-                batch_count = sum(1 for t, _ in groups if t == 'batch' and len(_) > 1)
-                single_count = len(groups) - batch_count
-                self._add_log(f'文本块分组完成：{single_count} 个单独翻译，{batch_count} 个批次合并翻译', 'info')
-            elif self.api_type == 'openrouter':
-                groups = self._group_short_blocks(all_blocks, max_group_chars=1800, short_threshold=220)
-                batch_count = sum(1 for t, blocks in groups if t == 'batch' and len(blocks) > 1)
-                single_count = len(groups) - batch_count
-                self._add_log(
-                    f'文本块分组完成：{single_count} 个单独翻译，{batch_count} 个 OpenRouter 结构化批次',
-                    'info'
-                )
-            else:
-                groups = [('single', [block]) for block in all_blocks]
-                self._add_log(
-                    f'文本块分组完成：{len(groups)} 个独立翻译单元（LLM 模式禁用二次批次，避免分隔符丢失回退）',
-                    'info'
-                )
-
             results = {}
+            tm_hits = [0]
             BATCH_SEPARATOR = "\n---SPLIT---\n"
 
             def translate_unit(unit):
+                """翻译一个工作单元：先用翻译记忆补齐命中的块，只把未命中的块交给 API。"""
+                group_type, blocks = unit
+                cached_pairs = []
+                pending_blocks = []
+                for block_info in blocks:
+                    cached = self._translation_cache.get(
+                        (self._clean_text(block_info['text']), source_lang, target_lang)
+                    )
+                    if cached is not None:
+                        cached_pairs.append((block_info, cached))
+                    else:
+                        pending_blocks.append(block_info)
+
+                if cached_pairs:
+                    with lock:
+                        tm_hits[0] += len(cached_pairs)
+                        completed_count[0] += len(cached_pairs)
+                        elapsed_time = time.time() - translation_start_time
+                        current = completed_count[0]
+                        est_remaining = _calc_remaining(elapsed_time, current, total_translation_units)
+                        if self._should_emit_progress_update(current, total_translation_units):
+                            self._update_progress(
+                                current, total_translation_units,
+                                f'已翻译 {current}/{total_translation_units} 个单元...',
+                                elapsed_time=elapsed_time, estimated_remaining=est_remaining
+                            )
+                if not pending_blocks:
+                    return cached_pairs
+                return cached_pairs + translate_uncached_unit((group_type, pending_blocks))
+
+            def translate_uncached_unit(unit):
                 """翻译一个工作单元（单块或批次短文本块）"""
                 group_type, blocks = unit
                 api_start_time = time.time()
@@ -2180,6 +2683,7 @@ class PDFTranslator:
                         translated = self._strict_translate_text(text, source_lang, target_lang)
                     translated = self._normalize_translated_text(translated)
                     with lock:
+                        self._translation_cache[(text, source_lang, target_lang)] = translated
                         current_num = block_info.get('seq', 0) + 1
                         if self._should_emit_detail_log(current_num, total_blocks):
                             display_original = text[:200] + '...' if len(text) > 200 else text
@@ -2213,27 +2717,31 @@ class PDFTranslator:
 
                     try:
                         self._check_cancelled()
-                        input_tokens = self._estimate_tokens(combined)
 
                         if self.api_type == 'google':
-                            combined_translated = GoogleTranslator(
-                                source=normalized_source, target=normalized_target
-                            ).translate(combined)
-                        elif self.api_type == 'openrouter':
-                            parts = self._translate_text_openrouter_batch(texts, source_lang, target_lang)
-                            combined_translated = None
+                            combined_translated = self._google_translate(
+                                combined, normalized_source, normalized_target, phase='batch'
+                            )
+                            parts = combined_translated.split(BATCH_SEPARATOR)
                         else:
-                            combined_translated = self._translate_text(combined, source_lang, target_lang)
+                            parts = self._translate_text_chat_batch(texts, source_lang, target_lang)
 
                         api_time = time.time() - api_start_time
-                        output_tokens = self._estimate_tokens(combined_translated) if combined_translated is not None else sum(
-                            self._estimate_tokens(part) for part in parts if part
-                        )
 
                         # 拆分结果；如数量不匹配则逐一翻译（不回退原文）
-                        if self.api_type != 'openrouter':
-                            parts = combined_translated.split(BATCH_SEPARATOR)
                         missing_indexes = [i for i, part in enumerate(parts) if not part]
+                        if len(missing_indexes) > 1 and len(parts) == len(blocks) and self.api_type != 'google':
+                            # 结构化批次缺多项时，先把缺项合成一个小批次补翻一次，剩下的再逐项补翻
+                            try:
+                                recovered = self._translate_text_chat_batch(
+                                    [texts[i] for i in missing_indexes], source_lang, target_lang
+                                )
+                                for missing_idx, part in zip(missing_indexes, recovered):
+                                    if part:
+                                        parts[missing_idx] = part
+                            except Exception as e:
+                                print(f'[WARN] 批次缺项补翻失败，改为逐项补翻: {str(e)[:120]}')
+                            missing_indexes = [i for i, part in enumerate(parts) if not part]
                         if len(parts) != len(blocks):
                             print(f'[WARN] 批次拆分不匹配: 期望 {len(blocks)}, 实际 {len(parts)}，逐一翻译回退')
                             parts = []
@@ -2241,26 +2749,22 @@ class PDFTranslator:
                             for t in texts:
                                 try:
                                     if self.api_type == 'google':
-                                        tr = GoogleTranslator(
-                                            source=normalized_source, target=normalized_target
-                                        ).translate(t)
+                                        tr = self._google_translate(t, normalized_source, normalized_target)
                                     else:
                                         tr = self._translate_text(t, source_lang, target_lang)
-                                    parts.append(tr if tr else t)
+                                    parts.append(tr if tr else FallbackText(t))
                                 except Exception:
-                                    parts.append(t)
+                                    parts.append(FallbackText(t))
                         elif missing_indexes:
                             print(f'[WARN] 批次返回缺少 {len(missing_indexes)} 项，执行局部补翻')
                             for missing_idx in missing_indexes:
                                 try:
                                     if self.api_type == 'google':
-                                        parts[missing_idx] = GoogleTranslator(
-                                            source=normalized_source, target=normalized_target
-                                        ).translate(texts[missing_idx])
+                                        parts[missing_idx] = self._google_translate(texts[missing_idx], normalized_source, normalized_target)
                                     else:
                                         parts[missing_idx] = self._translate_text(texts[missing_idx], source_lang, target_lang)
                                 except Exception:
-                                    parts[missing_idx] = texts[missing_idx]
+                                    parts[missing_idx] = FallbackText(texts[missing_idx])
 
                         final_parts = []
                         for i, translated in enumerate(parts):
@@ -2282,8 +2786,6 @@ class PDFTranslator:
                                 cache_key = (texts[i], source_lang, target_lang)
                                 self._translation_cache[cache_key] = translated
 
-                            self.input_tokens += input_tokens
-                            self.output_tokens += output_tokens
                             completed_count[0] += len(blocks)
 
                             elapsed_time = time.time() - translation_start_time
@@ -2306,7 +2808,7 @@ class PDFTranslator:
                                 fallback_parts.append(self._strict_translate_text(text, source_lang, target_lang))
                             except Exception as strict_err:
                                 self._add_log(f'批次块严格重翻失败，保留原文: {str(strict_err)[:120]}', 'error')
-                                fallback_parts.append(text)
+                                fallback_parts.append(FallbackText(text))
                         with lock:
                             completed_count[0] += len(blocks)
                             elapsed_time = time.time() - translation_start_time
@@ -2330,8 +2832,8 @@ class PDFTranslator:
 
                         # 检查缓存
                         cache_key = (text, source_lang, target_lang)
-                        if cache_key in self._translation_cache:
-                            translated = self._translation_cache[cache_key]
+                        translated = self._translation_cache.get(cache_key)
+                        if translated is not None:
                             with lock:
                                 current_num = block_info.get('seq', 0) + 1
                                 if self._should_emit_detail_log(current_num, total_blocks):
@@ -2357,19 +2859,14 @@ class PDFTranslator:
                                 display_original = text[:200] + '...' if len(text) > 200 else text
                                 self._add_log(f'[原文 {current_num}/{total_blocks}] {display_original}', 'info')
 
-                        input_tokens = self._estimate_tokens(text)
-
                         if self.api_type == 'google':
-                            translated = GoogleTranslator(
-                                source=normalized_source, target=normalized_target
-                            ).translate(text)
+                            translated = self._google_translate(text, normalized_source, normalized_target)
                         else:
                             translated = self._translate_text(text, source_lang, target_lang)
                         translated = self._ensure_target_translation(
                             text, translated, source_lang, target_lang
                         )
 
-                        output_tokens = self._estimate_tokens(translated)
                         api_time = time.time() - api_start_time
 
                         with lock:
@@ -2379,8 +2876,6 @@ class PDFTranslator:
                                     f'[译文 {current_num}/{total_blocks}] {display_translated} (耗时: {api_time:.1f}s)',
                                     'success'
                                 )
-                            self.input_tokens += input_tokens
-                            self.output_tokens += output_tokens
                             self._translation_cache[cache_key] = translated
                             completed_count[0] += 1
 
@@ -2418,43 +2913,45 @@ class PDFTranslator:
                                         f'已翻译 {current}/{total_translation_units} 个单元...',
                                         elapsed_time=elapsed_time, estimated_remaining=est_remaining
                                     )
-                            return [(block_info, block_info['text'])]
+                            return [(block_info, FallbackText(block_info['text']))]
                         else:
                             time.sleep(0.5 * (2 ** attempt))  # 指数退避
 
-            if text_page_runs:
-                with concurrent.futures.ThreadPoolExecutor(max_workers=min(concurrency, max(1, len(text_page_runs)))) as executor:
-                    futures = [executor.submit(translate_text_page_run, run) for run in text_page_runs]
-                    for future in concurrent.futures.as_completed(futures):
-                        try:
-                            future.result()
-                        except Exception as e:
-                            print(f'Text-page future error: {e}')
-
-            # 使用用户设置的并发数翻译（以 group 为并发单元）
-            if groups:
-                with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
-                    futures = {executor.submit(translate_unit, group): group for group in groups}
-
-                    for future in concurrent.futures.as_completed(futures):
-                        try:
-                            block_results = future.result()
-                            for block_info, translated_text in block_results:
-                                results[(block_info['page_num'], block_info['block_idx'])] = (
-                                    block_info['rect'], translated_text
-                                )
-                        except Exception as e:
-                            print(f'Future error: {e}')
+            # 译文按页写回：每页的翻译单元全部返回后立即写入新文档
+            self._add_log('正在将译文写回PDF...', 'info')
+            total_written = 0
+            overlay = self.render_mode == 'overlay'
 
-            self._add_log(f'✓ 所有文本块翻译完成', 'success')
-            print(f'[DEBUG] results字典包含 {len(results)} 个翻译结果')
+            if overlay:
+                # 方法：原样复制原页面，用涂抹注释去掉译文所在区域的原文，再写入翻译；
+                # 图片流和矢量图形不解码、不重新嵌入
+                self._add_log('将在原页面上涂抹原文并叠加翻译，图片和矢量图形原样保留', 'info')
+            else:
+                # 方法：创建新文档，复制原页面的图片和图形，然后只添加翻译后的文本
+                # 这样可以彻底移除原文，同时保留图片和排版
+                self._add_log('将彻底移除原文并插入翻译，保留图片和排版格式', 'info')
+                self._add_log('正在创建新文档（保留图片，移除原文）...', 'info')
+            # 字号拟合：预排版次数按文本块统计，insert_textbox 正常情况下每块只调用一次
+            text_fitter = TextFitter(dict(self.SYSTEM_FONT_CANDIDATES))
+            fit_blocks = [0]
+            textbox_calls = [0]
+            # 输出按页段分片存盘、最后合并；预览任务的分片写在预览目录，任务进行中即可通过 /preview 查看
+            if preview:
+                chunk_dir = preview_dir_for(os.path.dirname(output_path))
+            else:
+                chunk_dir = output_path + '.parts'
+            try:
+                output_writer = ChunkedPdfWriter(chunk_dir, interval=PREVIEW_INTERVAL if preview else None)
+            except OSError as e:
+                print(f'[WARN] 无法创建分片目录，本任务不分片保存、不输出预览: {e}')
+                preview = False
+                output_writer = ChunkedPdfWriter(None)
 
-            # 按页组织翻译结果并显示
-            # 只显示前3页和后3页的译文，避免日志过多
-            self._add_log('=' * 60, 'info')
+            # 写回时按页输出译文，只显示前3页和后3页，避免日志过多
             self._add_log('翻译结果（前3页和后3页）：', 'info')
 
-            for page_num in range(total_pages):
+            def collect_page_translations(page_num):
+                """把某页已返回的译文整理进 page_translations_map，并输出首尾页预览日志。"""
                 page_translations = []
 
                 if page_num in text_page_results:
@@ -2464,13 +2961,13 @@ class PDFTranslator:
                         if len(text_page_results[page_num]) > 200:
                             preview += '...'
                         self._add_log(f'[页{page_num + 1}|整页文本] 译文: {preview}', 'success')
-                    continue
+                    return
 
                 # 获取这一页的所有文本块
-                page_blocks = [b for b in all_blocks if b['page_num'] == page_num]
+                page_blocks = page_blocks_map.get(page_num, [])
 
                 if not page_blocks:
-                    continue
+                    return
 
                 # 跳过中间页面的详细显示
                 if page_num < 3 or page_num >= total_pages - 3:
@@ -2500,56 +2997,54 @@ class PDFTranslator:
                     detail = '整页文本' if isinstance(page_translations_map[page_num], str) else f'{len(page_translations)} 个文本块'
                     self._add_log(f'--- 第 {page_num + 1} 页（已跳过，{detail}） ---', 'info')
 
-            self._add_log(f'✓ 所有页面翻译完成', 'success')
-
-            # 将翻译结果写回PDF
-            self._add_log('正在将译文写回PDF...', 'info')
-            self._add_log('将彻底移除原文并插入翻译，保留图片和排版格式', 'info')
-
-            print(f'[DEBUG] page_translations_map包含 {len(page_translations_map)} 页')
-            total_written = 0
-
-            # 方法：创建新文档，复制原页面的图片和图形，然后只添加翻译后的文本
-            # 这样可以彻底移除原文，同时保留图片和排版
-
-            self._add_log('正在创建新文档（保留图片，移除原文）...', 'info')
-            new_doc = fitz.open()
-            inserted_image_xrefs = {}
-
-            for page_num in range(total_pages):
+            def render_page(page_num):
+                """把一页写入当前输出分片；调用方保证按页序、且该页译文已全部返回。"""
+                nonlocal total_written
                 self._check_cancelled()
 
                 try:
                     page = doc[page_num]
                     page_translations = page_translations_map.get(page_num, [])
+                    document_fonts = self._document_fonts(output_writer)
+                    new_doc = output_writer.doc
 
-                    # 某些 PDF 在取尺寸或旋转时会抛出异常，直接跳过该页。
-                    mediabox = page.mediabox
-                    rotation = page.rotation
-                    new_page = new_doc.new_page(
-                        width=mediabox.width,
-                        height=mediabox.height
-                    )
+                    if overlay:
+                        new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+                        new_page = new_doc[-1]
+                        self._redact_original_text(new_page, page_translations)
+                    else:
+                        # 某些 PDF 在取尺寸或旋转时会抛出异常，直接跳过该页。
+                        mediabox = page.mediabox
+                        rotation = page.rotation
+                        new_page = new_doc.new_page(
+                            width=mediabox.width,
+                            height=mediabox.height
+                        )
 
-                    if rotation and rotation in (90, 180, 270):
-                        new_page.set_rotation(rotation)
-                    new_page.draw_rect(new_page.rect, color=(1, 1, 1), fill=(1, 1, 1))
-                    page_registered_fonts = self._register_page_fonts(new_page)
-                    self._copy_vector_drawings(page, new_page)
+                        if rotation and rotation in (90, 180, 270):
+                            new_page.set_rotation(rotation)
+                        new_page.draw_rect(new_page.rect, color=(1, 1, 1), fill=(1, 1, 1))
+                    page_registered_fonts = document_fonts.register(new_page)
+                    # 提取阶段已经取好图片位置和矢量色块；提取失败的页才回头解析原页面
+                    page_layout = page_layouts.pop(page_num, None)
+                    if page_layout is None:
+                        page_layout = (
+                            self._extract_page_images(page, image_digests=render_image_digests),
+                            [] if overlay else self._extract_page_drawings(page),
+                        )
+                    page_images, page_drawings = page_layout
+                    if not overlay:
+                        self._copy_vector_drawings(page_drawings, new_page)
                 except Exception as page_setup_err:
                     self._add_log(f'第{page_num+1}页初始化失败（已跳过）: {page_setup_err}', 'error')
-                    continue
+                    return
 
                 if isinstance(page_translations, str):
                     translated_page_text = self._normalize_translated_text(page_translations)
-                    image_top_band = 0
-                    try:
-                        image_top_band = max(
-                            (rect.y1 for img in page.get_images() for rect in page.get_image_rects(img[0]) if rect.y0 <= 5),
-                            default=0
-                        )
-                    except Exception:
-                        image_top_band = 0
+                    image_top_band = max(
+                        (rect.y1 for _, img_rects in page_images for rect in img_rects if rect.y0 <= 5),
+                        default=0
+                    )
                     margin = 36
                     top_margin = max(margin, image_top_band + 20)
                     text_rect = fitz.Rect(
@@ -2565,28 +3060,29 @@ class PDFTranslator:
                     font_candidates = self._build_font_candidates(
                         page_registered_fonts, translated_page_text, 'helv', False, False, has_cjk_chars
                     )
-                    font_sizes = [12, 11.5, 11, 10.5, 10, 9, 8]
                     lineheight = 0.97 if has_cjk_chars else None
                     written = False
 
                     for font_name in font_candidates:
-                        for fontsize in font_sizes:
-                            try:
-                                result = new_page.insert_textbox(
-                                    text_rect,
-                                    translated_page_text,
-                                    fontsize=fontsize,
-                                    fontname=font_name,
-                                    lineheight=lineheight,
-                                    color=(0, 0, 0),
-                                    align=0
-                                )
-                                if result >= 0:
-                                    written = True
-                                    break
-                            except Exception:
-                                break
-                        if written:
+                        fitted = text_fitter.fit(font_name, translated_page_text, [text_rect], 12, 8, lineheight)
+                        if fitted is None:
+                            continue
+                        fontsize, _ = fitted
+                        textbox_calls[0] += 1
+                        try:
+                            result = new_page.insert_textbox(
+                                text_rect,
+                                translated_page_text,
+                                fontsize=fontsize,
+                                fontname=font_name,
+                                lineheight=lineheight,
+                                color=(0, 0, 0),
+                                align=0
+                            )
+                        except Exception:
+                            continue
+                        if result >= 0:
+                            written = True
                             break
 
                     if written:
@@ -2596,26 +3092,14 @@ class PDFTranslator:
                     else:
                         self._add_log(f'⚠️ 第{page_num + 1}页整页文本写入失败', 'error')
 
-                    elapsed_time = time.time() - translation_start_time
-                    done_pages = page_num + 1
-                    est_remaining = _calc_remaining(elapsed_time, done_pages, total_pages)
-                    self._update_progress(
-                        done_pages,
-                        total_pages,
-                        f'已写入 {done_pages}/{total_pages} 页',
-                        elapsed_time=elapsed_time,
-                        estimated_remaining=est_remaining
-                    )
-                    continue
+                    report_render_progress(page_num)
+                    return
 
-                # 复制原页面的所有图片
+                # 复制原页面的所有图片（overlay 模式下图片本来就在原页面上）
                 try:
-                    image_list = page.get_images()
-                    for img in image_list:
+                    for xref, img_rects in ([] if overlay else page_images):
                         try:
-                            xref = img[0]
-                            img_rects = page.get_image_rects(xref)
-                            cached_xref = inserted_image_xrefs.get(xref)
+                            cached_xref = output_writer.xref_cache.get(xref)
                             if cached_xref is None:
                                 image_info = doc.extract_image(xref)
                                 image_bytes = image_info.get('image')
@@ -2630,7 +3114,7 @@ class PDFTranslator:
                                     stream=image_bytes,
                                     alpha=1 if has_alpha else 0
                                 )
-                                inserted_image_xrefs[xref] = cached_xref
+                                output_writer.xref_cache[xref] = cached_xref
                         except Exception as img_err:
                             print(f'[DEBUG] 图片复制失败(页{page_num+1}): {str(img_err)[:50]}')
                 except Exception as e:
@@ -2639,7 +3123,7 @@ class PDFTranslator:
                 if not page_translations:
                     if page_num < 3 or page_num >= total_pages - 3:
                         self._add_log(f'第 {page_num + 1} 页: 无翻译内容', 'info')
-                    continue
+                    return
 
                 if page_num < 3 or page_num >= total_pages - 3:
                     self._add_log(f'更新第 {page_num + 1} 页（{len(page_translations)} 个文本块）...', 'info')
@@ -2647,14 +3131,10 @@ class PDFTranslator:
                 # 更新这一页的内容
                 success_count = 0
                 page_bottom = new_page.rect.height - 5
-                image_rects = []
-                try:
-                    for img in page.get_images():
-                        for rect in page.get_image_rects(img[0]):
-                            image_rects.append(rect)
-                except Exception:
-                    image_rects = []
+                image_rects = [rect for _, img_rects in page_images for rect in img_rects]
                 image_top_band = max((rect.y1 for rect in image_rects if rect.y0 <= 5), default=0)
+                # 同页所有文本块共用一份图片网格索引
+                image_rects = self._rect_index(image_rects, bounds=new_page.rect)
 
                 for idx, (text_rect, translated_text, font_info) in enumerate(page_translations):
                     try:
@@ -2705,15 +3185,8 @@ class PDFTranslator:
                             base_fontsize = max(8, original_size * 0.98)
                         if layout_hint == 'toc':
                             base_fontsize = max(8, base_fontsize * 0.94)
-                        font_sizes = [
-                            base_fontsize,
-                            base_fontsize * 0.98,
-                            base_fontsize * 0.95,
-                            base_fontsize * 0.92,
-                            base_fontsize * 0.88,
-                            base_fontsize * 0.82,
-                            max(7, base_fontsize * 0.76),
-                        ]
+                        min_fontsize = max(7, base_fontsize * 0.76)
+                        fallback_fontsize = max(7, base_fontsize * 0.72)
                         original_color = font_info.get('color', 0)
                         if self._looks_light_color(original_color):
                             text_color = self._pdf_color_to_rgb(original_color)
@@ -2739,97 +3212,86 @@ class PDFTranslator:
                         safe_expanded_rect = self._clip_rect_to_avoid_images(expanded_rect, image_rects)
                         lineheight = self._preferred_lineheight(layout_hint, has_cjk_chars, translated_text)
 
+                        single_line_heading = (
+                            layout_hint in ('caption', 'heading', 'short', 'toc')
+                            and '\n' not in translated_text
+                            and len(translated_text) <= 80
+                        )
+                        heading_anchor_rect = safe_text_rect
+                        heading_hits_image = any(
+                            not (heading_anchor_rect & image_rect).is_empty and (heading_anchor_rect & image_rect).get_area() > 20
+                            for image_rect in image_rects.query(heading_anchor_rect)
+                        )
+                        rect_variants = [safe_text_rect]
+                        if safe_expanded_rect != safe_text_rect:
+                            wide_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_expanded_rect.x1, safe_text_rect.y1)
+                            wide_rect = self._clip_rect_to_avoid_images(wide_rect, image_rects)
+                            if wide_rect != safe_text_rect:
+                                rect_variants.append(wide_rect)
+                            tall_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_text_rect.x1, safe_expanded_rect.y1)
+                            tall_rect = self._clip_rect_to_avoid_images(tall_rect, image_rects)
+                            if tall_rect != safe_text_rect and tall_rect != wide_rect:
+                                rect_variants.append(tall_rect)
+                            full_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_expanded_rect.x1, safe_expanded_rect.y1)
+                            full_rect = self._clip_rect_to_avoid_images(full_rect, image_rects)
+                            if full_rect != safe_text_rect and full_rect != wide_rect and full_rect != tall_rect:
+                                rect_variants.append(full_rect)
+                            if safe_expanded_rect not in rect_variants:
+                                rect_variants.append(safe_expanded_rect)
+                        extended_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_expanded_rect.x1, safe_expanded_rect.y1)
+                        extended_rect = self._clip_rect_to_avoid_images(extended_rect, image_rects)
+                        fit_blocks[0] += 1
+
                         for font_name in font_names:
-                            single_line_heading = (
-                                layout_hint in ('caption', 'heading', 'short', 'toc')
-                                and '\n' not in translated_text
-                                and len(translated_text) <= 80
-                            )
-                            heading_anchor_rect = safe_text_rect
-                            heading_hits_image = any(
-                                not (heading_anchor_rect & image_rect).is_empty and (heading_anchor_rect & image_rect).get_area() > 20
-                                for image_rect in image_rects
-                            )
                             if single_line_heading and not heading_hits_image:
-                                for fontsize in font_sizes[:-1]:
-                                    try:
-                                        if layout_hint in ('caption', 'heading', 'short') or (layout_hint == 'toc' and len(translated_text) <= 32):
-                                            if has_cjk_chars and 'ui_unicode' in page_registered_fonts:
-                                                draw_font = 'ui_unicode'
-                                            else:
-                                                draw_font = font_name
-                                        else:
-                                            draw_font = font_name
-                                        new_page.insert_text(
-                                            (heading_anchor_rect.x0, heading_anchor_rect.y0 + fontsize),
-                                            translated_text,
-                                            fontsize=fontsize,
-                                            fontname=draw_font,
-                                            color=text_color,
-                                        )
-                                        written = True
-                                        break
-                                    except Exception:
-                                        continue
-                                if written:
-                                    break
-
-                            rect_variants = [safe_text_rect]
-                            if safe_expanded_rect != safe_text_rect:
-                                wide_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_expanded_rect.x1, safe_text_rect.y1)
-                                wide_rect = self._clip_rect_to_avoid_images(wide_rect, image_rects)
-                                if wide_rect != safe_text_rect:
-                                    rect_variants.append(wide_rect)
-                                tall_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_text_rect.x1, safe_expanded_rect.y1)
-                                tall_rect = self._clip_rect_to_avoid_images(tall_rect, image_rects)
-                                if tall_rect != safe_text_rect and tall_rect != wide_rect:
-                                    rect_variants.append(tall_rect)
-                                full_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_expanded_rect.x1, safe_expanded_rect.y1)
-                                full_rect = self._clip_rect_to_avoid_images(full_rect, image_rects)
-                                if full_rect != safe_text_rect and full_rect != wide_rect and full_rect != tall_rect:
-                                    rect_variants.append(full_rect)
-                                if safe_expanded_rect not in rect_variants:
-                                    rect_variants.append(safe_expanded_rect)
-                            for fontsize in font_sizes:
-                                for candidate_rect in rect_variants:
-                                    try:
-                                        result = new_page.insert_textbox(
-                                            candidate_rect,
-                                            translated_text,
-                                            fontsize=fontsize,
-                                            fontname=font_name,
-                                            lineheight=lineheight,
-                                            color=text_color,
-                                            align=0
-                                        )
-                                        if result >= 0:
-                                            written = True
-                                            break
-                                    except Exception:
-                                        break
-                                if written:
-                                    break
-                            if written:
-                                break
-
-                            if not written:
+                                # insert_text 不做换行也不判断溢出，失败只可能是字体不可用
+                                if layout_hint in ('caption', 'heading', 'short') or (layout_hint == 'toc' and len(translated_text) <= 32):
+                                    if has_cjk_chars and 'ui_unicode' in page_registered_fonts:
+                                        draw_font = 'ui_unicode'
+                                    else:
+                                        draw_font = font_name
+                                else:
+                                    draw_font = font_name
                                 try:
-                                    extended_rect = fitz.Rect(safe_text_rect.x0, safe_text_rect.y0, safe_expanded_rect.x1, safe_expanded_rect.y1)
-                                    extended_rect = self._clip_rect_to_avoid_images(extended_rect, image_rects)
-                                    result = new_page.insert_textbox(
-                                        extended_rect,
+                                    new_page.insert_text(
+                                        (heading_anchor_rect.x0, heading_anchor_rect.y0 + base_fontsize),
                                         translated_text,
-                                        fontsize=max(7, base_fontsize * 0.72),
-                                        fontname=font_name,
-                                        lineheight=lineheight,
+                                        fontsize=base_fontsize,
+                                        fontname=draw_font,
                                         color=text_color,
-                                        align=0
                                     )
-                                    if result >= 0:
-                                        written = True
-                                        break
+                                    written = True
+                                    break
                                 except Exception:
-                                    continue
+                                    pass
+
+                            # 先用字形宽度预排版，二分出能放进某个候选矩形的最大字号，再真正写入一次
+                            fitted = text_fitter.fit(
+                                font_name, translated_text, rect_variants, base_fontsize, min_fontsize, lineheight
+                            )
+                            if fitted is None:
+                                fitted = text_fitter.fit(
+                                    font_name, translated_text, [extended_rect], fallback_fontsize, lineheight=lineheight
+                                )
+                            if fitted is None:
+                                continue
+                            fontsize, candidate_rect = fitted
+                            textbox_calls[0] += 1
+                            try:
+                                result = new_page.insert_textbox(
+                                    candidate_rect,
+                                    translated_text,
+                                    fontsize=fontsize,
+                                    fontname=font_name,
+                                    lineheight=lineheight,
+                                    color=text_color,
+                                    align=0
+                                )
+                            except Exception:
+                                continue
+                            if result >= 0:
+                                written = True
+                                break
 
                         if written:
                             success_count += 1
@@ -2846,7 +3308,7 @@ class PDFTranslator:
                                 new_page.insert_text(
                                     (safe_text_rect.x0, safe_text_rect.y0 + 10),
                                     translated_text,
-                                    fontsize=max(7, base_fontsize * 0.72),
+                                    fontsize=fallback_fontsize,
                                     fontname=fallback_font,
                                     color=text_color
                                 )
@@ -2863,6 +3325,12 @@ class PDFTranslator:
                     self._add_log(f'第 {page_num + 1} 页完成: 成功写入 {success_count}/{len(page_translations)} 个文本块', 'success')
 
                 # 更新进度
+                report_render_progress(page_num)
+
+            def report_render_progress(page_num):
+                # 翻译阶段以翻译单元计进度；全部单元返回后剩余页面的写回再按页计进度
+                if not extraction_finished or completed_count[0] < total_translation_units:
+                    return
                 elapsed_time = time.time() - translation_start_time
                 done_pages = page_num + 1
                 est_remaining = _calc_remaining(elapsed_time, done_pages, total_pages)
@@ -2874,10 +3342,445 @@ class PDFTranslator:
                     estimated_remaining=est_remaining
                 )
 
-            # 关闭原文档
+            # ---- 流水线：提取 → 翻译 → 写回 ----
+            # 每提取一页就把它的翻译单元交给线程池；某页的单元全部返回后立即按页序写入输出分片。
+            # 所有 fitz 操作都留在当前线程，翻译线程只做服务调用。
+            self._add_log('=' * 60, 'info')
+            self._add_log('开始调用翻译API（提取、翻译、写回流水线并行）...', 'info')
+
+            async_prefetch = False
+            if self.engine == 'async':
+                if get_async_engine() is None:
+                    self._add_log('未安装 httpx，异步引擎不可用，改用线程模式', 'info')
+                elif self.api_type == 'google':
+                    # deep-translator 只提供同步的 translate 接口，Google 不经异步引擎预取
+                    self._add_log('Google Translate 不支持异步引擎，改用线程模式', 'info')
+                else:
+                    async_prefetch = True
+
+            # 有界：在途单元达到上限时先消化已返回的结果并写回页面，再继续提取
+            max_pending_units = max(concurrency * 4, self.ASYNC_PIPELINE_PENDING_UNITS if async_prefetch else 0)
+            unit_done_queue = queue.Queue()
+            page_unit_counts = {}
+            pending_block_buffer = []
+            pending_text_buffer = []
+            in_flight_units = [0]
+            sealed_pages = [0]
+            next_render_page = [0]
+            prefetched_requests = [0]
+            discarded_prefetches = [0]
+            tm_text_page_hits = [0]
+            resumed_units = [0]
+            text_run_count = [0]
+            group_counts = {'single': 0, 'batch': 0}
+            batch_fill_ratios = []
+            # 性能记录：最后一个翻译单元返回的时间、写回页面的累计耗时
+            translation_done_at = [None]
+            render_seconds = [0.0]
+            # 任务内去重（single-flight）：规范化文本相同的块只翻译首次出现的代表块，
+            # 之后的重复块挂在代表块上等结果，代表块返回后分发；已返回的直接复用
+            dedup_waiters = {}
+            dedup_done = {}
+            dedup_hits = [0]
+            # 页眉页脚模板：同一位置、只有数字不同的块视为同一模板，代表块的译文推出模板后
+            # 其余页按各自的数字本地填充；推不出模板（数字对不上）的模板作废，之后照常翻译
+            template_waiters = {}
+            template_patterns = {}
+            template_hits = [0]
+
+            def attach_duplicate(block_entry, page_height):
+                """重复块（或可套用模板的块）挂到代表块上、或直接填入译文并返回 True；
+                首次出现的文本登记为代表块并返回 False，由调用方照常派发。"""
+                text = self._clean_text(block_entry['text'])
+                key = normalize_source_text(text)
+                tkey = template_key(text, block_entry['rect'], page_height)
+                translated_text = None
+                with lock:
+                    template = template_patterns.get(tkey) if tkey is not None else None
+                    filled = fill_template(template, text) if template else None
+                    if key in dedup_done:
+                        translated_text = dedup_done[key]
+                        dedup_hits[0] += 1
+                    elif key in dedup_waiters:
+                        dedup_waiters[key].append(block_entry)
+                        dedup_hits[0] += 1
+                    elif filled is not None:
+                        translated_text = filled
+                        dedup_done[key] = filled
+                        template_hits[0] += 1
+                    elif tkey is not None and tkey in template_waiters:
+                        template_waiters[tkey].append(block_entry)
+                    else:
+                        if tkey is not None and tkey not in template_patterns:
+                            template_waiters[tkey] = []
+                            block_entry['template_key'] = tkey
+                        dedup_waiters[key] = []
+                        block_entry['dedup_key'] = key
+                        return False
+                    if translated_text is not None:
+                        results[(block_entry['page_num'], block_entry['block_idx'])] = (block_entry['rect'], translated_text)
+                        completed_count[0] += 1
+                if translated_text is not None:
+                    if journal is not None and not self._is_untranslated_fallback(block_entry['text'], translated_text):
+                        journal.record(f"b:{block_entry['page_num']}:{block_entry['block_idx']}", translated_text)
+                else:
+                    # 所在页要等代表块的单元返回后才能写回
+                    page_unit_counts[block_entry['page_num']] = page_unit_counts.get(block_entry['page_num'], 0) + 1
+                return True
+
+            def register_requeued(block_entry):
+                """重新派发的块登记为代表块并返回 True；已有相同文本的代表块时挂上去或直接取译文，返回 False。
+                只在提取线程（pump）里调用。"""
+                key = normalize_source_text(self._clean_text(block_entry['text']))
+                with lock:
+                    if key in dedup_done:
+                        results[(block_entry['page_num'], block_entry['block_idx'])] = (block_entry['rect'], dedup_done[key])
+                        completed_count[0] += 1
+                        # 不再等待，释放所在页
+                        page_unit_counts[block_entry['page_num']] -= 1
+                    elif key in dedup_waiters:
+                        # 继续占着所在页的等待计数，随新的代表块返回
+                        dedup_waiters[key].append(block_entry)
+                    else:
+                        dedup_waiters[key] = []
+                        block_entry['dedup_key'] = key
+                        block_entry['requeued'] = True
+                        return True
+                return False
+
+            def fan_out_duplicates(leader_blocks, block_results, follower_pages, requeue):
+                """把代表块的译文分发给等待中的重复块和同模板块，返回它们的 [(block_info, 译文), ...]。
+
+                代表块没有译文（单元异常）时等待的块保持未翻译；它们所在的页同样记入 follower_pages 以便写回。
+                代表块回退成了原文时不缓存这个结果，等待的重复块放进 requeue，由提取线程重新派发一次
+                （它们所在页的等待计数保留到重新派发时）；重新派发的代表块再回退时照常分发回退结果。
+                模板推不出来、或代表块回退成了原文时，同模板的块同样放进 requeue，经线程池批量翻译。
+                """
+                translations = {block_info['seq']: translated_text for block_info, translated_text in block_results}
+                fanned = []
+                with lock:
+                    for block_info in leader_blocks:
+                        translated_text = translations.get(block_info['seq'])
+                        fell_back = translated_text is not None and self._is_untranslated_fallback(block_info['text'], translated_text)
+                        key = block_info.get('dedup_key')
+                        if key is not None and key in dedup_waiters:
+                            if translated_text is not None and not fell_back:
+                                dedup_done[key] = translated_text
+                            for follower in dedup_waiters.pop(key):
+                                if fell_back and not block_info.get('requeued'):
+                                    requeue.append(follower)
+                                    continue
+                                follower_pages.append(follower['page_num'])
+                                if translated_text is not None:
+                                    fanned.append((follower, translated_text))
+
+                        tkey = block_info.get('template_key')
+                        if tkey is None or tkey not in template_waiters:
+                            continue
+                        followers = template_waiters.pop(tkey)
+                        if translated_text is None:
+                            follower_pages.extend(follower['page_num'] for follower in followers)
+                            continue
+                        if fell_back:
+                            # 代表块翻译失败，模板留待下一次出现时重新推导
+                            requeue.extend(followers)
+                            continue
+                        template = derive_template(self._clean_text(block_info['text']), translated_text)
+                        template_patterns[tkey] = template
+                        for follower in followers:
+                            filled = fill_template(template, self._clean_text(follower['text'])) if template else None
+                            if filled is None:
+                                requeue.append(follower)
+                                continue
+                            follower_pages.append(follower['page_num'])
+                            dedup_done.setdefault(normalize_source_text(self._clean_text(follower['text'])), filled)
+                            template_hits[0] += 1
+                            fanned.append((follower, filled))
+
+                    for follower, translated_text in fanned:
+                        results[(follower['page_num'], follower['block_idx'])] = (follower['rect'], translated_text)
+                        completed_count[0] += 1
+                return fanned
+
+            def run_unit(kind, payload, page_nums, prefetch_keys=()):
+                follower_pages = []
+                requeue = []
+                try:
+                    if kind == 'text_run':
+                        translate_text_page_run(payload)
+                        # 取消过程中产生的回退结果不写入断点
+                        self._check_cancelled()
+                        if journal is not None:
+                            for item in payload:
+                                translated_text = text_page_results.get(item['page_num'])
+                                if translated_text is not None and not self._is_untranslated_fallback(item['text'], translated_text):
+                                    journal.record(f"p:{item['page_num']}", translated_text)
+                    else:
+                        block_results = translate_unit(payload)
+                        with lock:
+                            for block_info, translated_text in block_results:
+                                results[(block_info['page_num'], block_info['block_idx'])] = (
+                                    block_info['rect'], translated_text
+                                )
+                        block_results = block_results + fan_out_duplicates(payload[1], block_results, follower_pages, requeue)
+                        self._check_cancelled()
+                        if journal is not None:
+                            # 回退为原文的块不记入断点，续传时会重新翻译
+                            for block_info, translated_text in block_results:
+                                if not self._is_untranslated_fallback(block_info['text'], translated_text):
+                                    journal.record(f"b:{block_info['page_num']}:{block_info['block_idx']}", translated_text)
+                except Exception as e:
+                    if kind == 'text_run':
+                        print(f'Text-page future error: {e}')
+                    else:
+                        print(f'Future error: {e}')
+                finally:
+                    if kind != 'text_run':
+                        # 异常时代表块没有译文，仍要释放挂在它上面的重复块，避免所在页一直等待
+                        fan_out_duplicates(payload[1], [], follower_pages, requeue)
+                    if prefetch_keys:
+                        # 单元结束后仍没被取走的预取（分支与预测不一致、异常提前退出）不再等待
+                        discarded = self._discard_prefetched(prefetch_keys)
+                        if discarded:
+                            with lock:
+                                discarded_prefetches[0] += discarded
+                    translation_done_at[0] = time.time()
+                    unit_done_queue.put((page_nums + follower_pages, requeue))
+
+            def pump(block=False):
+                """回收已返回的翻译单元，然后按页序写回所有已就绪的页面。"""
+                requeued = []
+                while True:
+                    try:
+                        page_nums, unit_requeue = unit_done_queue.get(timeout=1.0) if block else unit_done_queue.get_nowait()
+                    except queue.Empty:
+                        if not block:
+                            break
+                        self._check_cancelled()
+                        continue
+                    block = False
+                    in_flight_units[0] -= 1
+                    for unit_page in page_nums:
+                        page_unit_counts[unit_page] -= 1
+                    requeued.extend(unit_requeue)
+
+                if requeued:
+                    dispatch_requeued(requeued)
+
+                while next_render_page[0] < sealed_pages[0] and not page_unit_counts.get(next_render_page[0]):
+                    render_start = time.time()
+                    collect_page_translations(next_render_page[0])
+                    render_page(next_render_page[0])
+                    render_seconds[0] += time.time() - render_start
+                    next_render_page[0] += 1
+                flush_output_chunk()
+
+            def flush_output_chunk():
+                if output_writer.pages_rendered() and preview:
+                    self._emit_preview(output_writer.flushed_pages, total_pages)
+
+            def dispatch_requeued(blocks):
+                """重新派发退回的块（代表块回退、或套不上模板）：按服务容量装箱，经线程池翻译。
+
+                先提交新单元（所在页的计数随之增加），再释放这些块原来占着的等待计数，所在页不会提前写回。
+                """
+                leaders = sorted((b for b in blocks if register_requeued(b)), key=lambda b: b['seq'])
+                for group_type, group_blocks, fill_ratio in self._pack_translation_blocks(leaders, target_lang):
+                    is_batch = group_type == 'batch' and len(group_blocks) > 1
+                    group_counts['batch' if is_batch else 'single'] += 1
+                    if is_batch:
+                        batch_fill_ratios.append(fill_ratio)
+                    group = (group_type, group_blocks)
+                    submit_unit(
+                        'blocks', group, sorted({b['page_num'] for b in group_blocks}),
+                        self._plan_unit_requests(group, source_lang, target_lang) if async_prefetch else None, wait=False
+                    )
+                for block_entry in leaders:
+                    page_unit_counts[block_entry['page_num']] -= 1
+
+            def submit_unit(kind, payload, page_nums, planned_requests, wait=True):
+                # wait=False 用于 pump 内部的重新派发，不能再阻塞等待 pump
+                while wait and in_flight_units[0] >= max_pending_units:
+                    pump(block=True)
+                prefetch_keys = ()
+                if async_prefetch and planned_requests:
+                    prefetch_keys = self._prefetch_requests(planned_requests)
+                    prefetched_requests[0] += len(prefetch_keys)
+                for unit_page in page_nums:
+                    page_unit_counts[unit_page] = page_unit_counts.get(unit_page, 0) + 1
+                in_flight_units[0] += 1
+                executor.submit(run_unit, kind, payload, page_nums, prefetch_keys)
+
+            def dispatch_pending(current_page=None):
+                """把缓冲区里已经定型的分组提交翻译。
+
+                短正文块按服务容量装箱，可以跨越标题和页面；装填率不足、且首块还在最近
+                BATCH_WINDOW_PAGES 页内的批次留在缓冲区，和后续页面的短块重新装箱。
+                纯文字页合并是顺序贪心的，只有末尾那个 run 还可能继续增长，同样留待后续页面。
+                current_page 为 None 表示提取已结束，缓冲区全部提交。
+                """
+                if pending_block_buffer:
+                    held_blocks = []
+                    for group_type, blocks, fill_ratio in self._pack_translation_blocks(pending_block_buffer, target_lang):
+                        if (
+                            current_page is not None and group_type == 'batch'
+                            and fill_ratio < self.BATCH_DISPATCH_FILL
+                            and blocks[0]['page_num'] > current_page - self.BATCH_WINDOW_PAGES
+                        ):
+                            held_blocks.extend(blocks)
+                            continue
+                        is_batch = group_type == 'batch' and len(blocks) > 1
+                        group_counts['batch' if is_batch else 'single'] += 1
+                        if is_batch:
+                            batch_fill_ratios.append(fill_ratio)
+                        group = (group_type, blocks)
+                        submit_unit(
+                            'blocks', group, sorted({b['page_num'] for b in blocks}),
+                            self._plan_unit_requests(group, source_lang, target_lang) if async_prefetch else None
+                        )
+                    pending_block_buffer[:] = sorted(held_blocks, key=lambda b: b['seq'])
+
+                if pending_text_buffer:
+                    runs = self._build_text_page_runs(pending_text_buffer, max_chars=12000)
+                    tail_run = []
+                    # 只有末尾 run 以当前页结尾时，下一页才可能接着并入
+                    if current_page is not None and pending_text_buffer[-1]['page_num'] == current_page:
+                        tail_run = runs.pop()
+                    pending_text_buffer[:] = tail_run
+                    for run in runs:
+                        text_run_count[0] += 1
+                        planned = None
+                        if async_prefetch:
+                            planned = self._first_pass_requests(
+                                TEXT_PAGE_SEPARATOR.join(item['text'] for item in run), source_lang, target_lang
+                            )
+                        submit_unit('text_run', run, [item['page_num'] for item in run], planned)
+
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+            try:
+                for record in self._iter_page_records(
+                    doc, input_path, total_pages, use_fast_extraction, drawings=not overlay
+                ):
+                    page_num = record['page_num']
+                    if record['images'] is not None and record['drawings'] is not None:
+                        page_layouts[page_num] = (record['images'], record['drawings'])
+                    if record['error']:
+                        self._add_log(f'第{page_num+1}页文本提取失败（已跳过）: {record["error"]}', 'error')
+                    elif record['text_page']:
+                        page_has_images[page_num] = record['has_images']
+                        item = record['text_page']
+                        text_only_pages.append(item)
+                        total_text_pages += 1
+                        resumed = journal.get(f'p:{page_num}') if journal is not None else None
+                        # 翻译记忆命中的纯文字页直接复用，不再进入 API 批次
+                        cached = None if resumed is not None else self._translation_cache.get((item['text'], source_lang, target_lang))
+                        if resumed is not None:
+                            with lock:
+                                text_page_results[page_num] = resumed
+                                resumed_units[0] += 1
+                                completed_count[0] += 1
+                        elif cached is not None:
+                            with lock:
+                                text_page_results[page_num] = cached
+                                tm_text_page_hits[0] += 1
+                                completed_count[0] += 1
+                        else:
+                            pending_text_buffer.append(item)
+                    else:
+                        page_has_images[page_num] = record['has_images']
+                        raw_image_page_blocks += record['raw_block_count']
+                        page_blocks_map[page_num] = record['blocks']
+                        for block_entry in record['blocks']:
+                            block_entry['seq'] = len(all_blocks)
+                            all_blocks.append(block_entry)
+                            resumed = journal.get(f"b:{page_num}:{block_entry['block_idx']}") if journal is not None else None
+                            if resumed is None:
+                                if not attach_duplicate(block_entry, record['page_height']):
+                                    pending_block_buffer.append(block_entry)
+                                continue
+                            # 断点日志里已有译文的块直接进入写回，不再派发翻译
+                            with lock:
+                                results[(page_num, block_entry['block_idx'])] = (block_entry['rect'], resumed)
+                                resumed_units[0] += 1
+                                completed_count[0] += 1
+                        total_blocks = len(all_blocks)
+
+                    # 按已提取页的密度外推总单元数，避免提取早期进度百分比虚高
+                    known_units = total_blocks + total_text_pages
+                    total_translation_units = max(known_units, round(known_units * total_pages / (page_num + 1)))
+
+                    # 本页及之前、且不在待定批次里的页面已派发完毕，可以在结果返回后写回
+                    dispatch_pending(page_num)
+                    sealed_pages[0] = min(
+                        [page_num + 1]
+                        + [b['page_num'] for b in pending_block_buffer]
+                        + [item['page_num'] for item in pending_text_buffer]
+                    )
+                    pump()
+
+                dispatch_pending()
+                sealed_pages[0] = total_pages
+                total_translation_units = total_blocks + total_text_pages
+                extraction_finished = True
+
+                extraction_elapsed = time.time() - extraction_start_time
+                self._add_log(f'纯文字页: {total_text_pages} 页，含图/保真页文本块: {total_blocks} 个', 'info')
+                if raw_image_page_blocks:
+                    self._add_log(f'含图页块合并: {raw_image_page_blocks} -> {total_blocks}', 'info')
+                self._add_log(f'文本提取完成 (耗时: {extraction_elapsed:.1f}秒)', 'info')
+                if resumed_units[0]:
+                    self._add_log(f'断点续传：跳过已完成的 {resumed_units[0]} 个翻译单元', 'success')
+                if tm_text_page_hits[0]:
+                    self._add_log(f'翻译记忆命中纯文字页: {tm_text_page_hits[0]} 页', 'success')
+                if total_blocks:
+                    self._add_log(
+                        f'文本块去重：{dedup_hits[0]}/{total_blocks} 个块与前文重复，共用译文（去重率 {dedup_hits[0] / total_blocks:.0%}）',
+                        'success' if dedup_hits[0] else 'info'
+                    )
+                self._add_log(f'纯文字页合并为 {text_run_count[0]} 个跨页翻译批次', 'info')
+                batch_fill = (
+                    f'，平均装填率 {sum(batch_fill_ratios) / len(batch_fill_ratios):.0%}' if batch_fill_ratios else ''
+                )
+                if self.api_type == 'google':
+                    self._add_log(
+                        f'文本块分组完成：{group_counts["single"]} 个单独翻译，{group_counts["batch"]} 个批次合并翻译{batch_fill}',
+                        'info'
+                    )
+                else:
+                    self._add_log(
+                        f'文本块分组完成：{group_counts["single"]} 个单独翻译，{group_counts["batch"]} 个结构化批次{batch_fill}',
+                        'info'
+                    )
+                if async_prefetch:
+                    self._add_log(f'⚡ 异步引擎已提交 {prefetched_requests[0]} 个首轮请求，由共享事件循环并发执行', 'success')
+
+                while next_render_page[0] < total_pages:
+                    pump(block=in_flight_units[0] > 0)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+            discarded_prefetches[0] += self._discard_prefetched()
+            if discarded_prefetches[0]:
+                self._add_log(f'异步引擎有 {discarded_prefetches[0]} 个预取请求未被使用，已取消', 'info')
+            self._add_log(f'✓ 所有文本块翻译完成', 'success')
+            if tm_hits[0]:
+                self._add_log(f'翻译记忆命中文本块: {tm_hits[0]}/{total_blocks}', 'success')
+            if template_hits[0]:
+                template_count = sum(1 for template in template_patterns.values() if template)
+                self._add_log(f'页眉页脚模板：{template_count} 个模板，{template_hits[0]} 个块按模板本地填充', 'success')
+            self._add_log(f'✓ 所有页面翻译完成', 'success')
+
+            # 关闭原文档；置空后异常处理不会再去关闭（已关闭的 Document 连真值判断都会抛错，掩盖原始异常）
             doc.close()
+            doc = None
 
             self._add_log(f'✓ 总共写入 {total_written} 个文本块到PDF', 'success')
+            if fit_blocks[0]:
+                self._add_log(
+                    f'字号拟合: {fit_blocks[0]} 个文本块，平均每块预排版 {text_fitter.attempts / fit_blocks[0]:.1f} 次，'
+                    f'insert_textbox 调用 {textbox_calls[0]} 次',
+                    'info'
+                )
 
             if total_written == 0:
                 self._add_log('⚠️ 警告：没有任何文本被写入！请检查上面的日志', 'error')
@@ -2890,16 +3793,16 @@ class PDFTranslator:
             if output_dir and not os.path.exists(output_dir):
                 self._add_log(f'⚠️ 输出目录不存在: {output_dir}', 'error')
 
-            # 保存新文档（包含翻译后的文本和原图）
-            new_doc.save(
-                output_path,
-                garbage=4,
-                clean=1,
-                deflate=1,
-                deflate_images=1,
-                deflate_fonts=1
+            # 合并输出分片并保存（包含翻译后的文本和原图）
+            output_writer.finish(output_path, self.compression)
+            output_writer.discard()
+            self._add_log(
+                f'📊 PDF保存耗时: {output_writer.chunk_time + output_writer.merge_time:.1f}秒'
+                f'（分片写出 {output_writer.chunk_count} 个 {output_writer.chunk_time:.1f}秒，'
+                f'合并保存 {output_writer.merge_time:.1f}秒，{COMPRESSION_LABELS[self.compression]}'
+                f'{"，字体已子集化" if output_writer.fonts_subset else ""}）',
+                'info'
             )
-            new_doc.close()
 
             # 验证文件是否保存成功
             if os.path.exists(output_path):
@@ -2909,12 +3812,27 @@ class PDFTranslator:
                 self._add_log('✗ 文件保存失败！文件不存在', 'error')
 
             # 最终统计
-            total_cost = self._calculate_cost()
             self._add_log(f'\n========== 翻译完成 ==========', 'success')
-            self._add_log(f'输入tokens: {self.input_tokens:,}', 'info')
-            self._add_log(f'输出tokens: {self.output_tokens:,}', 'info')
-            self._add_log(f'预估费用: ${total_cost:.4f} USD', 'info')
+            self._log_token_usage()
+            self._translation_cache.flush()
+            self.perf_stats = self._perf_record(
+                'pdf', concurrency,
+                pages=total_pages,
+                blocks=total_blocks,
+                text_pages=total_text_pages,
+                units=group_counts['single'] + group_counts['batch'] + text_run_count[0],
+                source_tokens=sum(self._estimate_tokens(block['text']) for block in all_blocks)
+                + sum(self._estimate_tokens(item['text']) for item in text_only_pages),
+                extract_seconds=extraction_elapsed,
+                translate_seconds=(translation_done_at[0] or time.time()) - translation_start_time,
+                render_seconds=render_seconds[0],
+                save_seconds=output_writer.chunk_time + output_writer.merge_time,
+                total_seconds=time.time() - start_time
+            )
 
+            # 输出已落盘，断点日志不再需要
+            if journal is not None:
+                journal.close(remove=True)
             self._update_progress(total_pages, total_pages, '翻译完成！')
             print(f'Translation completed: {output_path}')
 
@@ -2923,12 +3841,18 @@ class PDFTranslator:
             import traceback
             traceback.print_exc()
             self._add_log(f'翻译过程发生严重错误: {str(e)}', 'error')
+            self._discard_prefetched()
+            if journal is not None:
+                journal.close()
+            # 预览目录里的分片留给 /preview，其余的中间分片删掉
+            if output_writer is not None and not preview:
+                output_writer.discard()
             if doc:
                 doc.close()
             raise
 
-    def translate_pdf_to_text(self, input_path, output_path, source_lang='auto', target_lang='zh', concurrency=4):
-        """提取PDF文本，翻译成指定语言，生成TXT文件"""
+    def translate_pdf_to_text(self, input_path, output_path, source_lang='auto', target_lang='zh', concurrency=4, resume=False):
+        """提取PDF文本，翻译成指定语言，生成TXT文件；resume=True 时跳过断点日志里已完成的文本块"""
         import concurrent.futures
         import threading
 
@@ -2946,142 +3870,158 @@ class PDFTranslator:
             'info'
         )
 
-        # 语言代码映射
-        lang_map = {
-            'zh': 'zh-cn',
-            'en': 'en',
-            'ja': 'ja',
-            'ko': 'ko',
-            'fr': 'fr',
-            'de': 'de',
-            'es': 'es',
-            'ru': 'ru',
-            'ar': 'ar'
-        }
-
-        normalized_source = lang_map.get(source_lang, source_lang)
-        normalized_target = lang_map.get(target_lang, target_lang)
+        journal = self._open_job_journal(input_path, output_path, 'text', source_lang, target_lang, resume)
+        measure, chunk_budget = self._text_chunk_measure()
+        unit_label = '字符' if measure is len else 'tokens'
+        self._add_log(f'按段落/句子边界切分文本块（每块不超过 {chunk_budget} {unit_label}），译完即按顺序写入', 'info')
 
-        # 打开PDF并提取文本
-        extract_start = time.time()
-        self._add_log('正在提取PDF文本...', 'info')
         doc = fitz.open(input_path)
         total_pages = len(doc)
-
-        all_text_blocks = []
-        current_position = 0
-
-        for page_num in range(total_pages):
-            self._check_cancelled()
-            page = doc[page_num]
-            text = page.get_text()
-
-            if text and text.strip():
-                all_text_blocks.append({
-                    'page_num': page_num,
-                    'text': text.strip()
-                })
-                current_position += len(text)
-
-        doc.close()
-        extract_time = time.time() - extract_start
-        self._add_log(f'✓ 提取到 {len(all_text_blocks)} 页文本，共 {current_position} 个字符 (耗时: {extract_time:.1f}秒)', 'info')
-
-        # 合并所有文本
-        full_text = '\n\n'.join([block['text'] for block in all_text_blocks])
-        self._add_log(f'合并后总字符数: {len(full_text)}', 'info')
-
-        # 较大的文本块可减少 API 调用次数，文本版输出对版式约束也更低。
-        chunk_size = 8000
-        text_chunks = []
-        for i in range(0, len(full_text), chunk_size):
-            chunk = full_text[i:i + chunk_size]
-            text_chunks.append(chunk)
-
-        self._add_log(f'分成 {len(text_chunks)} 个文本块进行翻译 (每块约{chunk_size}字符)', 'info')
+        extract_time = [0.0]
+        save_time = [0.0]
+        extracted_chars = [0]
+        extracted_pages = [0]
+        source_tokens = [0]
+
+        def timed_chunks():
+            """文本块生成器；单独累计提取耗时（提取和翻译交替进行）。"""
+            chunks = self._iter_text_chunks(self._iter_page_paragraphs(doc), measure, chunk_budget)
+            while True:
+                started = time.time()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    extract_time[0] += time.time() - started
+                    return
+                extract_time[0] += time.time() - started
+                extracted_chars[0] += len(chunk[0])
+                extracted_pages[0] = chunk[1] + 1
+                source_tokens[0] += self._estimate_tokens(chunk[0])
+                yield chunk
 
         # 并发翻译
         translation_start_time = time.time()
-        total_chunks = len(text_chunks)
         completed_count = [0]
+        submitted_count = [0]
+        failed_count = [0]
         lock = threading.Lock()
-        results = {}
         api_times = []  # 记录每次API调用耗时
 
-        def translate_chunk(chunk_info):
-            """翻译单个文本块"""
-            chunk_idx = chunk_info['index']
-            text = chunk_info['text']
+        def estimated_total():
+            # 提取未结束时按已提取页的密度外推总块数
+            if extracted_pages[0] >= total_pages or not extracted_pages[0]:
+                return submitted_count[0]
+            return max(submitted_count[0], round(submitted_count[0] * total_pages / extracted_pages[0]))
 
+        def translate_chunk(chunk_idx, text):
+            """翻译单个文本块；失败时返回原文，保证每个块都有结果可写。"""
+            translated = None
             try:
                 self._check_cancelled()
 
-                # 记录输入token
-                input_tokens = self._estimate_tokens(text)
-
-                # 翻译 - 计时
-                api_start = time.time()
-                if self.api_type == 'google':
-                    translated = GoogleTranslator(source=normalized_source, target=normalized_target).translate(text)
-                else:
+                # 断点日志或翻译记忆命中时直接复用
+                cache_key = (text, source_lang, target_lang)
+                # 断点键带上文本摘要：块边界与上次不同时只会未命中，不会取到别的块的译文
+                unit_key = f"c:{chunk_idx}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+                translated = journal.get(unit_key) if journal is not None else None
+                if translated is None:
+                    translated = self._translation_cache.get(cache_key)
+                if translated is None:
+                    # 各服务的翻译方法自己统计 tokens，并处理语言代码映射和超长分段
+                    api_start = time.time()
                     translated = self._translate_text(text, source_lang, target_lang)
-                api_time = time.time() - api_start
-                api_times.append(api_time)
-
-                # 记录输出token
-                output_tokens = self._estimate_tokens(translated)
-
-                current_num = chunk_idx + 1
-                if self._should_emit_detail_log(current_num, total_chunks):
-                    display_text = text[:100] + '...' if len(text) > 100 else text
-                    display_translated = translated[:100] + '...' if len(translated) > 100 else translated
-                    self._add_log(f'[原文 {current_num}/{total_chunks}] {display_text}', 'info')
-                    self._add_log(f'[译文 {current_num}/{total_chunks}] {display_translated} (耗时: {api_time:.1f}s)', 'success')
-
+                    api_time = time.time() - api_start
+                    if self._is_untranslated_fallback(text, translated):
+                        raise ValueError('翻译服务调用失败，回退为原文')
+                    with lock:
+                        api_times.append(api_time)
+                        self._translation_cache[cache_key] = translated
+
+                    current_num = chunk_idx + 1
+                    if self._should_emit_detail_log(current_num, estimated_total()):
+                        display_text = text[:100] + '...' if len(text) > 100 else text
+                        display_translated = translated[:100] + '...' if len(translated) > 100 else translated
+                        self._add_log(f'[原文 {current_num}] {display_text}', 'info')
+                        self._add_log(f'[译文 {current_num}] {display_translated} (耗时: {api_time:.1f}s)', 'success')
+                    if journal is not None:
+                        journal.record(unit_key, translated)
+            except Exception as e:
+                print(f'Translation error for chunk {chunk_idx}: {e}')
+                with lock:
+                    failed_count[0] += 1
+                translated = text  # 失败时返回原文
+            finally:
                 with lock:
-                    self.input_tokens += input_tokens
-                    self.output_tokens += output_tokens
                     completed_count[0] += 1
-
-                    # 更新进度
                     elapsed_time = time.time() - translation_start_time
                     current = completed_count[0]
-                    est_remaining = (elapsed_time / current) * (total_chunks - current) if current > 0 else 0
-                    if self._should_emit_progress_update(current, total_chunks):
+                    total = estimated_total()
+                    est_remaining = (elapsed_time / current) * (total - current) if current > 0 else 0
+                    if self._should_emit_progress_update(current, total):
                         self._update_progress(
                             current,
-                            total_chunks,
-                            f'已翻译 {current}/{total_chunks} 个文本块...',
+                            total,
+                            f'已翻译 {current}/{total} 个文本块...',
                             elapsed_time=elapsed_time,
-                            estimated_remaining=est_remaining
+                            estimated_remaining=max(0, est_remaining)
                         )
-
-                    # 记录翻译结果
-                    results[chunk_idx] = translated
-
-                return chunk_idx, translated
-
-            except Exception as e:
-                print(f'Translation error for chunk {chunk_idx}: {e}')
-                with lock:
-                    completed_count[0] += 1
-                return chunk_idx, text  # 失败时返回原文
-
-        # 创建任务列表
-        chunk_tasks = [{'index': i, 'text': text_chunks[i]} for i in range(len(text_chunks))]
+            return translated
 
         self._add_log('开始翻译...', 'info')
+        self._add_log(f'正在写入翻译后的文本到: {output_path}', 'info')
+
+        # 有界流水线：最多 max_pending 个块在途或等待写出，内存占用与文档大小无关。
+        # 块按序号顺序写出，之前的块全部写完后立即追加，任务进行中输出文件即可查看
+        max_pending = max(2, concurrency * 2)
+        TEXT_CHUNK_SEPARATOR = '\n\n'
+        pending = {}
+        next_write = [0]
+
+        def write_ready(wait=False):
+            while next_write[0] in pending:
+                future = pending[next_write[0]]
+                if not future.done():
+                    if not wait:
+                        return
+                    concurrent.futures.wait([future], timeout=1)
+                    self._check_cancelled()
+                    continue
+                translated = pending.pop(next_write[0]).result()
+                write_start = time.time()
+                if next_write[0]:
+                    output_file.write(TEXT_CHUNK_SEPARATOR)
+                output_file.write(translated)
+                output_file.flush()
+                save_time[0] += time.time() - write_start
+                next_write[0] += 1
+                wait = False
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
-            futures = {executor.submit(translate_chunk, chunk): chunk for chunk in chunk_tasks}
-
-            for future in concurrent.futures.as_completed(futures):
+        try:
+            with open(output_path, 'w', encoding='utf-8') as output_file, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
                 try:
-                    future.result()
-                except Exception as e:
-                    print(f'Future error: {e}')
+                    for chunk_idx, (chunk_text, _) in enumerate(timed_chunks()):
+                        self._check_cancelled()
+                        while len(pending) >= max_pending:
+                            write_ready(wait=True)
+                        pending[chunk_idx] = executor.submit(translate_chunk, chunk_idx, chunk_text)
+                        submitted_count[0] += 1
+                        write_ready()
+                    while pending:
+                        write_ready(wait=True)
+                finally:
+                    for future in pending.values():
+                        future.cancel()
+        finally:
+            doc.close()
 
         translation_time = time.time() - translation_start_time
+        self._add_log(
+            f'✓ 提取到 {extracted_pages[0]} 页文本，共 {extracted_chars[0]} 个字符，分成 {submitted_count[0]} 个文本块翻译',
+            'info'
+        )
+        if failed_count[0]:
+            self._add_log(f'{failed_count[0]} 个文本块翻译失败，已保留原文（可调用 /resume 重试）', 'error')
         self._add_log('✓ 所有文本块翻译完成', 'success')
 
         # 输出耗时统计
@@ -3097,26 +4037,43 @@ class PDFTranslator:
             self._add_log(f'  - 单次API最快: {min_api_time:.1f}秒', 'info')
             self._add_log(f'  - 单次API最慢: {max_api_time:.1f}秒', 'info')
 
-        # 按顺序组合翻译结果
-        translated_text = '\n\n'.join([results[i] for i in range(len(text_chunks))])
-
-        # 保存为TXT文件
-        save_start = time.time()
-        self._add_log(f'正在保存翻译后的文本到: {output_path}', 'info')
-
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(translated_text)
-
-        save_time = time.time() - save_start
+        if journal is not None:
+            # 有失败块时保留断点日志，续传只重翻失败的块
+            journal.close(remove=not failed_count[0])
 
         total_time = time.time() - total_start_time
         self._add_log('✓ 文本翻译完成！', 'success')
         self._add_log(f'📊 各阶段耗时:', 'info')
-        self._add_log(f'  - PDF文本提取: {extract_time:.1f}秒', 'info')
+        self._add_log(f'  - PDF文本提取: {extract_time[0]:.1f}秒', 'info')
         self._add_log(f'  - 翻译API调用: {translation_time:.1f}秒', 'info')
-        self._add_log(f'  - 文件保存: {save_time:.1f}秒', 'info')
+        self._add_log(f'  - 文件写入: {save_time[0]:.1f}秒', 'info')
         self._add_log(f'  - 总耗时: {total_time:.1f}秒', 'info')
-        self._add_log(f'输入tokens: {self.input_tokens:,}', 'info')
-        self._add_log(f'输出tokens: {self.output_tokens:,}', 'info')
-        self._add_log(f'预估费用: ${self._calculate_cost():.4f} USD', 'info')
+        self._log_token_usage()
+        self._translation_cache.flush()
         self._add_log('=' * 40, 'info')
+        self.perf_stats = self._perf_record(
+            'text', concurrency,
+            pages=total_pages,
+            units=submitted_count[0],
+            source_tokens=source_tokens[0],
+            extract_seconds=extract_time[0],
+            translate_seconds=translation_time,
+            render_seconds=0.0,
+            save_seconds=save_time[0],
+            total_seconds=total_time
+        )
+
+
+def _extract_page_range(input_path, start, end, use_fast_extraction, drawings=True):
+    """进程池 worker：独立打开文档，按页序提取 [start, end) 页。"""
+    # 提取相关方法不依赖实例状态，跳过 __init__（避免在子进程里打开翻译记忆等资源）
+    extractor = PDFTranslator.__new__(PDFTranslator)
+    doc = fitz.open(input_path)
+    image_digests = {}
+    try:
+        return [
+            extractor._extract_page_record(doc, page_num, use_fast_extraction, image_digests, drawings=drawings)
+            for page_num in range(start, end)
+        ]
+    finally:
+        doc.close()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+UPLOAD_STORE_DIR_NAME = 'uploads'
+DOCUMENT_NAME = 'document.pdf'
+META_NAME = 'meta.json'
+# 超过这个时间（秒）没有再被分析或引用的文档会在下次上传时清理
+DEFAULT_UPLOAD_TTL = 24 * 3600
+COPY_CHUNK_SIZE = 1024 * 1024
+
+DOC_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadStore:
+    """按内容哈希存放上传的 PDF：同样的字节只存一份，文档 id 就是 SHA-256。
+
+    /analyze 上传一次后返回文档 id，/translate、/translate_text 凭 id 取文件，浏览器不必再传一遍；
+    分析结果和提取的文本作为附属文件缓存在文档目录里，同一文件再次分析时不用重新解析。
+    目录放在任务目录的同一位置（PDFAPP_WORK_DIR），多个 Web 进程共享。
+    """
+
+    def __init__(self, root, ttl=DEFAULT_UPLOAD_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, stream, filename):
+        """边写临时文件边计算哈希，返回文档 id；内容已存在时丢弃新写的副本。"""
+        self.prune()
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(prefix='upload_', suffix='.tmp', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+            doc_id = digest.hexdigest()
+            doc_dir = os.path.join(self.root, doc_id)
+            os.makedirs(doc_dir, exist_ok=True)
+            document_path = os.path.join(doc_dir, DOCUMENT_NAME)
+            if os.path.exists(document_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, document_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        meta = self.load_json(doc_id, META_NAME) or {}
+        meta.update({'filename': filename, 'size': os.path.getsize(document_path)})
+        self.save_json(doc_id, META_NAME, meta)
+        return doc_id
+
+    def _doc_dir(self, doc_id):
+        if not doc_id or not DOC_ID_PATTERN.fullmatch(doc_id):
+            return None
+        return os.path.join(self.root, doc_id)
+
+    def path(self, doc_id):
+        """文档文件路径；id 无效或文档已被清理时返回 None。引用会刷新文档的过期时间。"""
+        doc_dir = self._doc_dir(doc_id)
+        if doc_dir is None:
+            return None
+        document_path = os.path.join(doc_dir, DOCUMENT_NAME)
+        if not os.path.exists(document_path):
+            return None
+        try:
+            os.utime(doc_dir)
+        except OSError:
+            pass
+        return document_path
+
+    def filename(self, doc_id):
+        return (self.load_json(doc_id, META_NAME) or {}).get('filename')
+
+    def copy_to(self, doc_id, dest_path):
+        """把文档放进任务目录：同一文件系统上用硬链接，否则复制。任务目录自成一体，文档被清理后仍可续传。"""
+        source = self.path(doc_id)
+        if source is None:
+            return False
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            shutil.copyfile(source, dest_path)
+        return True
+
+    def load_json(self, doc_id, name):
+        doc_dir = self._doc_dir(doc_id)
+        if doc_dir is None:
+            return None
+        try:
+            with open(os.path.join(doc_dir, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_json(self, doc_id, name, data):
+        doc_dir = self._doc_dir(doc_id)
+        if doc_dir is None:
+            return
+        path = os.path.join(doc_dir, name)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'[WARN] 上传缓存写入失败({name}): {e}')
+
+    def prune(self):
+        """删除超过 ttl 没有被引用的文档目录。"""
+        if not self.ttl:
+            return
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            try:
+                names = os.listdir(self.root)
+            except OSError:
+                return
+            for name in names:
+                doc_dir = os.path.join(self.root, name)
+                try:
+                    if DOC_ID_PATTERN.fullmatch(name) and os.path.getmtime(doc_dir) < cutoff:
+                        shutil.rmtree(doc_dir, ignore_errors=True)
+                    elif name.startswith('upload_') and os.path.getmtime(doc_dir) < cutoff:
+                        os.remove(doc_dir)
+                except OSError:
+                    continue
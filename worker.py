@@ -0,0 +1,266 @@
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from job_store import get_job_store
+from perf_history import get_performance_history
+from translator import PDFTranslator
+
+# 取消标志存在共享存储里，翻译循环里的检查按这个间隔节流
+CANCEL_CHECK_INTERVAL = 0.5
+# 队列为空时的轮询间隔（秒）
+IDLE_POLL_INTERVAL = 1.0
+# 运行中任务的续租间隔；超过租期没有心跳的任务视为 worker 已退出
+HEARTBEAT_INTERVAL = 30
+LEASE_SECONDS = 300
+# 清理过期任务和事件的间隔（秒）
+PRUNE_INTERVAL = 600
+
+
+def _int_env(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def run_job(store, task, api_key=None):
+    """执行一个已领取的翻译任务；kind=pdf 走保真翻译，kind=text 输出 TXT。
+
+    进度和日志写入任务存储的事件流，取消标志从存储读取，因此任务可以由任意进程执行。
+    """
+    task_id = task['task_id']
+    job = task['job']
+    manifest = job['manifest']
+    task_dir = job['task_dir']
+    resume = job.get('resume', False)
+    filepath = os.path.join(task_dir, manifest['input_file'])
+    output_filename = manifest['output_file']
+    output_filepath = os.path.join(task_dir, output_filename)
+    is_text_task = manifest.get('kind') == 'text'
+    last_cancel_check = [0.0]
+    cancelled = [False]
+
+    # 进度回调函数
+    def progress_callback(progress_data):
+        store.append_event(task_id, progress_data)
+
+    # 日志回调函数
+    def log_callback(message, log_type='info'):
+        store.append_event(task_id, {
+            'type': 'log',
+            'message': message,
+            'log_type': log_type
+        })
+
+    # 检查是否取消的函数
+    def check_cancelled():
+        now = time.monotonic()
+        if not cancelled[0] and now - last_cancel_check[0] >= CANCEL_CHECK_INTERVAL:
+            last_cancel_check[0] = now
+            cancelled[0] = store.is_cancel_requested(task_id)
+        if cancelled[0]:
+            raise Exception('Translation cancelled by user')
+
+    succeeded = False
+    try:
+        translator = PDFTranslator(
+            api_type=manifest['api_type'],
+            api_key=api_key if api_key else None,
+            progress_callback=progress_callback,
+            log_callback=log_callback,
+            cancel_callback=check_cancelled,
+            glossary_terms=manifest.get('glossary_terms') or [],
+            translation_mode=manifest['translation_mode'],
+            audience=manifest['translation_audience'],
+            style=manifest['translation_style'],
+            engine=manifest.get('engine', 'thread'),
+            render_mode=manifest.get('render_mode', 'rebuild'),
+            compression=manifest.get('compression', 'small')
+        )
+
+        if is_text_task:
+            # 发送初始化日志
+            log_callback('正在提取PDF文本...', 'info')
+
+            # 执行文本翻译
+            translator.translate_pdf_to_text(
+                filepath,
+                output_filepath,
+                source_lang=manifest['source_lang'],
+                target_lang=manifest['target_lang'],
+                concurrency=manifest['concurrency'],
+                resume=resume
+            )
+        else:
+            # 发送初始化日志
+            log_callback('正在初始化翻译器...', 'info')
+
+            translator.translate_pdf(
+                filepath,
+                output_filepath,
+                source_lang=manifest['source_lang'],
+                target_lang=manifest['target_lang'],
+                concurrency=manifest['concurrency'],
+                resume=resume,
+                preview=True
+            )
+
+        completed = {
+            'status': 'completed',
+            'task_id': task_id,
+            'output_file': output_filename,
+            'input_tokens': translator.input_tokens,
+            'output_tokens': translator.output_tokens,
+            'cached_tokens': translator.usage.cached_tokens,
+            # 按阶段拆分的用量：translate/batch/retry/polish -> 请求数、实际计量的请求数、输入/输出/缓存 tokens
+            'token_usage': translator.usage.snapshot()
+        }
+        if not is_text_task:
+            completed['estimated_cost'] = round(translator._calculate_cost(), 4)
+        store.finish(task_id, 'completed')
+        store.append_event(task_id, completed)
+        succeeded = True
+        # 续传的任务只翻译了剩余部分，各阶段耗时不代表整份文档，不计入吞吐量历史
+        if translator.perf_stats and not resume:
+            get_performance_history().append(translator.perf_stats)
+
+    except Exception as e:
+        error_msg = str(e)
+        tb_str = traceback.format_exc()
+        print(f"{'Text translation' if is_text_task else 'Translation'} error: {error_msg}")
+        print(tb_str)
+
+        if 'Translation cancelled by user' in error_msg:
+            store.finish(task_id, 'cancelled')
+            store.append_event(task_id, {'status': 'cancelled', 'message': '翻译已取消'})
+        else:
+            # 把完整堆栈发给前端，方便定位错误行
+            log_callback(f'翻译失败: {error_msg}', 'error')
+            log_callback(f'详细错误信息:\n{tb_str}', 'error')
+            store.finish(task_id, 'error', error_msg)
+            store.append_event(task_id, {'status': 'error', 'error': error_msg})
+    finally:
+        # 成功后清理输入文件；失败或取消时保留输入和断点日志，便于 /resume 续传
+        if succeeded:
+            try:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            except OSError:
+                pass
+
+
+class JobWorker:
+    """从任务存储领取并执行翻译任务的 worker，concurrency 个线程各自串行处理任务。
+
+    既可以嵌在 Web 进程里运行（app.py），也可以用 python worker.py 单独起进程；
+    同一个存储上可以同时跑任意多个 worker。
+    """
+
+    def __init__(self, store=None, concurrency=1, worker_id=None):
+        self.store = store or get_job_store()
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        # 停止后最后一个工作线程跑完手上的任务退出时置位，维护线程随之退出
+        self._drained = threading.Event()
+        self._active_loops = 0
+        self._threads = []
+
+    def start(self):
+        """在后台守护线程中运行，立即返回。"""
+        if self._threads:
+            return self
+        self._active_loops = self.concurrency
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._work_loop, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._maintenance_loop, name='job-worker-maintenance', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """不再领取新任务；正在执行的任务照常跑完，期间维护线程继续为它们续租。"""
+        self._stop.set()
+        if not self._threads:
+            self._drained.set()
+
+    def wait_drained(self, timeout=None):
+        """stop() 之后等待正在执行的任务全部结束，返回是否已经结束。"""
+        return self._drained.wait(timeout)
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self._stop.is_set():
+                self._stop.wait(1)
+        except KeyboardInterrupt:
+            self.stop()
+        if not self._drained.is_set():
+            print(f'worker {self.worker_id} 停止领取新任务，等待正在执行的任务结束（再次 Ctrl+C 强制退出）')
+            while not self.wait_drained(1):
+                pass
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.store.claim(self.worker_id)
+            except Exception as e:
+                print(f'[WARN] 领取任务失败: {e}')
+                claimed = None
+            if claimed is None:
+                self._stop.wait(IDLE_POLL_INTERVAL)
+                continue
+
+            task, api_key = claimed
+            with self._running_lock:
+                self._running.add(task['task_id'])
+            try:
+                run_job(self.store, task, api_key)
+            except Exception as e:
+                print(f"[WARN] 任务 {task['task_id']} 执行异常: {e}")
+            finally:
+                with self._running_lock:
+                    self._running.discard(task['task_id'])
+        with self._running_lock:
+            self._active_loops -= 1
+            if not self._active_loops:
+                self._drained.set()
+
+    def _maintenance_loop(self):
+        last_prune = 0.0
+        # stop() 之后仍要续租，直到正在执行的任务全部结束；否则其他 worker 的 expire_stale
+        # 会把这些还在跑的任务判成 worker 失联
+        while not self._drained.wait(HEARTBEAT_INTERVAL):
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                self.store.heartbeat(running)
+                for task_id in self.store.expire_stale(LEASE_SECONDS):
+                    print(f'[WARN] 任务 {task_id} 的 worker 已失联，标记为失败')
+                if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+                    self.store.prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f'[WARN] 任务存储维护失败: {e}')
+
+
+def main(argv=None):
+    """独立 worker 进程：python worker.py [并发任务数]，与 Web 进程共用 PDFAPP_JOB_STORE。"""
+    argv = sys.argv[1:] if argv is None else argv
+    concurrency = int(argv[0]) if argv else _int_env('PDFAPP_WORKER_CONCURRENCY', 2)
+    worker = JobWorker(concurrency=concurrency)
+    print(f'worker {worker.worker_id} 已启动，并发任务数 {worker.concurrency}')
+    worker.run_forever()
+
+
+if __name__ == '__main__':
+    main()